@@ -29,6 +29,7 @@ _import_structure = {
         "BatchSplit",
         "Fuse",
         "Parallel",
+        "Route",
         "Split",
         "Stack",
         "parse_composition",
@@ -79,6 +80,7 @@ _import_structure = {
         "TaggingHead",
     ],
     "layer": ["AdapterLayer", "AdapterLayerBase"],
+    "loading": ["AdapterPack", "pack_adapters"],
     "model_mixin": [
         "EmbeddingAdaptersMixin",
         "InvertibleAdaptersMixin",
@@ -139,6 +141,7 @@ if TYPE_CHECKING:
         BatchSplit,
         Fuse,
         Parallel,
+        Route,
         Split,
         Stack,
         parse_composition,
@@ -186,6 +189,7 @@ if TYPE_CHECKING:
         TaggingHead,
     )
     from .layer import AdapterLayer, AdapterLayerBase
+    from .loading import AdapterPack, pack_adapters
     from .model_mixin import (
         EmbeddingAdaptersMixin,
         InvertibleAdaptersMixin,
@@ -87,6 +87,22 @@ class BatchSplit(AdapterCompositionBlock):
         self.batch_sizes = batch_sizes if isinstance(batch_sizes, list) else [batch_sizes] * len(split_adapters)
 
 
+class Route(AdapterCompositionBlock):
+    def __init__(self, *route_adapters: List[str], route_ids=None):
+        """
+        Routes each example of an input batch to one of the given adapters, e.g. to serve requests for different
+        adapters in one batch. In contrast to BatchSplit, examples routed to the same adapter don't have to be
+        contiguous.
+
+        Args:
+            route_adapters: The adapters to route to.
+            route_ids: Tensor or list of shape (batch_size,) holding, for each example of the batch, the index of the
+                adapter in ``route_adapters`` to be used.
+        """
+        super().__init__(*route_adapters)
+        self.route_ids = route_ids
+
+
 class Average(AdapterCompositionBlock):
     def __init__(
         self,
@@ -108,12 +124,13 @@ class Average(AdapterCompositionBlock):
 
 # Mapping each composition block type to the allowed nested types
 ALLOWED_NESTINGS = {
-    Stack: [str, Fuse, Split, Parallel, BatchSplit, Average],
+    Stack: [str, Fuse, Split, Parallel, BatchSplit, Average, Route],
     Fuse: [str, Stack],
     Split: [str, Split, Stack, BatchSplit, Average],
     Parallel: [str, Stack, BatchSplit, Average],
     BatchSplit: [str, Stack, Split, BatchSplit, Average],
     Average: [str, Stack, Split, BatchSplit],
+    Route: [str],
 }
 
 # Some composition blocks might not be supported by all models.
@@ -215,10 +232,33 @@ def parse_heads_from_composition(adapter_composition, reference_heads: list = No
             raise ValueError(
                 "Missing at least one head for the given BatchSplit setup. Expected heads: {}".format(blocks)
             )
+    elif isinstance(final_block, Route):
+        # Convert Route of adapters to a Route of heads using the same route ids.
+        head_setup = Route(*final_block, route_ids=final_block.route_ids)
+        if reference_heads is None or all(head in reference_heads for head in head_setup):
+            return head_setup
+        else:
+            raise ValueError(
+                "Missing at least one head for the given Route setup. Expected heads: {}".format(final_block.children)
+            )
     else:
         return None
 
 
+def replicate_batch(tensor, repeats: int):
+    """
+    Replicates the batch dimension (first dimension) of a tensor. To avoid copies, single-sample batches are replicated
+    as a broadcast view of the original tensor. Only larger batches are materialized. Returned tensors therefore must
+    not be modified in-place.
+    """
+    if repeats == 1:
+        return tensor
+    elif tensor.shape[0] == 1:
+        return tensor.expand(repeats, *tensor.shape[1:])
+    else:
+        return tensor.repeat(repeats, *([1] * (tensor.dim() - 1)))
+
+
 def adjust_tensors_for_parallel(hidden_states, *tensors):
     """
     Replicates a given list of tensors based on the shape of the reference tensor (first argument).
@@ -226,9 +266,7 @@ def adjust_tensors_for_parallel(hidden_states, *tensors):
     outputs = []
     for tensor in tensors:
         if tensor is not None and hidden_states.shape[0] >= tensor.shape[0]:
-            repeats = [1] * len(tensor.shape)
-            repeats[0] = hidden_states.shape[0] // tensor.shape[0]
-            new_tensor = tensor.repeat(*repeats)
+            new_tensor = replicate_batch(tensor, hidden_states.shape[0] // tensor.shape[0])
             outputs.append(new_tensor)
         else:
             outputs.append(tensor)
@@ -240,8 +278,6 @@ def adjust_tensors_for_parallel_(hidden_states, *tensors):
     In-place version of adjust_tensors_for_parallel().
     """
     for tensor in tensors:
-        if tensor is not None and hidden_states.shape[0] >= tensor.shape[0]:
-            repeats = [1] * len(tensor.shape)
-            repeats[0] = hidden_states.shape[0] // tensor.shape[0]
-            new_tensor = tensor.repeat(*repeats)
+        if tensor is not None and hidden_states.shape[0] > tensor.shape[0]:
+            new_tensor = replicate_batch(tensor, hidden_states.shape[0] // tensor.shape[0])
             tensor.set_(new_tensor)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Union
+from typing import Optional, Union
 
 from ..utils import resolve_adapter_config
 from .adapter_config import AdapterConfigBase
@@ -7,7 +7,13 @@ from .adapter_config import AdapterConfigBase
 
 @dataclass(eq=False)
 class AdapterFusionConfig(AdapterConfigBase):
-    """Base class that models the architecture of an adapter fusion layer."""
+    """
+    Base class that models the architecture of an adapter fusion layer.
+
+    If `top_k` is set, each example (or each token, if `top_k_per_token` is set) is only passed through the `top_k`
+    fused adapters with the highest fusion attention scores. The scores are estimated from the outputs of all adapters
+    for the mean hidden state of each example.
+    """
 
     key: bool
     query: bool
@@ -19,6 +25,8 @@ class AdapterFusionConfig(AdapterConfigBase):
     value_before_softmax: bool
     value_initialized: str
     dropout_prob: float
+    top_k: Optional[int] = None
+    top_k_per_token: bool = False
 
     @classmethod
     def load(cls, config: Union[dict, str], **kwargs):
@@ -31,6 +31,10 @@ class ModelAdaptersConfig(Collection):
         # TODO-V2 Save this with config?
         self.active_setup: Optional[AdapterCompositionBlock] = None
         self.skip_layers = None
+        self.merge_on_eval = False
+
+        # results of match() per adapter, validated against the identity of the adapter's current config
+        self._match_cache = {}
 
     def __contains__(self, item):
         return item in self.adapters.keys()
@@ -77,7 +81,24 @@ class ModelAdaptersConfig(Collection):
         config = self.get(adapter_name)
         if config is None:
             return None
-        elif not isinstance(config, AdapterConfigBase):
+        adapter_cache = self._match_cache.setdefault(adapter_name, {})
+        key = (config_type, layer_idx, location_key)
+        cached = adapter_cache.get(key, None)
+        if cached is not None and cached[0] is config:
+            return cached[1]
+        result = self._match(adapter_name, config, config_type, layer_idx, location_key)
+        adapter_cache[key] = (config, result)
+        return result
+
+    def _match(
+        self,
+        adapter_name: str,
+        config: Union[dict, AdapterConfigBase],
+        config_type: type,
+        layer_idx: Optional[int] = None,
+        location_key: Optional[str] = None,
+    ) -> Optional[dict]:
+        if not isinstance(config, AdapterConfigBase):
             config = AdapterConfigBase.load(config)
 
         if isinstance(config, config_type):
@@ -116,6 +137,31 @@ class ModelAdaptersConfig(Collection):
         """
         if adapter_name in self.adapters:
             raise ValueError(f"An adapter with the name '{adapter_name}' has already been added.")
+        self.adapters[adapter_name] = self._add_config(config)
+        self._match_cache.pop(adapter_name, None)
+        logger.info(f"Adding adapter '{adapter_name}'.")
+
+    def add_multiple(self, adapter_configs: Mapping[str, Optional[Union[str, dict]]]):
+        """
+        Adds multiple new adapters to the model config. Adapters sharing the same config object only resolve this
+        config once.
+
+        Args:
+            adapter_configs (Mapping[str, Optional[Union[str, dict]]]):
+                A dictionary mapping the names of the adapters to their configs.
+        """
+        for adapter_name in adapter_configs:
+            if adapter_name in self.adapters:
+                raise ValueError(f"An adapter with the name '{adapter_name}' has already been added.")
+        config_names = {}
+        for adapter_name, config in adapter_configs.items():
+            if id(config) not in config_names:
+                config_names[id(config)] = self._add_config(config)
+            self.adapters[adapter_name] = config_names[id(config)]
+            self._match_cache.pop(adapter_name, None)
+        logger.info(f"Adding {len(adapter_configs)} adapters.")
+
+    def _add_config(self, config: Optional[Union[str, dict]]) -> str:
         if config is None:
             config = DEFAULT_ADAPTER_CONFIG
         if isinstance(config, str):
@@ -125,11 +171,24 @@ class ModelAdaptersConfig(Collection):
         # if it's a dict, compute it's hash and add a new entry to the config map
         elif isinstance(config, Mapping):
             config_name = get_adapter_config_hash(config)
-            self.config_map[config_name] = AdapterConfigBase.load(config)
+            config = AdapterConfigBase.load(config)
+            # keep an existing equal config object, as other adapters might use it
+            existing_config = self.config_map.get(config_name, None)
+            if not isinstance(existing_config, AdapterConfigBase) or existing_config != config:
+                self.config_map[config_name] = config
         else:
             raise ValueError("Invalid adapter config: {}".format(config))
-        self.adapters[adapter_name] = config_name
-        logger.info(f"Adding adapter '{adapter_name}'.")
+        return config_name
+
+    def delete(self, adapter_name: str):
+        """
+        Deletes the adapter with the given name from the model config.
+
+        Args:
+            adapter_name (str): The name of the adapter.
+        """
+        del self.adapters[adapter_name]
+        self._match_cache.pop(adapter_name, None)
 
     def get_fusion(self, fusion_name: Union[str, List[str]]) -> Optional[dict]:
         """
@@ -221,7 +280,12 @@ class ModelAdaptersConfig(Collection):
         return output_dict
 
     def __eq__(self, other):
-        return isinstance(other, ModelAdaptersConfig) and (self.__dict__ == other.__dict__)
+        if not isinstance(other, ModelAdaptersConfig):
+            return False
+        # ignore caches
+        self_dict = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+        other_dict = {k: v for k, v in other.__dict__.items() if not k.startswith("_")}
+        return self_dict == other_dict
 
 
 def build_full_config(adapter_config, model_config, save_id2label=False, **kwargs):
@@ -1,7 +1,11 @@
 import functools
 import threading
+from collections import defaultdict
 
-from .composition import parse_composition, parse_heads_from_composition
+import numpy as np
+import torch
+
+from .composition import parse_composition, parse_heads_from_composition, replicate_batch
 
 
 class AdapterSetup:
@@ -102,20 +106,32 @@ class ForwardContext:
         def wrapper_func(self, *args, **kwargs):
             if self.adapters_config is not None:
                 with cls(self, *args, **kwargs) as ctx:
+                    # forward_context() might replicate the inputs for Parallel blocks
+                    args, kwargs = getattr(ctx, "model_inputs", (args, kwargs))
                     kwargs = {
                         k: v for k, v in kwargs.items() if k.replace("output_", "") not in cls.context_attributes
                     }
                     results = f(self, *args, **kwargs)
 
+                    # If no layer parallelized the input for a Parallel setup (e.g. because all parallel adapters are
+                    # skipped), all channels are identical. Replicate the output to the expected size.
+                    if (
+                        getattr(ctx, "adapters_parallelized", True) is False
+                        and getattr(ctx, "parallel_channels", 1) > 1
+                    ):
+                        results = _replicate_outputs(results, ctx.parallel_channels)
+
                     # append output attributes
+                    output_attributes = [
+                        attr for attr in cls.context_attributes if getattr(ctx, "output_" + attr, False)
+                    ]
+                    outputs = _outputs_to_numpy([getattr(ctx, attr) for attr in output_attributes])
                     if isinstance(results, tuple):
-                        for attr in cls.context_attributes:
-                            if getattr(ctx, "output_" + attr, False):
-                                results = results + (dict(getattr(ctx, attr)),)
+                        for output in outputs:
+                            results = results + (output,)
                     else:
-                        for attr in cls.context_attributes:
-                            if getattr(ctx, "output_" + attr, False):
-                                results[attr] = dict(getattr(ctx, attr))
+                        for attr, output in zip(output_attributes, outputs):
+                            results[attr] = output
                 return results
             else:
                 return f(self, *args, **kwargs)
@@ -134,3 +150,66 @@ class ForwardContext:
             return cls.get_contexts()[-1]
         except IndexError:
             return None
+
+
+def _outputs_to_numpy(outputs):
+    """
+    Converts the gating scores or fusion attentions collected during a forward pass to numpy arrays. The values are
+    stored as lists of device tensors, nested by name, layer and location. All tensors of the same device and dtype are
+    copied to the host at once, so the forward pass only synchronizes with the device once. Multiple values of one
+    location are stacked as columns.
+    """
+    tensors = []
+    for output in outputs:
+        for per_name in output.values():
+            for per_layer in per_name.values():
+                for values in per_layer.values():
+                    tensors.extend(values)
+    groups = defaultdict(list)
+    for tensor in tensors:
+        groups[(tensor.device, tensor.dtype)].append(tensor)
+    host_tensors = {}
+    copies = []
+    for (device, dtype), group in groups.items():
+        flat = torch.cat([t.reshape(-1) for t in group])
+        if device.type == "cuda":
+            host_flat = torch.empty(flat.shape, dtype=dtype, pin_memory=True)
+            host_flat.copy_(flat, non_blocking=True)
+            copies.append(device)
+        else:
+            host_flat = flat.cpu()
+        for tensor, host_tensor in zip(group, host_flat.split([t.numel() for t in group])):
+            host_tensors[id(tensor)] = host_tensor.view(tensor.shape)
+    for device in set(copies):
+        torch.cuda.synchronize(device)
+
+    def to_numpy(values):
+        arrays = [host_tensors[id(t)].numpy() for t in values]
+        return np.column_stack(arrays) if len(arrays) > 1 else arrays[0]
+
+    return [
+        {
+            name: {
+                layer_idx: {location: to_numpy(values) for location, values in per_layer.items()}
+                for layer_idx, per_layer in per_name.items()
+            }
+            for name, per_name in output.items()
+        }
+        for output in outputs
+    ]
+
+
+def _replicate_outputs(outputs, repeats: int):
+    """
+    Replicates all (nested) output tensors of a model along the batch dimension.
+    """
+    if torch.is_tensor(outputs):
+        return replicate_batch(outputs, repeats)
+    elif isinstance(outputs, (tuple, list)):
+        return type(outputs)(_replicate_outputs(o, repeats) for o in outputs)
+    elif isinstance(outputs, dict):
+        for k, v in outputs.items():
+            outputs[k] = _replicate_outputs(v, repeats)
+        return outputs
+    else:
+        return outputs
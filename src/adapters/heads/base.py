@@ -18,7 +18,7 @@ from transformers.modeling_outputs import (
 )
 from transformers.utils import ModelOutput
 
-from ..composition import AdapterCompositionBlock, BatchSplit, Parallel, parse_heads_from_composition
+from ..composition import AdapterCompositionBlock, BatchSplit, Parallel, Route, parse_heads_from_composition
 from ..context import AdapterSetup, ForwardContext
 from ..model_mixin import ModelWithHeadsAdaptersMixin
 from ..modeling import Activation_Function_Class
@@ -27,14 +27,33 @@ from ..modeling import Activation_Function_Class
 logger = logging.getLogger(__name__)
 
 
+def _scatter_to_batch(tensors: List[torch.Tensor], batch_indices: List[torch.LongTensor]) -> torch.Tensor:
+    """
+    Combines the given per-head tensors into one tensor in the order of the input batch. The i-th tensor holds the
+    outputs of the examples at batch_indices[i].
+    """
+    batch_size = sum(len(idx) for idx in batch_indices)
+    output = tensors[0].new_empty(batch_size, *tensors[0].shape[1:])
+    for idx, tensor in zip(batch_indices, tensors):
+        output = output.index_copy(0, idx, tensor)
+    return output
+
+
 @dataclass
 class MultiHeadOutput(ModelOutput):
     head_outputs: List[ModelOutput] = None
     loss: Optional[torch.FloatTensor] = None
+    # positions of the examples of each head in the input batch, set if heads are not applied to consecutive slices
+    batch_indices: Optional[List[torch.LongTensor]] = None
 
     @property
     def logits(self):
-        return torch.vstack([outputs["logits"] for outputs in self.head_outputs])
+        if self.batch_indices is not None:
+            # heads without any examples have None outputs
+            used = [(out, idx) for out, idx in zip(self.head_outputs, self.batch_indices) if out is not None]
+            return _scatter_to_batch([out["logits"] for out, _ in used], [idx for _, idx in used])
+        logits = [outputs["logits"] for outputs in self.head_outputs]
+        return torch.vstack(logits)
 
     def __getitem__(self, k):
         # with number indices the head output at that position is accessed
@@ -768,7 +787,9 @@ class ModelWithFlexibleHeadsAdaptersMixin(ModelWithHeadsAdaptersMixin):
             if isinstance(outputs, ModelOutput):
                 inputs = {}
                 for key, base_output in outputs.items():
-                    if torch.is_tensor(base_output):
+                    if torch.is_tensor(base_output) and torch.is_tensor(batch):
+                        inputs[key] = base_output[batch]
+                    elif torch.is_tensor(base_output):
                         inputs[key] = base_output[batch[0] : batch[-1] + 1]
                 inputs = outputs.__class__(**inputs)
             else:
@@ -790,7 +811,45 @@ class ModelWithFlexibleHeadsAdaptersMixin(ModelWithHeadsAdaptersMixin):
         for head in used_heads:
             if head not in self.heads:
                 raise ValueError("Unknown head_name '{}'".format(head))
-        if isinstance(self.active_head, BatchSplit):
+        if isinstance(used_heads, Route):
+            if used_heads.route_ids is None:
+                raise ValueError(f"No route_ids given for head setup {used_heads}.")
+            route_ids = torch.as_tensor(used_heads.route_ids, dtype=torch.long, device=all_outputs[0].device)
+            if route_ids.shape != all_outputs[0].shape[:1]:
+                raise ValueError(
+                    "The given route_ids of shape {} do not match the actual batch size {}.".format(
+                        tuple(route_ids.shape), all_outputs[0].size()[0]
+                    )
+                )
+            head_outputs = []
+            batch_indices = []
+            labels = kwargs.pop("labels", None)
+            for i, head in enumerate(used_heads):
+                batch_idx = (route_ids == i).nonzero(as_tuple=True)[0]
+                batch_indices.append(batch_idx)
+                # heads without any routed examples are skipped, their output is None
+                if len(batch_idx) == 0:
+                    head_outputs.append(None)
+                    continue
+                head_module = self.heads[head]
+                kwargs["labels"] = labels[batch_idx] if labels is not None else None
+                head_inputs, head_cls_input = _get_head_input(all_outputs, cls_output, batch_idx)
+                head_attention = attention_mask[batch_idx] if attention_mask is not None else None
+                head_output = head_module(head_inputs, head_cls_input, head_attention, return_dict, **kwargs)
+                head_outputs.append(head_output)
+            used_outputs = [out for out in head_outputs if out is not None]
+            if all("loss" in out and out["loss"] is not None for out in used_outputs):
+                losses = [out["loss"] for out in used_outputs]
+                # per-example losses are put back in batch order, reduced losses are summed
+                if all(loss.dim() > 0 for loss in losses):
+                    used_indices = [idx for out, idx in zip(head_outputs, batch_indices) if out is not None]
+                    combined_loss = _scatter_to_batch(losses, used_indices)
+                else:
+                    combined_loss = sum(losses)
+            else:
+                combined_loss = None
+            return_output = MultiHeadOutput(head_outputs=head_outputs, loss=combined_loss, batch_indices=batch_indices)
+        elif isinstance(self.active_head, BatchSplit):
             if sum(self.active_head.batch_sizes) != all_outputs[0].size()[0]:
                 raise ValueError(
                     "The specified batch sizes {} do not match the actual batch size {}".format(
@@ -1,7 +1,9 @@
+import itertools
 from abc import ABCMeta, abstractmethod
-from typing import Dict, List, Mapping, Union
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
 
-import numpy as np
 import torch
 from torch import nn
 
@@ -11,15 +13,41 @@ from .composition import (
     BatchSplit,
     Fuse,
     Parallel,
+    Route,
     Split,
     Stack,
     adjust_tensors_for_parallel,
+    replicate_batch,
 )
 from .configuration import BnConfig
 from .context import AdapterSetup, ForwardContext
 from .modeling import Adapter, BertFusion, ParallelAdapter
 
 
+@dataclass
+class ExecutionPlan:
+    """
+    Execution plan of an adapter setup compiled for a single adapter layer. Holds the adapter setup resolved for this
+    layer (None if the layer is not affected by the setup) and optionally the handler and modules used in the forward
+    pass.
+
+    Args:
+        adapter_setup (AdapterCompositionBlock, optional): The setup to be executed by the layer.
+        forward_fn (Callable, optional): The composition method executing the setup.
+        modules (list, optional): Pre-resolved (name, module) pairs used by forward_fn.
+        last_adapter (nn.Module, optional): The adapter module used for post-processing the output.
+    """
+
+    adapter_setup: Optional[AdapterCompositionBlock] = None
+    forward_fn: Optional[Callable] = None
+    modules: Optional[list] = None
+    last_adapter: Optional[nn.Module] = None
+
+
+# Maximum number of compiled plans cached per layer, e.g. for setups passed via AdapterSetup contexts.
+MAX_CACHED_PLANS = 8
+
+
 # We don't inherit from ABC because __slots__ changes object layout
 class AdapterLayerBase(metaclass=ABCMeta):
     """
@@ -36,23 +64,89 @@ class AdapterLayerBase(metaclass=ABCMeta):
         assert idx == layer_idx
         setattr(self, "_layer_idx", idx)
 
-    def get_active_setup(self, module_dict):
-        if hasattr(self, "adapters_config"):
-            # First check current context before falling back to defined setup
-            context = AdapterSetup.get_context()
-            if context is not None:
-                adapter_setup = context.adapter_setup
-            else:
-                adapter_setup = self.adapters_config.active_setup
-        else:
-            adapter_setup = None
+    def compile_plan(self, adapter_setup: AdapterCompositionBlock, module_dict) -> ExecutionPlan:
+        """
+        Compiles the given adapter setup into an execution plan for this layer.
+
+        Args:
+            adapter_setup (AdapterCompositionBlock): The adapter setup to compile.
+            module_dict: The (dict-like) collection of adaptation modules of this layer.
+
+        Returns:
+            ExecutionPlan: The compiled plan.
+        """
         skip_adapters = adapter_setup is None or (
             self.adapters_config.skip_layers is not None and self.layer_idx in self.adapters_config.skip_layers
         )
         if not skip_adapters and (len(set(module_dict.keys()) & adapter_setup.flatten()) > 0):
-            return adapter_setup
+            return ExecutionPlan(adapter_setup=adapter_setup)
         else:
-            return None
+            return ExecutionPlan()
+
+    def reset_plans(self):
+        """
+        Clears all compiled execution plans of this layer. Must be called whenever the adapter modules of the layer or
+        the active setup of the model change.
+        """
+        self._compiled_plans = {}
+
+    def get_active_plan(self, module_dict) -> ExecutionPlan:
+        """
+        Returns the compiled execution plan of the currently active adapter setup. Plans are compiled on first use
+        and cached until reset_plans() is called.
+        """
+        if not hasattr(self, "adapters_config"):
+            return ExecutionPlan()
+        # First check current context before falling back to defined setup
+        context = AdapterSetup.get_context()
+        if context is not None:
+            adapter_setup = context.adapter_setup
+        else:
+            adapter_setup = self.adapters_config.active_setup
+        plans = getattr(self, "_compiled_plans", None)
+        if plans is None:
+            plans = self._compiled_plans = {}
+        # Composition blocks are not hashable, therefore we key by identity and keep a reference to the setup
+        cached = plans.get(id(adapter_setup), None)
+        if cached is not None and cached[0] is adapter_setup:
+            return cached[1]
+        plan = self.compile_plan(adapter_setup, module_dict)
+        if len(plans) >= MAX_CACHED_PLANS:
+            del plans[next(iter(plans))]
+        plans[id(adapter_setup)] = (adapter_setup, plan)
+        return plan
+
+    def get_active_setup(self, module_dict):
+        return self.get_active_plan(module_dict).adapter_setup
+
+    def _get_route_indices(
+        self, adapter_setup: Route, batch_size: int, device
+    ) -> Tuple[torch.Tensor, List[torch.Tensor]]:
+        """
+        Returns the route ids of the given Route block as tensor together with, for each child of the block, the
+        indices of the examples routed to it. Both are computed once per forward pass and shared by all layers.
+        """
+        context = ForwardContext.get_context()
+        route_indices = getattr(context, "route_indices", None)
+        key = (id(adapter_setup), device)
+        if route_indices is not None and key in route_indices:
+            return route_indices[key]
+
+        if adapter_setup.route_ids is None:
+            raise ValueError(f"No route_ids given for adapter setup {adapter_setup}.")
+        route_ids = torch.as_tensor(adapter_setup.route_ids, dtype=torch.long, device=device)
+        if route_ids.shape != (batch_size,):
+            raise ValueError(
+                "The given route_ids of shape {} do not match the batch size {}.".format(
+                    tuple(route_ids.shape), batch_size
+                )
+            )
+        indices = [(route_ids == i).nonzero(as_tuple=True)[0] for i in range(len(adapter_setup))]
+        if sum(len(idx) for idx in indices) != batch_size:
+            raise ValueError(f"All route_ids must be in the range [0, {len(adapter_setup)}).")
+        if route_indices is not None:
+            route_indices[key] = (route_ids, indices)
+        return route_ids, indices
 
     def _store_gating_score(self, adapter_name, gating_score):
         context = ForwardContext.get_context()
@@ -60,16 +154,11 @@ class AdapterLayerBase(metaclass=ABCMeta):
             gating_cache = context.adapter_gating_scores
             if self.layer_idx not in gating_cache[adapter_name]:
                 gating_cache[adapter_name][self.layer_idx] = {}
-            gating_score = gating_score.detach().squeeze().cpu().numpy()
-            if len(gating_score.shape) == 0:
-                gating_score = np.expand_dims(gating_score, axis=0)
-            cache_score = gating_cache[adapter_name][self.layer_idx].get(self.location_key, None)
-            if cache_score is not None:
-                gating_cache[adapter_name][self.layer_idx][self.location_key] = np.column_stack(
-                    (cache_score, gating_score)
-                )
-            else:
-                gating_cache[adapter_name][self.layer_idx][self.location_key] = gating_score
+            # scores are kept on the device and transferred at the end of the forward pass, see ForwardContext.wrap()
+            gating_score = gating_score.detach().squeeze()
+            if gating_score.dim() == 0:
+                gating_score = gating_score.unsqueeze(0)
+            gating_cache[adapter_name][self.layer_idx].setdefault(self.location_key, []).append(gating_score)
 
     def _store_fusion_attentions(self, fusion_name, attentions):
         context = ForwardContext.get_context()
@@ -77,7 +166,7 @@ class AdapterLayerBase(metaclass=ABCMeta):
             attention_cache = context.adapter_fusion_attentions
             if self.layer_idx not in attention_cache[fusion_name]:
                 attention_cache[fusion_name][self.layer_idx] = {}
-            attention_cache[fusion_name][self.layer_idx][self.location_key] = attentions
+            attention_cache[fusion_name][self.layer_idx][self.location_key] = [attentions]
 
     @abstractmethod
     def add_adapter(self, adapter_name: str, layer_idx: int) -> bool:
@@ -239,6 +328,174 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
         else:
             return None
 
+    def compile_plan(self, adapter_setup: AdapterCompositionBlock, module_dict) -> ExecutionPlan:
+        plan = super().compile_plan(adapter_setup, module_dict)
+        adapter_setup = plan.adapter_setup
+        if adapter_setup is None:
+            return plan
+
+        if isinstance(adapter_setup, Stack):
+            # Flat stacks of single adapters can be executed without walking the composition tree
+            if all(isinstance(child, str) for child in adapter_setup):
+                plan.forward_fn = self._execute_flat_stack
+                plan.modules = [(name, self.adapters[name]) for name in adapter_setup if name in self.adapters]
+            else:
+                plan.forward_fn = self._execute_stack
+        elif isinstance(adapter_setup, Fuse):
+            plan.forward_fn = partial(self._execute_block, self.adapter_fusion)
+        elif isinstance(adapter_setup, Split):
+            plan.forward_fn = partial(self._execute_block, self.adapter_split)
+        elif isinstance(adapter_setup, Parallel):
+            plan.forward_fn = self._execute_parallel
+        elif isinstance(adapter_setup, BatchSplit):
+            plan.forward_fn = partial(self._execute_block, self.adapter_batchsplit)
+        elif isinstance(adapter_setup, Average):
+            plan.forward_fn = partial(self._execute_block, self.adapter_average_output)
+        elif isinstance(adapter_setup, Route):
+            plan.forward_fn = partial(self._execute_block, self.adapter_route)
+        else:
+            raise ValueError(f"Invalid adapter setup {adapter_setup}")
+
+        # The last adapter might not be part of this layer (e.g. a nested Parallel block whose adapters are left out).
+        # In this case, fall back to the last adapter of the setup that is present in this layer.
+        plan.last_adapter = self._find_last_adapter(adapter_setup)
+
+        return plan
+
+    def _find_last_adapter(self, adapter_setup: AdapterCompositionBlock) -> Optional[nn.Module]:
+        for child in reversed(adapter_setup.children):
+            if isinstance(child, AdapterCompositionBlock):
+                last_adapter = self._find_last_adapter(child)
+                if last_adapter is not None:
+                    return last_adapter
+            elif child in self.adapters:
+                return self.adapters[child]
+        return None
+
+    def _execute_flat_stack(self, plan: ExecutionPlan, hidden_states, input_tensor, layer_norm):
+        context = ForwardContext.get_context()
+        for adapter_name, adapter_layer in plan.modules:
+            hidden_states, _, residual = adapter_layer.pre_forward(hidden_states, input_tensor, layer_norm)
+            layer_output = adapter_layer(
+                hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
+            )
+            hidden_states = layer_output[0]
+            self._store_gating_score(adapter_name, layer_output[-1])
+        return hidden_states, input_tensor
+
+    def _execute_stack(self, plan: ExecutionPlan, hidden_states, input_tensor, layer_norm):
+        hidden_states, _, input_tensor = self.adapter_stack(
+            plan.adapter_setup, hidden_states, input_tensor, layer_norm
+        )
+        return hidden_states, input_tensor
+
+    def _execute_parallel(self, plan: ExecutionPlan, hidden_states, input_tensor, layer_norm):
+        # notice that we are overriding input tensor here to keep the same dim as hidden_states for the residual
+        # in case we were blowing up the batch for parallel processing of multiple adapters for the same input
+        return self.adapter_parallel(plan.adapter_setup, hidden_states, input_tensor, layer_norm)
+
+    def _execute_block(self, block_fn: Callable, plan: ExecutionPlan, hidden_states, input_tensor, layer_norm):
+        hidden_states = block_fn(plan.adapter_setup, hidden_states, input_tensor, layer_norm)
+        return hidden_states, input_tensor
+
+    def reset_plans(self):
+        super().reset_plans()
+        self._batched_adapters = {}
+
+    def _is_batchable(self, adapters: List[nn.Module]) -> bool:
+        """
+        Checks whether the given adapters are plain bottleneck adapters of identical shape and configuration that can
+        be computed in a single batched matmul.
+        """
+        first = adapters[0]
+        for adapter in adapters:
+            if (
+                type(adapter) not in [Adapter, ParallelAdapter]
+                or type(adapter) is not type(first)
+                or adapter.add_layer_norm_before
+                or adapter.add_layer_norm_after
+                or adapter.use_gating
+                or not isinstance(adapter.adapter_down[0], nn.Linear)
+                or not isinstance(adapter.adapter_up, nn.Linear)
+                or adapter.input_size != first.input_size
+                or adapter.down_sample != first.down_sample
+                or isinstance(adapter.scaling, float) != isinstance(first.scaling, float)
+            ):
+                return False
+            # functional activations are shared, module activations are instantiated per adapter
+            f, first_f = adapter.non_linearity.f, first.non_linearity.f
+            if f is not first_f and not (isinstance(f, nn.Module) and type(f) is type(first_f)):
+                return False
+        return True
+
+    def _stack_adapter_weights(self, adapters: List[nn.Module]):
+        down_weight = torch.stack([a.adapter_down[0].weight for a in adapters]).transpose(1, 2)
+        down_bias = torch.stack([a.adapter_down[0].bias for a in adapters]).unsqueeze(1)
+        up_weight = torch.stack([a.adapter_up.weight for a in adapters]).transpose(1, 2)
+        up_bias = torch.stack([a.adapter_up.bias for a in adapters]).unsqueeze(1)
+        if isinstance(adapters[0].scaling, float):
+            scaling = torch.tensor([a.scaling for a in adapters], dtype=up_bias.dtype, device=up_bias.device)
+        else:
+            scaling = torch.cat([a.scaling for a in adapters])
+        return down_weight, down_bias, up_weight, up_bias, scaling.view(-1, 1, 1)
+
+    def _get_batched_weights(self, adapter_setup: AdapterCompositionBlock):
+        """
+        Returns the adapters of the given composition block and their projection weights stacked along a new first
+        dimension if all children are single adapters that can be computed in one batched matmul. Otherwise, returns
+        None.
+
+        Stacked weights are cached as long as the underlying parameters are not modified. If gradients are required,
+        weights are re-stacked in every call so that gradients flow back to the individual adapter modules.
+        """
+        batched_adapters = getattr(self, "_batched_adapters", None)
+        if batched_adapters is None:
+            batched_adapters = self._batched_adapters = {}
+        key = tuple(map(str, adapter_setup))
+        if key not in batched_adapters:
+            if len(adapter_setup) > 1 and all(isinstance(c, str) and c in self.adapters for c in adapter_setup):
+                adapters = [self.adapters[name] for name in adapter_setup]
+                batched_adapters[key] = {"adapters": adapters} if self._is_batchable(adapters) else None
+            else:
+                batched_adapters[key] = None
+        entry = batched_adapters[key]
+        if entry is None:
+            return None
+
+        adapters = entry["adapters"]
+        params = [
+            p for a in adapters for p in itertools.chain(a.adapter_down[0].parameters(), a.adapter_up.parameters())
+        ]
+        if not isinstance(adapters[0].scaling, float):
+            params.extend(a.scaling for a in adapters)
+        if torch.is_grad_enabled() and any(p.requires_grad for p in params):
+            return adapters, self._stack_adapter_weights(adapters)
+        # parameter versions are bumped by in-place updates (e.g. optimizer steps or loading weights)
+        version = tuple((p.data_ptr(), p._version) for p in params)
+        if entry.get("version", None) != version:
+            with torch.no_grad():
+                entry["weights"] = self._stack_adapter_weights(adapters)
+            entry["version"] = version
+        return adapters, entry["weights"]
+
+    def _batched_adapter_forward(self, adapters: List[nn.Module], weights, hidden_states):
+        """
+        Computes the up-projections of multiple bottleneck adapters in one pass.
+
+        Args:
+            adapters (List[nn.Module]): The n adapter modules.
+            weights: The stacked weights as returned by _get_batched_weights(). Might also be gathered per example.
+            hidden_states (torch.Tensor): Input of shape (n, tokens, hidden_size) or (1, tokens, hidden_size).
+
+        Returns:
+            torch.Tensor: The scaled up-projections of shape (n, tokens, hidden_size).
+        """
+        down_weight, down_bias, up_weight, up_bias, scaling = weights
+        hidden_states = hidden_states.expand(down_weight.shape[0], -1, -1)
+        down = adapters[0].non_linearity(torch.baddbmm(down_bias, hidden_states, down_weight))
+        up = torch.baddbmm(up_bias, down, up_weight)
+        return up * scaling
+
     def adapter_stack(self, adapter_setup: Stack, hidden_states, input_tensor, layer_norm, lvl=0):
         """
         Forwards the given input through the given stack of adapters.
@@ -276,7 +533,12 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
                 hidden_states = self.adapter_average_output(
                     adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
                 )
-            # Case 6: We have a single adapter which is part of this module -> forward pass
+            # Case 6: We have a nested route block -> call route method
+            elif isinstance(adapter_stack_layer, Route):
+                hidden_states = self.adapter_route(
+                    adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
+                )
+            # Case 7: We have a single adapter which is part of this module -> forward pass
             elif adapter_stack_layer in self.adapters:
                 adapter_layer = self.adapters[adapter_stack_layer]
                 hidden_states, _, residual = adapter_layer.pre_forward(hidden_states, input_tensor, layer_norm)
@@ -309,36 +571,56 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
             hidden_states, input_tensor, layer_norm, fusion_config=fusion_config
         )
 
-        up_list = []
+        if self._use_sparse_fusion(adapter_setup, fusion_config, hidden_states):
+            return self._sparse_adapter_fusion(adapter_setup, fusion_config, hidden_states, query, residual)
 
-        for adapter_block in adapter_setup:
-            # Case 1: We have a nested stack -> call stack method
-            if isinstance(adapter_block, Stack):
-                _, up, _ = self.adapter_stack(adapter_block, hidden_states, input_tensor, layer_norm, lvl=lvl + 1)
-                if up is not None:  # could be none if stack is empty
-                    up_list.append(up)
-            # Case 2: We have a single adapter which is part of this module -> forward pass
-            elif adapter_block in self.adapters:
-                adapter_layer = self.adapters[adapter_block]
-                layer_output = adapter_layer(
-                    hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
-                )
-                up = layer_output[2]
-                self._store_gating_score(adapter_block, layer_output[-1])
-                up_list.append(up)
-            # Case 3: nesting other composition blocks is invalid
-            elif isinstance(adapter_block, AdapterCompositionBlock):
-                raise ValueError(
-                    "Invalid adapter setup. Cannot nest {} in {}".format(
-                        adapter_block.__class__.__name__, adapter_setup.__class__.__name__
+        # If all fused adapters are plain bottleneck adapters, compute them in a single batched pass
+        batched = None if context.output_adapter_gating_scores else self._get_batched_weights(adapter_setup)
+        if batched is not None:
+            adapters, weights = batched
+            up_list = self._batched_adapter_forward(
+                adapters, weights, hidden_states.reshape(1, -1, hidden_states.shape[-1])
+            )
+            up_list = up_list.view(len(adapters), *hidden_states.shape)
+            # dims => batch, toks, number-of-adapters, feats
+            up_list = up_list.permute(1, 2, 0, 3)
+        else:
+            # up-projections are written to one buffer of dims => batch, toks, number-of-adapters, feats
+            up_list = None
+            n_outputs = 0
+
+            for adapter_block in adapter_setup:
+                up = None
+                # Case 1: We have a nested stack -> call stack method
+                if isinstance(adapter_block, Stack):
+                    _, up, _ = self.adapter_stack(adapter_block, hidden_states, input_tensor, layer_norm, lvl=lvl + 1)
+                # Case 2: We have a single adapter which is part of this module -> forward pass
+                elif adapter_block in self.adapters:
+                    adapter_layer = self.adapters[adapter_block]
+                    layer_output = adapter_layer(
+                        hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
                     )
-                )
-            # Case X: No adapter which is part of this module -> ignore
+                    up = layer_output[2]
+                    self._store_gating_score(adapter_block, layer_output[-1])
+                # Case 3: nesting other composition blocks is invalid
+                elif isinstance(adapter_block, AdapterCompositionBlock):
+                    raise ValueError(
+                        "Invalid adapter setup. Cannot nest {} in {}".format(
+                            adapter_block.__class__.__name__, adapter_setup.__class__.__name__
+                        )
+                    )
+                # Case X: No adapter which is part of this module -> ignore
 
-        if len(up_list) > 0:
-            up_list = torch.stack(up_list)
-            up_list = up_list.permute(1, 2, 0, 3)
+                if up is not None:  # could be none if stack is empty
+                    if up_list is None:
+                        up_list = up.new_empty(*up.shape[:-1], len(adapter_setup), up.shape[-1])
+                    up_list[..., n_outputs, :] = up
+                    n_outputs += 1
+
+            if up_list is not None:
+                up_list = up_list[..., :n_outputs, :]
 
+        if up_list is not None:
             fusion_output = self.adapter_fusion_layer[adapter_setup.name](
                 query,
                 up_list,
@@ -354,6 +636,78 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
 
         return hidden_states
 
+    def _use_sparse_fusion(self, adapter_setup: Fuse, fusion_config, hidden_states) -> bool:
+        # top-k routing requires all fused adapters to be plain adapters of this layer
+        context = ForwardContext.get_context()
+        if not fusion_config.top_k or fusion_config.top_k >= len(adapter_setup):
+            return False
+        if context.output_adapter_gating_scores or hidden_states.dim() != 3:
+            return False
+        for adapter_block in adapter_setup:
+            if not isinstance(adapter_block, str) or adapter_block not in self.adapters:
+                return False
+            # gating scores are averaged over the sequence, which is split up by per-token routing
+            if fusion_config.top_k_per_token and self.adapters[adapter_block].use_gating:
+                return False
+        return adapter_setup.name in self.adapter_fusion_layer
+
+    def _sparse_adapter_fusion(self, adapter_setup: Fuse, fusion_config, hidden_states, query, residual):
+        """
+        Performs adapter fusion with top-k routing: each example (or token) is only passed through the top_k fused
+        adapters with the highest attention scores, estimated from the outputs of all adapters for the mean hidden
+        state of each example.
+        """
+        context = ForwardContext.get_context()
+        fusion_layer = self.adapter_fusion_layer[adapter_setup.name]
+        adapters = [self.adapters[adapter_block] for adapter_block in adapter_setup]
+        top_k = fusion_config.top_k
+        batch_size, seq_len, hidden_size = hidden_states.shape
+
+        # route based on the adapter outputs for the mean hidden state of each example
+        pooled_hidden_states = hidden_states.mean(dim=1, keepdim=True)
+        pooled_residual = residual.mean(dim=1, keepdim=True)
+        with torch.no_grad():
+            probe = torch.stack(
+                [adapter(pooled_hidden_states, residual_input=pooled_residual)[2] for adapter in adapters], dim=-2
+            )
+            if fusion_config.residual_before:
+                probe = probe + pooled_residual.unsqueeze(-2)
+            router_query = query if fusion_config.top_k_per_token else query.mean(dim=1, keepdim=True)
+            selected = fusion_layer.route(router_query, probe, top_k)
+
+        # dispatch: either tokens or full examples are gathered for each adapter and scattered back
+        if fusion_config.top_k_per_token:
+            unit_hidden_states = hidden_states.reshape(-1, 1, hidden_size)
+            unit_residual = residual.reshape(-1, 1, hidden_size)
+            unit_selected = selected.reshape(-1, top_k)
+        else:
+            unit_hidden_states, unit_residual = hidden_states, residual
+            unit_selected = selected.squeeze(1)
+        up_list = unit_hidden_states.new_zeros(*unit_hidden_states.shape[:2], top_k, hidden_size)
+        for i, adapter in enumerate(adapters):
+            unit_idx, slot_idx = (unit_selected == i).nonzero(as_tuple=True)
+            if len(unit_idx) > 0:
+                up = adapter(unit_hidden_states[unit_idx], residual_input=unit_residual[unit_idx])[2]
+                up_list[unit_idx, :, slot_idx] = up
+        up_list = up_list.view(batch_size, seq_len, top_k, hidden_size)
+
+        fusion_layer.dense_adapter_tokens += batch_size * seq_len * len(adapters)
+        fusion_layer.computed_adapter_tokens += batch_size * seq_len * top_k + batch_size * len(adapters)
+
+        fusion_output = fusion_layer(
+            query, up_list, up_list, residual, output_attentions=context.output_adapter_fusion_attentions
+        )
+        if context.output_adapter_fusion_attentions:
+            hidden_states, attentions = fusion_output
+            # attentions of adapters which were not selected are zero
+            full_attentions = attentions.new_zeros(batch_size, seq_len, len(adapters))
+            full_attentions.scatter_(-1, selected.expand(batch_size, seq_len, top_k), attentions)
+            self._store_fusion_attentions(adapter_setup.name, full_attentions)
+        else:
+            hidden_states = fusion_output
+
+        return hidden_states
+
     def adapter_split(self, adapter_setup: Split, hidden_states, input_tensor, layer_norm, lvl=0):
         """
         Splits the given input between the given adapters.
@@ -428,9 +782,13 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
 
         context = ForwardContext.get_context()
         if not context.adapters_parallelized:
+            # Defer replication of the input until the first layer that actually holds any of the parallel adapters.
+            # Until then, all parallel channels would compute the same outputs.
+            if len(adapter_setup.flatten() & self.adapters.keys()) == 0:
+                return hidden_states, input_tensor
             orig_batch_size = input_tensor.shape[0]
-            input_tensor = input_tensor.repeat(self.adapters_config.active_setup.parallel_channels, 1, 1)
-            hidden_states = hidden_states.repeat(self.adapters_config.active_setup.parallel_channels, 1, 1)
+            input_tensor = replicate_batch(input_tensor, context.parallel_channels)
+            hidden_states = replicate_batch(hidden_states, context.parallel_channels)
             context.adapters_parallelized = True
         else:
             # The base model should handle replication of input.
@@ -446,6 +804,19 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
         first_adapter = self.adapters[adapter_setup.first()]
         hidden_states, _, residual = first_adapter.pre_forward(hidden_states, input_tensor, layer_norm)
 
+        # If all children are plain bottleneck adapters, compute them in a single batched pass
+        batched = None if context.output_adapter_gating_scores else self._get_batched_weights(adapter_setup)
+        if batched is not None and hidden_states.shape[0] == len(adapter_setup) * orig_batch_size:
+            adapters, weights = batched
+            up = self._batched_adapter_forward(
+                adapters, weights, hidden_states.reshape(len(adapters), -1, hidden_states.shape[-1])
+            )
+            hidden_states = up.view(hidden_states.shape)
+            # parallel adapters don't add the residual in their forward pass
+            if not isinstance(first_adapter, ParallelAdapter):
+                hidden_states = hidden_states + residual
+            return hidden_states, input_tensor
+
         # sequentially feed different parts of the blown-up batch into different adapters
         children_hidden = []
         for i, child in enumerate(adapter_setup):
@@ -589,6 +960,57 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
         hidden_states = torch.cat(children_hidden, 0)
         return hidden_states
 
+    def adapter_route(self, adapter_setup: Route, hidden_states, input_tensor, layer_norm, lvl=0):
+        """
+        Forwards each example of the batch through the adapter it is routed to by the route ids of the given block.
+        """
+        route_ids, route_indices = self._get_route_indices(adapter_setup, hidden_states.shape[0], hidden_states.device)
+        present_adapters = [name for name in adapter_setup if name in self.adapters]
+        if len(present_adapters) == 0:
+            return hidden_states
+
+        # We assume all adapters have the same config
+        first_adapter = self.adapters[present_adapters[0]]
+        hidden_states, _, residual = first_adapter.pre_forward(hidden_states, input_tensor, layer_norm)
+
+        # If all children are plain bottleneck adapters, gather their weights per example and compute in one pass
+        context = ForwardContext.get_context()
+        batched = None if context.output_adapter_gating_scores else self._get_batched_weights(adapter_setup)
+        if batched is not None:
+            adapters, weights = batched
+            up = self._batched_adapter_forward(
+                adapters,
+                tuple(w[route_ids] for w in weights),
+                hidden_states.reshape(hidden_states.shape[0], -1, hidden_states.shape[-1]),
+            )
+            hidden_states_out = up.view(hidden_states.shape)
+            # parallel adapters don't add the residual in their forward pass
+            if not isinstance(first_adapter, ParallelAdapter):
+                hidden_states_out = hidden_states_out + residual
+            return hidden_states_out
+
+        hidden_states_out = hidden_states
+        for child, idx in zip(adapter_setup, route_indices):
+            # Nesting other composition blocks is invalid
+            if isinstance(child, AdapterCompositionBlock):
+                raise ValueError(
+                    "Invalid adapter setup. Cannot nest {} in {}".format(
+                        child.__class__.__name__, adapter_setup.__class__.__name__
+                    )
+                )
+            # Adapters which are not part of this module or without routed examples are ignored
+            elif child in self.adapters and len(idx) > 0:
+                adapter_layer = self.adapters[child]
+                layer_output = adapter_layer(
+                    hidden_states[idx],
+                    residual_input=residual[idx],
+                    output_gating=context.output_adapter_gating_scores,
+                )
+                self._store_gating_score(child, layer_output[-1])
+                hidden_states_out = hidden_states_out.index_copy(0, idx, layer_output[0])
+
+        return hidden_states_out
+
     def adapter_average_output(self, adapter_setup: Average, hidden_states, input_tensor, layer_norm, lvl=0):
         """
         For averaging the output representations of multiple adapters.
@@ -653,32 +1075,15 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
         (residual_input,) = adjust_tensors_for_parallel(hidden_states, residual_input)
         # Replicate in both directions as residual might be larger (e.g. GPT-J)
         (hidden_states,) = adjust_tensors_for_parallel(residual_input, hidden_states)
-        adapter_setup = self.get_active_setup(self.adapters)
-        if adapter_setup is not None:
+        plan = self.get_active_plan(self.adapters)
+        if plan.adapter_setup is not None:
             input_hidden_states = hidden_states
 
-            if isinstance(adapter_setup, Stack):
-                hidden_states, _, residual_input = self.adapter_stack(
-                    adapter_setup, hidden_states, residual_input, layer_norm
-                )
-            elif isinstance(adapter_setup, Fuse):
-                hidden_states = self.adapter_fusion(adapter_setup, hidden_states, residual_input, layer_norm)
-            elif isinstance(adapter_setup, Split):
-                hidden_states = self.adapter_split(adapter_setup, hidden_states, residual_input, layer_norm)
-            elif isinstance(adapter_setup, Parallel):
-                # notice that we are overriding input tensor here to keep the same dim as hidden_states for the residual
-                # in case we were blowing up the batch for parallel processing of multiple adapters for the same input
-                hidden_states, residual_input = self.adapter_parallel(
-                    adapter_setup, hidden_states, residual_input, layer_norm
-                )
-            elif isinstance(adapter_setup, BatchSplit):
-                hidden_states = self.adapter_batchsplit(adapter_setup, hidden_states, residual_input, layer_norm)
-            elif isinstance(adapter_setup, Average):
-                hidden_states = self.adapter_average_output(adapter_setup, hidden_states, residual_input, layer_norm)
-            else:
-                raise ValueError(f"Invalid adapter setup {adapter_setup}")
+            hidden_states, residual_input = plan.forward_fn(plan, hidden_states, residual_input, layer_norm)
 
-            last_adapter = self.adapters[adapter_setup.last()]
+            last_adapter = plan.last_adapter
+            if last_adapter is None:
+                last_adapter = self.adapters[plan.adapter_setup.last()]
             hidden_states = last_adapter.post_forward(hidden_states, input_hidden_states, residual_input, layer_norm)
 
         elif layer_norm:
@@ -1,42 +1,354 @@
+import copy
 import json
 import logging
+import os
+import struct
+import time
 from abc import ABC, abstractmethod
-from os import mkdir
-from os.path import exists, isdir, isfile, join
-from typing import Callable, Mapping, Sequence, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os import mkdir, remove
+from os.path import basename, exists, isdir, isfile, join
+from typing import Callable, List, Mapping, Optional, Sequence, Tuple
+from zipfile import ZipFile, is_zipfile
 
 import torch
 
+from safetensors import safe_open
+from safetensors.torch import load as safe_load
+from safetensors.torch import save_file as safe_save_file
+
 from .configuration import AdapterConfigBase, build_full_config
 from .head_utils import STATIC_TO_FLEX_HEAD_MAP, get_head_config_and_rename_list
 from .utils import (
     ACTIVATION_RENAME,
+    ADAPTER_PACK_EXTENSION,
     ADAPTERFUSION_CONFIG_NAME,
     ADAPTERFUSION_WEIGHTS_NAME,
     CONFIG_NAME,
     HEAD_CONFIG_NAME,
     HEAD_WEIGHTS_NAME,
+    SAFE_ADAPTERFUSION_WEIGHTS_NAME,
+    SAFE_HEAD_WEIGHTS_NAME,
+    SAFE_WEIGHTS_NAME,
     WEIGHTS_NAME,
     AdapterType,
     resolve_adapter_path,
+    split_pack_path,
 )
 
 
 logger = logging.getLogger(__name__)
 
 
+class _OpenFilesCache:
+    """
+    Keeps the most recently used opened files (e.g. adapter packs or archives) open for reuse. Files modified since
+    they were opened are reopened. Files evicted from the cache are closed.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, file_path: str, open_func: Callable, max_size: int):
+        mtime = os.stat(file_path).st_mtime_ns
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[0] != mtime:
+            entry[1].close()
+            entry = None
+        if entry is None:
+            entry = (mtime, open_func())
+        self._entries[key] = entry
+        while len(self._entries) > max_size:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            evicted.close()
+        return entry[1]
+
+    def clear(self):
+        while self._entries:
+            _, (_, evicted) = self._entries.popitem()
+            evicted.close()
+
+
+class AdapterPack:
+    """
+    Provides random access to the entries of an adapter pack file created by `pack_adapters()`. A pack file stores the
+    configuration and weights files of many saved modules in a single safetensors file. An index of all entries is
+    stored in the file header, allowing to read any single entry without scanning the pack. Tensors are memory-mapped.
+    Use `AdapterPack.open()` to reuse already opened pack files. At most `max_open_packs` pack files are kept open,
+    closing the least recently used ones. Closed packs are reopened on access.
+    """
+
+    INDEX_KEY = "adapter_pack_index"
+
+    max_open_packs = 8
+    _open_packs = _OpenFilesCache()
+
+    def __init__(self, pack_file: str, device: str = "cpu"):
+        self.pack_file = pack_file
+        self.device = str(device)
+        self._handle = None
+        metadata = self.handle.metadata() or {}
+        if self.INDEX_KEY not in metadata:
+            self.close()
+            raise ValueError("{} is not a valid adapter pack file.".format(pack_file))
+        self.index = json.loads(metadata[self.INDEX_KEY])
+
+    @property
+    def handle(self):
+        if self._handle is None:
+            self._handle = safe_open(self.pack_file, framework="pt", device=self.device)
+        return self._handle
+
+    def close(self):
+        """Closes the pack file. It is reopened on the next access."""
+        if self._handle is not None:
+            self._handle.__exit__(None, None, None)
+            self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def open(cls, pack_file: str, device: str = "cpu") -> "AdapterPack":
+        """
+        Returns the pack of the given file, reusing an already opened pack if the file was not modified.
+        """
+        key = (os.path.abspath(pack_file), str(device))
+        return cls._open_packs.get(
+            key, pack_file, partial(cls, pack_file, device=str(device)), max_size=cls.max_open_packs
+        )
+
+    @classmethod
+    def close_all(cls):
+        """Closes all pack files opened via `AdapterPack.open()`."""
+        cls._open_packs.clear()
+
+    def _get_entry(self, entry_name: str) -> dict:
+        if entry_name not in self.index:
+            raise OSError("No entry '{}' found in adapter pack {}.".format(entry_name, self.pack_file))
+        return self.index[entry_name]
+
+    def has_file(self, entry_name: str, file_name: str) -> bool:
+        return file_name in self.index.get(entry_name, {})
+
+    def load_config(self, entry_name: str, file_name: str) -> dict:
+        # return a copy as loaded configs are modified by the loaders
+        return copy.deepcopy(self._get_entry(entry_name)[file_name])
+
+    def _tensor_name(self, entry_name: str, file_name: str, key: str) -> str:
+        return "{}/{}/{}".format(entry_name, file_name, key)
+
+    def load_weights(self, entry_name: str, file_name: str) -> dict:
+        keys = self._get_entry(entry_name)[file_name]
+        return {k: self.handle.get_tensor(self._tensor_name(entry_name, file_name, k)) for k in keys}
+
+    def get_weights_shapes(self, entry_name: str, file_name: str) -> dict:
+        keys = self._get_entry(entry_name)[file_name]
+        return {k: tuple(self.handle.get_slice(self._tensor_name(entry_name, file_name, k)).get_shape()) for k in keys}
+
+
+class AdapterArchive:
+    """
+    Provides access to the files of a saved module stored in a zip archive (e.g. downloaded from AdapterHub) without
+    extracting the archive. Files are looked up by their name, regardless of the folder they are stored in. Use
+    `AdapterArchive.open()` to reuse already opened archives. At most `max_open_archives` archives are kept open,
+    closing the least recently used ones. Closed archives are reopened on access.
+    """
+
+    max_open_archives = 8
+    _open_archives = _OpenFilesCache()
+
+    def __init__(self, archive_file: str):
+        self.archive_file = archive_file
+        self._zip_file = None
+        self._members = {basename(info.filename): info for info in self.zip_file.infolist() if basename(info.filename)}
+
+    @property
+    def zip_file(self) -> ZipFile:
+        if self._zip_file is None:
+            self._zip_file = ZipFile(self.archive_file, "r")
+        return self._zip_file
+
+    def close(self):
+        """Closes the archive file. It is reopened on the next access."""
+        if self._zip_file is not None:
+            self._zip_file.close()
+            self._zip_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def open(cls, archive_file: str) -> "AdapterArchive":
+        """
+        Returns the archive of the given file, reusing an already opened archive if the file was not modified.
+        """
+        key = os.path.abspath(archive_file)
+        return cls._open_archives.get(key, archive_file, partial(cls, archive_file), max_size=cls.max_open_archives)
+
+    @classmethod
+    def close_all(cls):
+        """Closes all archives opened via `AdapterArchive.open()`."""
+        cls._open_archives.clear()
+
+    def _get_member(self, file_name: str):
+        if file_name not in self._members:
+            raise OSError("No file '{}' found in archive {}.".format(file_name, self.archive_file))
+        return self._members[file_name]
+
+    def has_file(self, entry_name: Optional[str], file_name: str) -> bool:
+        return file_name in self._members
+
+    def load_config(self, entry_name: Optional[str], file_name: str) -> dict:
+        with self.zip_file.open(self._get_member(file_name)) as f:
+            return json.load(f)
+
+    def load_weights(self, entry_name: Optional[str], file_name: str) -> dict:
+        with self.zip_file.open(self._get_member(file_name)) as f:
+            if file_name.endswith(".safetensors"):
+                return safe_load(f.read())
+            else:
+                return torch.load(f, map_location="cpu")
+
+    def get_weights_shapes(self, entry_name: Optional[str], file_name: str) -> dict:
+        # only read the header of the safetensors file
+        with self.zip_file.open(self._get_member(file_name)) as f:
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+        return {k: tuple(v["shape"]) for k, v in header.items() if k != "__metadata__"}
+
+
+def pack_adapters(save_directory: str, pack_file: str):
+    """
+    Creates an adapter pack file from a directory containing saved modules (e.g. created by `save_all_adapters()`).
+    Each subfolder of the directory becomes an entry of the pack, which can be loaded using "<pack_file>/<entry>" as
+    path, e.g. `model.load_adapter("adapters.adapterpack/sst")`.
+
+    Args:
+        save_directory (str): The directory containing the saved modules in subfolders.
+        pack_file (str): The path of the pack file to create. Should end with ".adapterpack".
+    """
+    if not pack_file.endswith(ADAPTER_PACK_EXTENSION):
+        raise ValueError("The name of an adapter pack file must end with '{}'.".format(ADAPTER_PACK_EXTENSION))
+    index = {}
+    tensors = {}
+    seen_ptrs = set()
+    for entry_name in sorted(os.listdir(save_directory)):
+        entry_dir = join(save_directory, entry_name)
+        if not isdir(entry_dir):
+            continue
+        entry = {}
+        for file_name in sorted(os.listdir(entry_dir)):
+            file_path = join(entry_dir, file_name)
+            if file_name.endswith(".json"):
+                with open(file_path, "r", encoding="utf-8") as f:
+                    entry[file_name] = json.load(f)
+            elif file_name.endswith(".safetensors") or file_name.endswith(".bin"):
+                if file_name.endswith(".safetensors"):
+                    with safe_open(file_path, framework="pt") as f:
+                        state_dict = {k: f.get_tensor(k) for k in f.keys()}
+                else:
+                    state_dict = torch.load(file_path, map_location="cpu")
+                entry[file_name] = list(state_dict.keys())
+                for k, v in state_dict.items():
+                    # safetensors cannot store tensors sharing memory
+                    if v.data_ptr() in seen_ptrs or not v.is_contiguous():
+                        v = v.clone().contiguous()
+                    seen_ptrs.add(v.data_ptr())
+                    tensors["{}/{}/{}".format(entry_name, file_name, k)] = v
+            else:
+                logger.warning("Skipping file {} not supported in adapter packs.".format(file_path))
+        if entry:
+            index[entry_name] = entry
+    safe_save_file(tensors, pack_file, metadata={"format": "pt", AdapterPack.INDEX_KEY: json.dumps(index)})
+    logger.info("Packed {} modules into {}".format(len(index), pack_file))
+
+
 class WeightsLoaderHelper:
     """
     A class providing helper methods for saving and loading module weights.
     """
 
-    def __init__(self, model, weights_name, config_name):
+    def __init__(self, model, weights_name, config_name, safe_weights_name=None):
         self.model = model
         self.weights_name = weights_name
         self.config_name = config_name
+        self.safe_weights_name = safe_weights_name
 
-    def state_dict(self, filter_func):
-        return {k: v for (k, v) in self.model.state_dict().items() if filter_func(k)}
+    def _open_pack(self, path):
+        """
+        Returns the adapter pack and the name of the entry if the given path points to an entry of a pack, or the
+        archive if the given path points to a zip archive.
+        """
+        if isfile(path) and is_zipfile(path):
+            return AdapterArchive.open(path), None
+        pack_path = split_pack_path(path)
+        if pack_path is None:
+            return None, None
+        pack_file, entry_name = pack_path
+        return AdapterPack.open(pack_file, device=self._get_load_device()), entry_name
+
+    def _file_exists(self, save_directory, file_name):
+        pack, entry_name = self._open_pack(save_directory)
+        if pack is not None:
+            return pack.has_file(entry_name, file_name)
+        return isfile(join(save_directory, file_name))
+
+    def config_exists(self, save_directory) -> bool:
+        return self._file_exists(save_directory, self.config_name)
+
+    def get_weights_file(self, save_directory) -> Optional[str]:
+        """
+        Returns the path of the weights file in the given directory, preferring the safetensors format over the
+        pickled PyTorch format. Returns None if no weights file exists.
+        """
+        for weights_name in [self.safe_weights_name, self.weights_name]:
+            if weights_name is not None and self._file_exists(save_directory, weights_name):
+                return join(save_directory, weights_name)
+        return None
+
+    def supports_lazy_load(self, weights_file) -> bool:
+        """Returns whether the given weights file can be validated without loading the weights."""
+        return weights_file.endswith(".safetensors") or split_pack_path(os.path.dirname(weights_file)) is not None
+
+    def _get_state_modules(self, name, model=None):
+        """
+        Returns the names and modules of all submodules registered under the given name, relative to the given model
+        (defaults to the full model). Returns None if the submodules cannot be resolved without a full traversal.
+        """
+        if name is None or not hasattr(self.model, "_get_adapter_state_modules"):
+            return None
+        state_modules = self.model._get_adapter_state_modules(name)
+        if model is not None and model is not self.model:
+            prefix = self.model.base_model_prefix + "."
+            state_modules = [(n[len(prefix) :], m) for n, m in state_modules if n.startswith(prefix)]
+        return state_modules
+
+    def state_dict(self, filter_func, name=None):
+        state_modules = self._get_state_modules(name)
+        if state_modules is None:
+            return {k: v for (k, v) in self.model.state_dict().items() if filter_func(k)}
+        # only extract the weights of the submodules of the given name instead of the full model
+        state_dict = {}
+        for module_name, module in state_modules:
+            for k, v in module.state_dict(prefix=module_name + ".").items():
+                if filter_func(k):
+                    state_dict[k] = v
+        return state_dict
 
     def rename_state_dict(self, state_dict, *rename_funcs):
         new_state_dict = {}
@@ -59,25 +371,46 @@ class WeightsLoaderHelper:
             json.dump(config, f, indent=2, sort_keys=True)
         logger.info("Configuration saved in {}".format(output_config_file))
 
-    def save_weights(self, save_directory, filter_func):
+    def save_weights(self, save_directory, filter_func, use_safetensors=False, name=None):
         if not exists(save_directory):
             mkdir(save_directory)
         else:
             assert isdir(save_directory), "Saving path should be a directory where the module weights can be saved."
 
         # Get the state of all adapter modules for this task
-        state_dict = self.state_dict(filter_func)
+        state_dict = self.state_dict(filter_func, name=name)
         # Save the adapter weights
-        output_file = join(save_directory, self.weights_name)
-        torch.save(state_dict, output_file)
+        if use_safetensors:
+            if self.safe_weights_name is None:
+                raise ValueError("Saving in safetensors format is not supported by this loader.")
+            output_file = join(save_directory, self.safe_weights_name)
+            other_file = join(save_directory, self.weights_name)
+            # safetensors cannot store tensors sharing memory, e.g. tied weights
+            seen_ptrs = set()
+            for k, v in state_dict.items():
+                if (v.device, v.data_ptr()) in seen_ptrs or not v.is_contiguous():
+                    state_dict[k] = v.clone().contiguous()
+                seen_ptrs.add((v.device, v.data_ptr()))
+            safe_save_file(state_dict, output_file, metadata={"format": "pt"})
+        else:
+            output_file = join(save_directory, self.weights_name)
+            other_file = join(save_directory, self.safe_weights_name) if self.safe_weights_name else None
+            torch.save(state_dict, output_file)
+        # remove weights of a previous save in the other format, as they would be preferred when loading
+        if other_file is not None and isfile(other_file):
+            remove(other_file)
         logger.info("Module weights saved in {}".format(output_file))
 
     def load_weights_config(self, save_directory):
         config_file = join(save_directory, self.config_name)
         logger.info("Loading module configuration from {}".format(config_file))
         # Load the config
-        with open(config_file, "r", encoding="utf-8") as f:
-            loaded_config = json.load(f)
+        pack, entry_name = self._open_pack(save_directory)
+        if pack is not None:
+            loaded_config = pack.load_config(entry_name, self.config_name)
+        else:
+            with open(config_file, "r", encoding="utf-8") as f:
+                loaded_config = json.load(f)
         # For older versions translate the activation function to the new format
         if "version" not in loaded_config:
             if "config" in loaded_config and loaded_config["config"] is not None:
@@ -121,6 +454,123 @@ class WeightsLoaderHelper:
             )
         return missing_keys, unexpected_keys
 
+    def _load_state_modules_state_dict(self, state_modules, state_dict, start_prefix=""):
+        missing_keys = []
+        unexpected_keys = []
+        state_dict = dict(state_dict)
+        for module_name, module in state_modules:
+            module_prefix = start_prefix + module_name + "."
+            module_state_dict = {k: state_dict.pop(k) for k in list(state_dict.keys()) if k.startswith(module_prefix)}
+            module_missing_keys, module_unexpected_keys = self._load_module_state_dict(
+                module, module_state_dict, start_prefix=module_prefix
+            )
+            missing_keys.extend(module_missing_keys)
+            unexpected_keys.extend(module_unexpected_keys)
+        # weights not belonging to any of the modules cannot be loaded
+        unexpected_keys.extend(state_dict.keys())
+        return missing_keys, unexpected_keys
+
+    def _get_load_device(self):
+        # load weights directly onto the device of the model to avoid an additional copy
+        param = next(self.model.parameters(), None)
+        return param.device if param is not None else torch.device("cpu")
+
+    def _load_state_dict(self, weights_file):
+        pack, entry_name = self._open_pack(os.path.dirname(weights_file))
+        if pack is not None:
+            return pack.load_weights(entry_name, os.path.basename(weights_file))
+        elif weights_file.endswith(".safetensors"):
+            device = self._get_load_device()
+            # the file is memory-mapped, tensors are read only when accessed
+            with safe_open(weights_file, framework="pt", device=str(device)) as f:
+                return {k: f.get_tensor(k) for k in f.keys()}
+        else:
+            return torch.load(weights_file, map_location="cpu")
+
+    def _rename_keys(self, keys, rename_func):
+        if rename_func:
+            if isinstance(rename_func, Sequence):
+                rename_funcs = rename_func
+            else:
+                rename_funcs = [rename_func]
+            for func in rename_funcs:
+                keys = [func(k) for k in keys]
+        return keys
+
+    def _get_model_to_load(self, keys, in_base_model=False):
+        # Make sure we are able to load base models as well as derived models (with heads)
+        start_prefix = ""
+        model_to_load = self.model
+        has_prefix_module = any(s.startswith(self.model.base_model_prefix) for s in keys)
+        if not hasattr(self.model, self.model.base_model_prefix) and has_prefix_module:
+            start_prefix = self.model.base_model_prefix + "."
+        if in_base_model and hasattr(self.model, self.model.base_model_prefix) and not has_prefix_module:
+            model_to_load = self.model.base_model
+        return model_to_load, start_prefix
+
+    def validate_weights(self, save_directory, filter_func, rename_func=None, in_base_model=False, name=None):
+        """
+        Validates the weights saved in the given directory against the model by only reading the header of the
+        safetensors weights file, without loading any tensor data.
+
+        Returns:
+            Tuple[List[str], List[str]]: The missing and the unexpected keys.
+        """
+        weights_file = self.get_weights_file(save_directory)
+        if weights_file is None or not self.supports_lazy_load(weights_file):
+            raise ValueError("Only weights in safetensors format can be validated without loading.")
+        try:
+            pack, entry_name = self._open_pack(save_directory)
+            if pack is not None:
+                file_shapes = pack.get_weights_shapes(entry_name, os.path.basename(weights_file))
+                file_keys, shapes = list(file_shapes.keys()), list(file_shapes.values())
+            else:
+                with safe_open(weights_file, framework="pt") as f:
+                    file_keys = list(f.keys())
+                    shapes = [tuple(f.get_slice(k).get_shape()) for k in file_keys]
+        except Exception:
+            raise OSError("Unable to read weights from safetensors file {}.".format(weights_file))
+
+        file_keys = self._rename_keys(file_keys, rename_func)
+        model_to_load, start_prefix = self._get_model_to_load(file_keys, in_base_model=in_base_model)
+        state_modules = self._get_state_modules(name, model_to_load)
+        if state_modules is None:
+            model_state = model_to_load.state_dict()
+        else:
+            model_state = {}
+            for module_name, module in state_modules:
+                model_state.update(module.state_dict(prefix=module_name + "."))
+        unexpected_keys = []
+        for key, shape in zip(file_keys, shapes):
+            model_key = key[len(start_prefix) :] if start_prefix and key.startswith(start_prefix) else key
+            if model_key not in model_state:
+                unexpected_keys.append(key)
+            elif tuple(model_state[model_key].shape) != shape:
+                raise RuntimeError(
+                    "Size mismatch for {}: copying a param with shape {} from checkpoint, the shape in current model"
+                    " is {}.".format(key, shape, tuple(model_state[model_key].shape))
+                )
+        loaded_keys = set(
+            k[len(start_prefix) :] if start_prefix and k.startswith(start_prefix) else k for k in file_keys
+        )
+        missing_keys = [k for k in model_state if filter_func(k) and k not in loaded_keys]
+        return missing_keys, unexpected_keys
+
+    def read_weights(self, save_directory):
+        """
+        Reads the weights saved in the given directory without adding them to the model.
+        """
+        weights_file = self.get_weights_file(save_directory)
+        if weights_file is None:
+            raise OSError("No weights file found in {}.".format(save_directory))
+        # Load the weights of the adapter
+        try:
+            state_dict = self._load_state_dict(weights_file)
+        except Exception:
+            raise OSError("Unable to load weights from checkpoint file {}.".format(weights_file))
+        logger.info("Loading module weights from {}".format(weights_file))
+        return state_dict
+
     def load_weights(
         self,
         save_directory,
@@ -128,14 +578,27 @@ class WeightsLoaderHelper:
         rename_func=None,
         loading_info=None,
         in_base_model=False,
+        name=None,
     ):
-        weights_file = join(save_directory, self.weights_name)
-        # Load the weights of the adapter
-        try:
-            state_dict = torch.load(weights_file, map_location="cpu")
-        except Exception:
-            raise OSError("Unable to load weights from pytorch checkpoint file. ")
+        state_dict = self.read_weights(save_directory)
+        return self.load_state_dict(
+            state_dict,
+            filter_func,
+            rename_func=rename_func,
+            loading_info=loading_info,
+            in_base_model=in_base_model,
+            name=name,
+        )
 
+    def load_state_dict(
+        self,
+        state_dict,
+        filter_func,
+        rename_func=None,
+        loading_info=None,
+        in_base_model=False,
+        name=None,
+    ):
         # Rename weights if needed
         if rename_func:
             if isinstance(rename_func, Sequence):
@@ -143,21 +606,19 @@ class WeightsLoaderHelper:
             else:
                 state_dict = self.rename_state_dict(state_dict, rename_func)
 
-        logger.info("Loading module weights from {}".format(weights_file))
-
         # Add the weights to the model
-        # Make sure we are able to load base models as well as derived models (with heads)
-        start_prefix = ""
-        model_to_load = self.model
-        has_prefix_module = any(s.startswith(self.model.base_model_prefix) for s in state_dict.keys())
-        if not hasattr(self.model, self.model.base_model_prefix) and has_prefix_module:
-            start_prefix = self.model.base_model_prefix + "."
-        if in_base_model and hasattr(self.model, self.model.base_model_prefix) and not has_prefix_module:
-            model_to_load = self.model.base_model
+        model_to_load, start_prefix = self._get_model_to_load(state_dict.keys(), in_base_model=in_base_model)
 
-        missing_keys, unexpected_keys = self._load_module_state_dict(
-            model_to_load, state_dict, start_prefix=start_prefix
-        )
+        # only traverse the submodules of the given name if possible
+        state_modules = self._get_state_modules(name, model_to_load)
+        if state_modules is None:
+            missing_keys, unexpected_keys = self._load_module_state_dict(
+                model_to_load, state_dict, start_prefix=start_prefix
+            )
+        else:
+            missing_keys, unexpected_keys = self._load_state_modules_state_dict(
+                state_modules, state_dict, start_prefix=start_prefix
+            )
 
         missing_keys = [k for k in missing_keys if filter_func(k)]
         if len(missing_keys) > 0:
@@ -188,9 +649,9 @@ class WeightsLoader(ABC):
     custom module weight loaders.
     """
 
-    def __init__(self, model, weights_name, config_name):
+    def __init__(self, model, weights_name, config_name, safe_weights_name=None):
         self.model = model
-        self.weights_helper = WeightsLoaderHelper(model, weights_name, config_name)
+        self.weights_helper = WeightsLoaderHelper(model, weights_name, config_name, safe_weights_name)
 
     @abstractmethod
     def filter_func(self, name: str) -> Callable[[str], bool]:
@@ -230,6 +691,7 @@ class WeightsLoader(ABC):
         Args:
             save_directory (str): The directory to save the weights in.
             name (str): An identifier of the weights to be saved. The details are specified by the implementor.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
         if not exists(save_directory):
             mkdir(save_directory)
@@ -252,7 +714,9 @@ class WeightsLoader(ABC):
 
         # Save adapter weights
         filter_func = self.filter_func(name)
-        self.weights_helper.save_weights(save_directory, filter_func)
+        self.weights_helper.save_weights(
+            save_directory, filter_func, use_safetensors=kwargs.pop("use_safetensors", False)
+        )
 
     def load(self, save_directory, load_as=None, loading_info=None, **kwargs) -> Tuple[str, str]:
         """
@@ -268,7 +732,7 @@ class WeightsLoader(ABC):
             Tuple[str, str]: A tuple consisting of the local file system directory from which the weights where loaded
             and the name of the loaded weights.
         """
-        if not exists(join(save_directory, self.weights_helper.weights_name)):
+        if self.weights_helper.get_weights_file(save_directory) is None:
             raise ValueError("Loading path should be a directory where the weights are saved.")
 
         # Load config
@@ -295,7 +759,7 @@ class AdapterLoader(WeightsLoader):
     """
 
     def __init__(self, model, adapter_type=None):
-        super().__init__(model, WEIGHTS_NAME, CONFIG_NAME)
+        super().__init__(model, WEIGHTS_NAME, CONFIG_NAME, SAFE_WEIGHTS_NAME)
         self.adapter_type = adapter_type
         if adapter_type and not AdapterType.has(self.adapter_type):
             raise ValueError("Invalid adapter type {}".format(self.adapter_type))
@@ -329,8 +793,8 @@ class AdapterLoader(WeightsLoader):
     # In the old format, task adapters e.g. using seq_bn config specify inv. adapters but don't use them.
     # As inv. adapters would be incorrectly used in the new implementation,
     # catch this case here when loading pretrained adapters.
-    def _fix_legacy_config(self, adapter_name, missing_keys):
-        if self.adapter_type == AdapterType.text_task:
+    def _fix_legacy_config(self, adapter_name, missing_keys, adapter_type=None):
+        if adapter_type == AdapterType.text_task:
             inv_adapter_keys = [x for x in missing_keys if f"invertible_adapters.{adapter_name}." in x]
             if len(inv_adapter_keys) > 0:
                 del self.model.base_model.invertible_adapters[adapter_name]
@@ -353,7 +817,7 @@ class AdapterLoader(WeightsLoader):
             .replace(".loras.{}.".format(old_name), ".loras.{}.".format(new_name))
         )
 
-    def save(self, save_directory, name, meta_dict=None):
+    def save(self, save_directory, name, meta_dict=None, use_safetensors=False):
         """
         Saves an adapter and its configuration file to a directory, so that it can be reloaded using the `load()`
         method.
@@ -361,6 +825,7 @@ class AdapterLoader(WeightsLoader):
         Args:
             save_directory (str): a path to a directory where the adapter will be saved
             task_name (str): the name of the adapter to be saved
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
         if not exists(save_directory):
             mkdir(save_directory)
@@ -387,7 +852,9 @@ class AdapterLoader(WeightsLoader):
 
         # Save adapter weights
         filter_func = self.filter_func(config_dict["name"])
-        self.weights_helper.save_weights(save_directory, filter_func)
+        self.weights_helper.save_weights(
+            save_directory, filter_func, use_safetensors=use_safetensors, name=config_dict["name"]
+        )
 
     def load(
         self,
@@ -399,6 +866,7 @@ class AdapterLoader(WeightsLoader):
         loading_info=None,
         leave_out=None,
         set_active=False,
+        lazy_load=False,
         **kwargs
     ):
         """
@@ -415,11 +883,64 @@ class AdapterLoader(WeightsLoader):
             model_name (str, optional): The string identifier of the pre-trained model.
             load_as (str, optional): Load the adapter using this name. By default, the name with which the adapter was
              saved will be used.
+            lazy_load (bool, optional): If True and the weights are saved in safetensors format, only the header of the
+             weights file is validated. The weights are read when the adapter is first activated. Defaults to False.
 
         Returns:
             Tuple[str, str]: A tuple consisting of the local file system directory from which the weights where loaded
             and the name of the loaded weights.
         """
+        resolved_folder, config = self._resolve_config(
+            adapter_name_or_path, config=config, version=version, model_name=model_name, leave_out=leave_out, **kwargs
+        )
+        adapter_type = self._check_adapter_type(config)
+
+        adapter_name = load_as or config["name"]
+        # If the adapter is not part of the model, add it
+        if adapter_name not in self.model.adapters_config.adapters:
+            self.model.add_adapter(adapter_name, config=config["config"], set_active=set_active)
+        else:
+            logger.warning("Overwriting existing adapter '{}'.".format(adapter_name))
+
+        # Load adapter weights
+        filter_func = self.filter_func(adapter_name)
+        rename_func = self.rename_func(config["name"], adapter_name)
+        weights_file = self.weights_helper.get_weights_file(resolved_folder)
+        if lazy_load and weights_file is not None and self.weights_helper.supports_lazy_load(weights_file):
+            missing_keys, unexpected_keys = self.weights_helper.validate_weights(
+                resolved_folder, filter_func, rename_func=rename_func, in_base_model=True, name=adapter_name
+            )
+            if isinstance(loading_info, Mapping):
+                loading_info.setdefault("unexpected_keys", []).extend(unexpected_keys)
+            # defer reading the weights until the adapter is first activated
+            self.model.base_model._lazy_adapter_weights[adapter_name] = partial(
+                self.weights_helper.load_weights,
+                resolved_folder,
+                filter_func,
+                rename_func=rename_func,
+                in_base_model=True,
+                name=adapter_name,
+            )
+        else:
+            # weights of a previous lazy load would overwrite the loaded weights on activation
+            self.model.base_model._lazy_adapter_weights.pop(adapter_name, None)
+            missing_keys, _ = self.weights_helper.load_weights(
+                resolved_folder,
+                filter_func,
+                rename_func=rename_func,
+                loading_info=loading_info,
+                in_base_model=True,
+                name=adapter_name,
+            )
+        missing_keys = self._fix_legacy_config(adapter_name, missing_keys, adapter_type)
+        if isinstance(loading_info, Mapping):
+            loading_info["missing_keys"] = missing_keys
+
+        return resolved_folder, adapter_name
+
+    def _resolve_config(
+        self, adapter_name_or_path, config=None, version=None, model_name=None, leave_out=None, **kwargs
+    ):
         requested_config = AdapterConfigBase.load(config) if config else None
         # Resolve the weights to be loaded based on the given identifier and the current adapter config
         model_name = self.model.model_name or model_name
@@ -433,37 +954,122 @@ class AdapterLoader(WeightsLoader):
 
         # Load config of adapter
         config = self.weights_helper.load_weights_config(resolved_folder)
-        if self.adapter_type and "type" in config:
-            assert config["type"] == self.adapter_type, "Loaded adapter has to be a {} adapter.".format(
-                self.adapter_type
-            )
-        elif "type" in config:
-            self.adapter_type = config["type"]
         # post-loading drop of layers
         if leave_out is not None:
             if "leave_out" in config["config"] and config["config"]["leave_out"] is not None:
                 # The conversion to a set and then back to a list removes all duplicates
                 leave_out = list(set(leave_out + config["config"]["leave_out"]))
             config["config"]["leave_out"] = leave_out
+        return resolved_folder, config
 
-        adapter_name = load_as or config["name"]
-        # If the adapter is not part of the model, add it
-        if adapter_name not in self.model.adapters_config.adapters:
-            self.model.add_adapter(adapter_name, config=config["config"], set_active=set_active)
-        else:
-            logger.warning("Overwriting existing adapter '{}'.".format(adapter_name))
+    def _check_adapter_type(self, config) -> Optional[str]:
+        """
+        Checks the type of the adapter with the given config against the type requested for this loader. Returns the
+        type of the adapter without changing the state of the loader, so that adapters of different types can be
+        loaded with the same loader.
+        """
+        if self.adapter_type and "type" in config:
+            assert config["type"] == self.adapter_type, "Loaded adapter has to be a {} adapter.".format(
+                self.adapter_type
+            )
+        return config.get("type", self.adapter_type)
+
+    def load_multiple(
+        self,
+        adapter_names_or_paths: Sequence[str],
+        config=None,
+        version=None,
+        model_name=None,
+        load_as: Optional[Sequence[str]] = None,
+        loading_info=None,
+        leave_out=None,
+        max_workers=None,
+        **kwargs
+    ) -> List[Tuple[str, str]]:
+        """
+        Loads multiple pre-trained pytorch adapter modules from the local file system or a remote location. Adapter
+        paths are resolved and weights files are read concurrently in a thread pool. Afterwards, all adapter modules
+        are added to the model in a single pass and their weights are loaded.
+
+        Args:
+            adapter_names_or_paths (Sequence[str]): The identifiers of the adapters to be loaded. See `load()` for the
+             supported formats.
+            config (str, optional): The requested configuration of the adapters.
+            version (str, optional): The version of the adapters to be loaded.
+            model_name (str, optional): The string identifier of the pre-trained model.
+            load_as (Sequence[str], optional): Load the adapters using these names. By default, the names with which
+             the adapters were saved will be used.
+            loading_info (dict, optional): If given, filled with the merged missing and unexpected keys of all adapters
+             and the time needed to load each adapter (in seconds) under "load_times".
+            max_workers (int, optional): The maximum number of threads used for reading the adapters.
+
+        Returns:
+            List[Tuple[str, str]]: For each adapter, a tuple consisting of the local file system directory from which
+            the weights where loaded and the name of the loaded weights.
+        """
+        if load_as is not None and len(load_as) != len(adapter_names_or_paths):
+            raise ValueError("The number of names in load_as must match the number of adapters to be loaded.")
+
+        def read_adapter(adapter_name_or_path):
+            start_time = time.perf_counter()
+            resolved_folder, adapter_config = self._resolve_config(
+                adapter_name_or_path,
+                config=config,
+                version=version,
+                model_name=model_name,
+                leave_out=copy.copy(leave_out),
+                **kwargs,
+            )
+            state_dict = self.weights_helper.read_weights(resolved_folder)
+            return resolved_folder, adapter_config, state_dict, time.perf_counter() - start_time
+
+        # Resolving and reading is I/O bound, so do it concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            read_results = list(executor.map(read_adapter, adapter_names_or_paths))
+
+        adapter_names = []
+        new_adapters = {}
+        adapter_types = []
+        for i, (_, adapter_config, _, _) in enumerate(read_results):
+            adapter_types.append(self._check_adapter_type(adapter_config))
+            adapter_name = load_as[i] if load_as is not None else adapter_config["name"]
+            if adapter_name in adapter_names:
+                raise ValueError(f"Adapter '{adapter_name}' is loaded multiple times.")
+            adapter_names.append(adapter_name)
+            if adapter_name not in self.model.adapters_config.adapters:
+                new_adapters[adapter_name] = adapter_config["config"]
+            else:
+                logger.warning("Overwriting existing adapter '{}'.".format(adapter_name))
+        # Add all new adapters in a single pass over the model
+        self.model.base_model._add_adapters(new_adapters)
 
-        # Load adapter weights
-        filter_func = self.filter_func(adapter_name)
-        rename_func = self.rename_func(config["name"], adapter_name)
-        missing_keys, _ = self.weights_helper.load_weights(
-            resolved_folder, filter_func, rename_func=rename_func, loading_info=loading_info, in_base_model=True
-        )
-        missing_keys = self._fix_legacy_config(adapter_name, missing_keys)
         if isinstance(loading_info, Mapping):
-            loading_info["missing_keys"] = missing_keys
+            loading_info.setdefault("missing_keys", [])
+            loading_info.setdefault("unexpected_keys", [])
+            loading_info.setdefault("load_times", {})
+        results = []
+        for adapter_name, adapter_type, (resolved_folder, adapter_config, state_dict, read_time) in zip(
+            adapter_names, adapter_types, read_results
+        ):
+            start_time = time.perf_counter()
+            self.model.base_model._lazy_adapter_weights.pop(adapter_name, None)
+            missing_keys, unexpected_keys = self.weights_helper.load_state_dict(
+                state_dict,
+                self.filter_func(adapter_name),
+                rename_func=self.rename_func(adapter_config["name"], adapter_name),
+                in_base_model=True,
+                name=adapter_name,
+            )
+            missing_keys = self._fix_legacy_config(adapter_name, missing_keys, adapter_type)
+            load_time = read_time + time.perf_counter() - start_time
+            logger.info("Loaded adapter '{}' in {:.3f}s.".format(adapter_name, load_time))
+            if isinstance(loading_info, Mapping):
+                loading_info["missing_keys"].extend(missing_keys)
+                loading_info["unexpected_keys"].extend(unexpected_keys)
+                loading_info["load_times"][adapter_name] = load_time
+            results.append((resolved_folder, adapter_name))
 
-        return resolved_folder, adapter_name
+        return results
 
 
 class AdapterFusionLoader(WeightsLoader):
@@ -473,7 +1079,7 @@ class AdapterFusionLoader(WeightsLoader):
     """
 
     def __init__(self, model, error_on_missing=True):
-        super().__init__(model, ADAPTERFUSION_WEIGHTS_NAME, ADAPTERFUSION_CONFIG_NAME)
+        super().__init__(model, ADAPTERFUSION_WEIGHTS_NAME, ADAPTERFUSION_CONFIG_NAME, SAFE_ADAPTERFUSION_WEIGHTS_NAME)
         self.error_on_missing = error_on_missing
 
     def filter_func(self, adapter_fusion_name):
@@ -484,13 +1090,14 @@ class AdapterFusionLoader(WeightsLoader):
             "adapter_fusion_layer.{}".format(old_name), "adapter_fusion_layer.{}".format(new_name)
         )
 
-    def save(self, save_directory: str, name: str, meta_dict=None):
+    def save(self, save_directory: str, name: str, meta_dict=None, use_safetensors=False):
         """
         Saves a AdapterFusion module into the given directory.
 
         Args:
             save_directory (str): The directory to save the weights in.
             name (str, optional): The AdapterFusion name.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
 
         if name not in self.model.adapters_config.fusions:
@@ -519,7 +1126,7 @@ class AdapterFusionLoader(WeightsLoader):
 
         # Save head weights
         filter_func = self.filter_func(name)
-        self.weights_helper.save_weights(save_directory, filter_func)
+        self.weights_helper.save_weights(save_directory, filter_func, use_safetensors=use_safetensors, name=name)
 
     def load(self, save_directory, load_as=None, loading_info=None, **kwargs):
         """
@@ -533,7 +1140,7 @@ class AdapterFusionLoader(WeightsLoader):
             Tuple[str, str]: A tuple consisting of the local file system directory from which the weights where loaded
             and the name of the loaded weights.
         """
-        if not exists(join(save_directory, ADAPTERFUSION_WEIGHTS_NAME)):
+        if self.weights_helper.get_weights_file(save_directory) is None:
             if self.error_on_missing:
                 raise ValueError("Loading path should be a directory where AdapterFusion is saved.")
             else:
@@ -557,7 +1164,7 @@ class AdapterFusionLoader(WeightsLoader):
         else:
             rename_func = None
         self.weights_helper.load_weights(
-            save_directory, filter_func, rename_func=rename_func, loading_info=loading_info
+            save_directory, filter_func, rename_func=rename_func, loading_info=loading_info, name=adapter_fusion_name
         )
 
         return save_directory, adapter_fusion_name
@@ -572,7 +1179,7 @@ class PredictionHeadLoader(WeightsLoader):
     """
 
     def __init__(self, model, error_on_missing=True, convert_to_flex_head=False):
-        super().__init__(model, HEAD_WEIGHTS_NAME, HEAD_CONFIG_NAME)
+        super().__init__(model, HEAD_WEIGHTS_NAME, HEAD_CONFIG_NAME, SAFE_HEAD_WEIGHTS_NAME)
         self.error_on_missing = error_on_missing
         self.convert_to_flex_head = convert_to_flex_head
 
@@ -601,13 +1208,14 @@ class PredictionHeadLoader(WeightsLoader):
     def rename_func(self, old_name, new_name):
         return lambda k: k.replace("heads.{}".format(old_name), "heads.{}".format(new_name))
 
-    def save(self, save_directory: str, name: str = None):
+    def save(self, save_directory: str, name: str = None, use_safetensors=False):
         """
         Saves a prediction head module into the given directory.
 
         Args:
             save_directory (str): The directory to save the weights in.
             name (str, optional): The prediction head name.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
 
         if name:
@@ -653,7 +1261,7 @@ class PredictionHeadLoader(WeightsLoader):
         # Save head weights
 
         filter_func = self.filter_func(name)
-        self.weights_helper.save_weights(save_directory, filter_func)
+        self.weights_helper.save_weights(save_directory, filter_func, use_safetensors=use_safetensors, name=name)
 
     def load(self, save_directory, load_as=None, loading_info=None, **kwargs):
         """
@@ -667,7 +1275,7 @@ class PredictionHeadLoader(WeightsLoader):
             Tuple[str, str]: A tuple consisting of the local file system directory from which the weights where loaded
             and the name of the loaded weights.
         """
-        if not exists(join(save_directory, HEAD_WEIGHTS_NAME)):
+        if self.weights_helper.get_weights_file(save_directory) is None:
             if self.error_on_missing:
                 raise ValueError("Loading path should be a directory where the head is saved.")
             else:
@@ -684,7 +1292,7 @@ class PredictionHeadLoader(WeightsLoader):
         conversion_rename_func = None
 
         # Load head config if available - otherwise just blindly try to load the weights
-        if isfile(join(save_directory, HEAD_CONFIG_NAME)):
+        if self.weights_helper.config_exists(save_directory):
             config = self.weights_helper.load_weights_config(save_directory)
             # make sure that the model class of the loaded head matches the current class
             if not self.convert_to_flex_head and self.model.__class__.__name__ != config["model_class"]:
@@ -762,7 +1370,7 @@ class PredictionHeadLoader(WeightsLoader):
         if conversion_rename_func:
             rename_funcs.append(conversion_rename_func)
         self.weights_helper.load_weights(
-            save_directory, filter_func, rename_func=rename_funcs, loading_info=loading_info
+            save_directory, filter_func, rename_func=rename_funcs, loading_info=loading_info, name=head_name
         )
 
         return save_directory, head_name
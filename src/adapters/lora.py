@@ -4,7 +4,9 @@
 #  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
 #  ------------------------------------------------------------------------------------------
 import math
-from typing import Dict, List, Union
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
 import torch.nn as nn
@@ -13,8 +15,9 @@ import torch.nn.functional as F
 from transformers.configuration_utils import PretrainedConfig
 from transformers.pytorch_utils import Conv1D
 
-from .composition import AdapterCompositionBlock
+from .composition import AdapterCompositionBlock, BatchSplit, Parallel, Route
 from .configuration import LoRAConfig, ModelAdaptersConfig
+from .context import ForwardContext
 from .layer import AdapterLayerBase
 
 
@@ -93,6 +96,77 @@ class LoRA(nn.Module):
             raise ValueError("Invalid composition mode.")
 
 
+class MergedWeightsCache:
+    """
+    Least-recently-used cache of merged LoRA weights shared by the LoRA layers of a model. Switching to an adapter
+    whose merged weights are cached only swaps the weight tensors of the layers instead of recomputing them.
+
+    Args:
+        max_bytes (int): The maximum total size in bytes of all cached weights.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive number.")
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version) -> torch.Tensor:
+        """
+        Returns the cached weight for the given key if it was computed from parameters of the same version. Otherwise,
+        returns None.
+        """
+        entry = self._entries.get(key, None)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key, version, weight: torch.Tensor):
+        """
+        Adds the given weight to the cache, evicting the least recently used weights if the size limit is exceeded.
+        """
+        self.pop(key)
+        size = weight.numel() * weight.element_size()
+        if size > self.max_bytes:
+            return
+        while self.current_bytes + size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.numel() * evicted.element_size()
+            self.evictions += 1
+        self._entries[key] = (version, weight)
+        self.current_bytes += size
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1].numel() * entry[1].element_size()
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def cache_info(self) -> dict:
+        """Returns the statistics of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "current_bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
 class LoRALayer(AdapterLayerBase):
     def __init__(
         self, location_key: str, model_config: PretrainedConfig, adapters_config: ModelAdaptersConfig, *args, **kwargs
@@ -104,6 +178,10 @@ class LoRALayer(AdapterLayerBase):
         self.loras = nn.ModuleDict(dict())
 
         self.merged = False
+        self.merged_weights_cache = None
+        self._unmerged_weight = None
+        self._merged_lora_state = None
+        self._auto_merged = None
 
     def get_n_heads(self, lora: Union[LoRA, LoRAConfig]):
         return 1
@@ -158,7 +236,11 @@ class LoRALayer(AdapterLayerBase):
 
     def delete_adapter(self, adapter_name: str):
         if adapter_name in self.loras:
+            if self.merged == adapter_name:
+                self.reset_adapter()
             del self.loras[adapter_name]
+            if self.merged_weights_cache is not None:
+                self.merged_weights_cache.pop((id(self), adapter_name))
 
     def add_fusion_layer(self, adapter_names: Union[List, str]):
         pass  # not applicable to lora
@@ -185,6 +267,263 @@ class LoRALayer(AdapterLayerBase):
         else:
             return None
 
+    def reset_plans(self):
+        super().reset_plans()
+        self._batched_loras = {}
+
+    def _compute_merged_weight(self, adapter_name: str, lora: LoRA) -> torch.Tensor:
+        raise NotImplementedError()
+
+    def _merge_weight(self, adapter_name: str, lora: LoRA):
+        """
+        Replaces the layer weight with the weight merged with the given LoRA module. If the merged weights cache is
+        enabled, the merged weight is taken from the cache if possible and the base weight is kept to be swapped back
+        exactly on reset. Otherwise, the weight is merged in place and only the (low-rank) LoRA weights are kept to
+        undo the merge, even if the LoRA module is modified in the meantime.
+        """
+        cache = self.merged_weights_cache
+        if cache is None:
+            self._merged_lora_state = [p.detach().clone() for p in lora.parameters()]
+            with torch.no_grad():
+                self.weight.data = self._compute_merged_weight(adapter_name, lora)
+            return
+        key = (id(self), adapter_name)
+        # the cached weight is valid as long as neither the base weight nor the LoRA weights have been modified
+        version = tuple((p.data_ptr(), p._version) for p in [self.weight, *lora.parameters()])
+        merged_weight = cache.get(key, version)
+        if merged_weight is None:
+            with torch.no_grad():
+                merged_weight = self._compute_merged_weight(adapter_name, lora).detach()
+            cache.put(key, version, merged_weight)
+        self._unmerged_weight = self.weight.data
+        self.weight.data = merged_weight
+
+    @contextmanager
+    def _merged_lora_weights(self, lora: LoRA):
+        """
+        Temporarily sets the weights of the given LoRA module to the weights it was merged in place with.
+        """
+        state, self._merged_lora_state = self._merged_lora_state, None
+        params = list(lora.parameters())
+        current = [p.data for p in params]
+        if state is not None:
+            for p, data in zip(params, state):
+                p.data = data.to(p.device, p.dtype)
+        try:
+            yield lora
+        finally:
+            for p, data in zip(params, current):
+                p.data = data.to(p.device, p.dtype)
+
+    def _get_merge_version(self, adapter_name: str) -> tuple:
+        return tuple((p.data_ptr(), p._version) for p in [self.weight, *self.loras[adapter_name].parameters()])
+
+    def _get_auto_merge_adapter(self) -> Optional[str]:
+        """
+        Returns the name of the LoRA module to be merged automatically in the current state of the layer, if any.
+        """
+        if self.training or not self.adapters_config.merge_on_eval:
+            return None
+        adapter_setup = self.get_active_setup(self.loras)
+        if (
+            adapter_setup is None
+            or isinstance(adapter_setup, (Parallel, BatchSplit, Route))
+            or len(adapter_setup) != 1
+            or not isinstance(adapter_setup[0], str)
+        ):
+            return None
+        lora = self.loras[adapter_setup[0]]
+        if lora.use_gating:
+            return None
+        # gradients cannot flow back to the LoRA weights through merged weights
+        if torch.is_grad_enabled() and any(p.requires_grad for p in lora.parameters()):
+            return None
+        return adapter_setup[0]
+
+    def update_auto_merge(self):
+        """
+        Merges the active LoRA module into the layer weight if merging in eval mode is enabled. Automatically merged
+        weights are reset as soon as the layer is trained, the active setup changes or any of the weights is modified.
+        """
+        if self._auto_merged is not None:
+            name, version = self._auto_merged
+            if self._get_auto_merge_adapter() != name or self._get_merge_version(name) != version:
+                self.reset_adapter()
+        if not self.merged and self.adapters_config.merge_on_eval:
+            name = self._get_auto_merge_adapter()
+            if name is not None:
+                self._merge_weight(name, self.loras[name])
+                self.merged = name
+                self._auto_merged = (name, self._get_merge_version(name))
+
+    def train(self, mode: bool = True):
+        # automatically merged weights are only used in eval mode
+        if mode and self._auto_merged is not None:
+            self.reset_adapter()
+        return super().train(mode)
+
+    def state_dict(self, *args, **kwargs):
+        # never save automatically merged weights
+        if self._auto_merged is not None:
+            self.reset_adapter()
+        return super().state_dict(*args, **kwargs)
+
+    def _restore_unmerged_weight(self) -> bool:
+        """
+        Swaps back the base weight replaced by a cached merged weight. Returns False if there is none to restore.
+        """
+        unmerged_weight, self._unmerged_weight = self._unmerged_weight, None
+        # the weight might have been moved or cast since merging
+        if unmerged_weight is None or (unmerged_weight.device, unmerged_weight.dtype) != (
+            self.weight.device,
+            self.weight.dtype,
+        ):
+            return False
+        self.weight.data = unmerged_weight
+        return True
+
+    def _single_forward(self, adapter_name: str, x: torch.Tensor, result: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError()
+
+    def _get_dense_weights(self, lora: LoRA) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns the low-rank weights A of shape (k, in_features) and B of shape (out_features, k) of the given LoRA
+        module such that its (scaled) update is computed by x @ A^T @ B^T.
+        """
+        raise NotImplementedError()
+
+    def _get_scale_vector(self, lora: LoRA) -> torch.Tensor:
+        """
+        Returns the (scaled) vector of shape (out_features,) which the output is multiplied with for LoRA modules in
+        "scale" composition mode.
+        """
+        raise NotImplementedError()
+
+    def _get_segment_ids(self, adapter_setup: AdapterCompositionBlock, batch_size: int, device) -> torch.Tensor:
+        """
+        Returns, for each example of the batch, the index of the child of the given block it is passed through.
+        """
+        if isinstance(adapter_setup, Route):
+            route_ids, _ = self._get_route_indices(adapter_setup, batch_size, device)
+            return route_ids
+        elif isinstance(adapter_setup, BatchSplit):
+            if not sum(adapter_setup.batch_sizes) == batch_size:
+                raise IndexError(
+                    "The given batch has a size of {} which is not compatible with batch_sizes {}".format(
+                        batch_size, adapter_setup.batch_sizes
+                    )
+                )
+            batch_sizes = torch.tensor(adapter_setup.batch_sizes, device=device)
+        else:
+            # LoRA modules cannot replicate the input themselves as they only modify single projections.
+            # Therefore, the input must have been replicated before, which is done by the model in forward_context().
+            context = ForwardContext.get_context()
+            if not getattr(context, "adapters_parallelized", False):
+                raise ValueError(
+                    "The input of a Parallel block with LoRA must be replicated for all parallel channels beforehand,"
+                    " e.g. by passing adapter_input_parallelized=True."
+                )
+            if batch_size % adapter_setup.parallel_channels != 0:
+                raise ValueError(
+                    "The total input batch size in a Parallel adapter block must be divisible by the number of"
+                    " parallel channels."
+                )
+            batch_sizes = torch.full((len(adapter_setup),), batch_size // len(adapter_setup), device=device)
+        return torch.repeat_interleave(torch.arange(len(adapter_setup), device=device), batch_sizes)
+
+    def _stack_lora_weights(self, adapter_setup: AdapterCompositionBlock, composition_mode: str):
+        if composition_mode == "scale":
+            scale = [
+                self._get_scale_vector(self.loras[name])
+                if name in self.loras and self.loras[name].r > 0
+                else self.weight.new_ones(self.out_features)
+                for name in adapter_setup
+            ]
+            return (torch.stack(scale),)
+
+        dense_weights = [
+            self._get_dense_weights(self.loras[name])
+            if name in self.loras and self.loras[name].r > 0
+            else (self.weight.new_zeros(0, self.in_features), self.weight.new_zeros(self.out_features, 0))
+            for name in adapter_setup
+        ]
+        # pad different ranks with zeros
+        max_rank = max(lora_A.shape[0] for lora_A, _ in dense_weights)
+        lora_A = torch.stack([F.pad(a, (0, 0, 0, max_rank - a.shape[0])) for a, _ in dense_weights])
+        lora_B = torch.stack([F.pad(b, (0, max_rank - b.shape[1])) for _, b in dense_weights])
+        return lora_A, lora_B
+
+    def _get_batched_weights(self, adapter_setup: AdapterCompositionBlock):
+        """
+        Returns the composition mode of the LoRA modules of the given block and their weights stacked along a new
+        first dimension, if the updates of all modules can be computed in one batched pass. Otherwise, returns None.
+
+        Stacked weights are cached as long as the underlying parameters are not modified. If gradients are required,
+        weights are re-stacked in every call so that gradients flow back to the individual LoRA modules.
+        """
+        batched_loras = getattr(self, "_batched_loras", None)
+        if batched_loras is None:
+            batched_loras = self._batched_loras = {}
+        key = tuple(map(str, adapter_setup))
+        if key not in batched_loras:
+            loras = [self.loras[name] for name in adapter_setup if name in self.loras]
+            if (
+                all(isinstance(child, str) for child in adapter_setup)
+                and len(set(lora.composition_mode for lora in loras)) == 1
+                and not any(lora.use_gating for lora in loras)
+            ):
+                batched_loras[key] = {"loras": loras, "composition_mode": loras[0].composition_mode}
+            else:
+                batched_loras[key] = None
+        entry = batched_loras[key]
+        if entry is None:
+            return None
+
+        loras = entry["loras"]
+        # dropout is applied per module
+        if any(lora.training and isinstance(lora.lora_dropout, nn.Dropout) for lora in loras):
+            return None
+        params = [p for lora in loras for p in lora.parameters()]
+        if torch.is_grad_enabled() and any(p.requires_grad for p in params):
+            return entry["composition_mode"], self._stack_lora_weights(adapter_setup, entry["composition_mode"])
+        # parameter versions are bumped by in-place updates (e.g. optimizer steps or loading weights)
+        version = tuple((p.data_ptr(), p._version) for p in params)
+        if entry.get("version", None) != version:
+            with torch.no_grad():
+                entry["weights"] = self._stack_lora_weights(adapter_setup, entry["composition_mode"])
+            entry["version"] = version
+        return entry["composition_mode"], entry["weights"]
+
+    def _multi_forward(self, adapter_setup: AdapterCompositionBlock, x: torch.Tensor, result: torch.Tensor):
+        """
+        Applies the LoRA modules of a Parallel, BatchSplit or Route block to the base layer output. Each example is
+        passed through the LoRA module of its segment. If possible, the weights of all modules are gathered per
+        example and the low-rank updates are computed in one batched pass.
+        """
+        segment_ids = self._get_segment_ids(adapter_setup, x.shape[0], x.device)
+        batched = self._get_batched_weights(adapter_setup)
+        if batched is not None:
+            composition_mode, weights = batched
+            if composition_mode == "scale":
+                (scale,) = weights
+                scale = scale[segment_ids].view(x.shape[0], *([1] * (result.dim() - 2)), -1)
+                return result * scale
+            else:
+                lora_A, lora_B = weights
+                x = x.reshape(x.shape[0], -1, x.shape[-1])
+                after_A = torch.bmm(x, lora_A[segment_ids].transpose(1, 2))
+                delta_w = torch.bmm(after_A, lora_B[segment_ids].transpose(1, 2))
+                return result + delta_w.view(result.shape)
+
+        # otherwise, compute the updates of all LoRA modules separately
+        for i, child in enumerate(adapter_setup):
+            if isinstance(child, AdapterCompositionBlock):
+                raise ValueError(f"Invalid adapter setup. Cannot use {adapter_setup} with LoRA.")
+            idx = (segment_ids == i).nonzero(as_tuple=True)[0]
+            if child in self.loras and len(idx) > 0:
+                result = result.index_copy(0, idx, self._single_forward(child, x[idx], result[idx]))
+        return result
+
 
 class Linear(LoRALayer, nn.Linear):
     """
@@ -265,6 +604,12 @@ class Linear(LoRALayer, nn.Linear):
     def _get_lora_shapes(self, config: LoRAConfig):
         return (config.r, self.in_features), (self.out_features, config.r)
 
+    def _get_dense_weights(self, lora: LoRA) -> Tuple[torch.Tensor, torch.Tensor]:
+        return lora.lora_A, lora.lora_B * lora.scaling
+
+    def _get_scale_vector(self, lora: LoRA) -> torch.Tensor:
+        return lora.lora_B.view(-1) * lora.scaling
+
     def reset_adapter(self):
         def T(w):
             return torch.t(w) if self.fan_in_fan_out else w
@@ -272,13 +617,16 @@ class Linear(LoRALayer, nn.Linear):
         if self.merged:
             lora = self.loras[self.merged]
             # Make sure that the weights are not merged
-            if lora.r > 0:
-                if lora.composition_mode == "scale":
-                    delta_w = T(lora.lora_B)
-                else:
-                    delta_w = T(lora.lora_B @ lora.lora_A)
-                self.weight.data = lora.com_inv(self.weight.data, delta_w)
+            if not self._restore_unmerged_weight() and lora.r > 0:
+                with self._merged_lora_weights(lora), torch.no_grad():
+                    if lora.composition_mode == "scale":
+                        delta_w = T(lora.lora_B)
+                    else:
+                        delta_w = T(lora.lora_B @ lora.lora_A)
+                    self.weight.data = lora.com_inv(self.weight.data, delta_w)
+            self._merged_lora_state = None
             self.merged = None
+            self._auto_merged = None
 
     def _compute_adapted_weight(self, lora, scaling=None):
         def T(w):
@@ -295,7 +643,12 @@ class Linear(LoRALayer, nn.Linear):
 
         return weight
 
+    def _compute_merged_weight(self, adapter_name: str, lora: LoRA) -> torch.Tensor:
+        return self._compute_adapted_weight(lora)
+
     def merge_adapter(self, name: str):
+        if self._auto_merged is not None:
+            self.reset_adapter()
         if name in self.loras:
             if self.merged == name:
                 return  # already merged
@@ -303,7 +656,7 @@ class Linear(LoRALayer, nn.Linear):
                 lora = self.loras[name]
                 if lora.use_gating:
                     raise ValueError("Cannot merge LoRA layer with gating.")
-                self.weight.data = self._compute_adapted_weight(lora)
+                self._merge_weight(name, lora)
                 self.merged = name
             elif self.merged != name:
                 raise ValueError("LoRALayer already has a merged LoRA module. Please reset it first.")
@@ -312,31 +665,38 @@ class Linear(LoRALayer, nn.Linear):
         def T(w):
             return torch.transpose(w, -2, -1) if self.fan_in_fan_out else w
 
+        if self._auto_merged is not None or self.adapters_config.merge_on_eval:
+            self.update_auto_merge()
         if not self.merged:
             adapter_setup = self.get_active_setup(self.loras)
             if adapter_setup is not None:
-                if len(adapter_setup) == 1:
-                    lora = self.loras[adapter_setup[0]]
-                    # result shape: <batch_size> x <seq_len> x <head_dim>
-                    result = F.linear(x, T(self.weight), bias=self.bias)
-                    if lora.r > 0:
-                        if lora.composition_mode == "scale":
-                            delta_w = lora.lora_B.view(1, 1, -1)
-                        else:
-                            delta_w = lora.lora_dropout(x) @ torch.t(lora.lora_A) @ torch.t(lora.lora_B)
-                        if lora.use_gating:
-                            gate = torch.sigmoid(lora.gate(x))
-                            gate = torch.mean(gate, dim=1).unsqueeze(-1)
-                            self._store_gating_score(adapter_setup[0], gate)
-                        else:
-                            gate = None
-                        result = lora.com(result, delta_w, scaling=gate)
-                    return result
+                # result shape: <batch_size> x <seq_len> x <head_dim>
+                result = F.linear(x, T(self.weight), bias=self.bias)
+                if isinstance(adapter_setup, (Parallel, BatchSplit, Route)):
+                    return self._multi_forward(adapter_setup, x, result)
+                elif len(adapter_setup) == 1:
+                    return self._single_forward(adapter_setup[0], x, result)
                 else:
                     raise ValueError(f"Invalid adapter setup. Cannot use {adapter_setup} with LoRA.")
 
         return F.linear(x, T(self.weight), bias=self.bias)
 
+    def _single_forward(self, adapter_name: str, x: torch.Tensor, result: torch.Tensor) -> torch.Tensor:
+        lora = self.loras[adapter_name]
+        if lora.r > 0:
+            if lora.composition_mode == "scale":
+                delta_w = lora.lora_B.view(1, 1, -1)
+            else:
+                delta_w = lora.lora_dropout(x) @ torch.t(lora.lora_A) @ torch.t(lora.lora_B)
+            if lora.use_gating:
+                gate = torch.sigmoid(lora.gate(x))
+                gate = torch.mean(gate, dim=1).unsqueeze(-1)
+                self._store_gating_score(adapter_name, gate)
+            else:
+                gate = None
+            result = lora.com(result, delta_w, scaling=gate)
+        return result
+
 
 class MergedLinear(LoRALayer, nn.Linear):
     """
@@ -441,6 +801,17 @@ class MergedLinear(LoRALayer, nn.Linear):
         result[:, lora.lora_ind] = x.reshape(-1, self.out_features // 3 * self.get_n_heads(lora))
         return result.view((*x.shape[:-1], self.out_features))
 
+    def _get_dense_weights(self, lora: LoRA) -> Tuple[torch.Tensor, torch.Tensor]:
+        # the grouped convolution of B corresponds to a block-diagonal matrix, padded to the full output size
+        n_groups = sum(lora.enable_lora)
+        lora_B = torch.block_diag(*lora.lora_B.split(lora.lora_B.shape[0] // n_groups))
+        padded_B = lora_B.new_zeros(self.out_features, lora_B.shape[1])
+        padded_B[lora.lora_ind] = lora_B
+        return lora.lora_A, padded_B * lora.scaling
+
+    def _get_scale_vector(self, lora: LoRA) -> torch.Tensor:
+        return self.pad(lora.lora_B.view(-1), lora) * lora.scaling
+
     def reset_adapter(self):
         def T(w):
             return w if self.fan_in_fan_out else torch.t(w)
@@ -448,17 +819,22 @@ class MergedLinear(LoRALayer, nn.Linear):
         if self.merged:
             lora = self.loras[self.merged]
             # Make sure that the weights are not merged
-            if lora.r > 0 and any(lora.enable_lora):
-                if lora.composition_mode == "scale":
-                    delta_w = lora.lora_B
-                else:
-                    delta_w = F.conv1d(
-                        lora.lora_A.data.unsqueeze(0), lora.lora_B.data.unsqueeze(-1), groups=sum(lora.enable_lora)
-                    ).squeeze(0)
-                # shape after transpose: <head_dim> x <head_dim * n_heads>
-                delta_w = delta_w.transpose(-2, -1)
-                self.weight.data = lora.com_inv(self.weight.data, T(self.pad(delta_w, lora)))
+            if not self._restore_unmerged_weight() and lora.r > 0 and any(lora.enable_lora):
+                with self._merged_lora_weights(lora), torch.no_grad():
+                    if lora.composition_mode == "scale":
+                        delta_w = lora.lora_B
+                    else:
+                        delta_w = F.conv1d(
+                            lora.lora_A.data.unsqueeze(0),
+                            lora.lora_B.data.unsqueeze(-1),
+                            groups=sum(lora.enable_lora),
+                        ).squeeze(0)
+                    # shape after transpose: <head_dim> x <head_dim * n_heads>
+                    delta_w = delta_w.transpose(-2, -1)
+                    self.weight.data = lora.com_inv(self.weight.data, T(self.pad(delta_w, lora)))
+            self._merged_lora_state = None
             self.merged = None
+            self._auto_merged = None
 
     def _compute_adapted_weight(self, name, lora):
         def T(w):
@@ -478,7 +854,12 @@ class MergedLinear(LoRALayer, nn.Linear):
 
         return weight
 
+    def _compute_merged_weight(self, adapter_name: str, lora: LoRA) -> torch.Tensor:
+        return self._compute_adapted_weight(adapter_name, lora)
+
     def merge_adapter(self, name: str):
+        if self._auto_merged is not None:
+            self.reset_adapter()
         if name in self.loras:
             if self.merged == name:
                 return  # already merged
@@ -486,7 +867,7 @@ class MergedLinear(LoRALayer, nn.Linear):
                 lora = self.loras[name]
                 if lora.use_gating:
                     raise ValueError("Cannot merge LoRA layer with gating.")
-                self.weight.data = self._compute_adapted_weight(name, lora)
+                self._merge_weight(name, lora)
                 self.merged = name
             elif self.merged != name:
                 raise ValueError("LoRALayer already has a merged LoRA module. Please reset it first.")
@@ -495,34 +876,41 @@ class MergedLinear(LoRALayer, nn.Linear):
         def T(w):
             return torch.t(w) if self.fan_in_fan_out else w
 
+        if self._auto_merged is not None or self.adapters_config.merge_on_eval:
+            self.update_auto_merge()
         if not self.merged:
             adapter_setup = self.get_active_setup(self.loras)
             if adapter_setup is not None:
-                if len(adapter_setup) == 1:
-                    result = F.linear(x, T(self.weight), bias=self.bias)
-                    lora = self.loras[adapter_setup[0]]
-                    if lora.r > 0:
-                        if lora.composition_mode == "scale":
-                            delta_w = lora.lora_B.view(1, 1, -1)
-                        else:
-                            after_A = F.linear(lora.lora_dropout(x), lora.lora_A)
-                            after_B = F.conv1d(
-                                after_A.transpose(-2, -1), lora.lora_B.unsqueeze(-1), groups=sum(lora.enable_lora)
-                            ).transpose(-2, -1)
-                            delta_w = after_B
-                        if lora.use_gating:
-                            gate = torch.sigmoid(lora.gate(x))
-                            gate = torch.mean(gate, dim=1)
-                            self._store_gating_score(adapter_setup[0], gate)
-                            gate = self.pad(
-                                gate.repeat_interleave(self.out_features // 3, dim=-1), lora, fill_value=1
-                            ).unsqueeze(1)
-                        else:
-                            gate = None
-                        # result = (batch_size, seq_len, head_dim * 3)
-                        result = lora.com(result, self.pad(delta_w, lora), scaling=gate)
-                    return result
+                result = F.linear(x, T(self.weight), bias=self.bias)
+                if isinstance(adapter_setup, (Parallel, BatchSplit, Route)):
+                    return self._multi_forward(adapter_setup, x, result)
+                elif len(adapter_setup) == 1:
+                    return self._single_forward(adapter_setup[0], x, result)
                 else:
                     raise ValueError(f"Invalid adapter setup. Cannot use {adapter_setup} with LoRA.")
 
         return F.linear(x, T(self.weight), bias=self.bias)
+
+    def _single_forward(self, adapter_name: str, x: torch.Tensor, result: torch.Tensor) -> torch.Tensor:
+        lora = self.loras[adapter_name]
+        if lora.r > 0:
+            if lora.composition_mode == "scale":
+                delta_w = lora.lora_B.view(1, 1, -1)
+            else:
+                after_A = F.linear(lora.lora_dropout(x), lora.lora_A)
+                after_B = F.conv1d(
+                    after_A.transpose(-2, -1), lora.lora_B.unsqueeze(-1), groups=sum(lora.enable_lora)
+                ).transpose(-2, -1)
+                delta_w = after_B
+            if lora.use_gating:
+                gate = torch.sigmoid(lora.gate(x))
+                gate = torch.mean(gate, dim=1)
+                self._store_gating_score(adapter_name, gate)
+                gate = self.pad(gate.repeat_interleave(self.out_features // 3, dim=-1), lora, fill_value=1).unsqueeze(
+                    1
+                )
+            else:
+                gate = None
+            # result = (batch_size, seq_len, head_dim * 3)
+            result = lora.com(result, self.pad(delta_w, lora), scaling=gate)
+        return result
@@ -1,9 +1,11 @@
 import inspect
 import logging
 import os
+import tempfile
 import warnings
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from functools import partial
 from os.path import join
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
@@ -12,15 +14,17 @@ from torch import nn
 
 from transformers.modeling_outputs import ModelOutput
 
-from .composition import AdapterCompositionBlock, Fuse, Stack, parse_composition
-from .configuration import ADAPTER_CONFIG_MAP, AdapterConfigBase, AdapterFusionConfig, BnConfig
+from .composition import AdapterCompositionBlock, Fuse, Parallel, Stack, parse_composition, replicate_batch
+from .configuration import ADAPTER_CONFIG_MAP, AdapterConfigBase, AdapterFusionConfig, BnConfig, LoRAConfig
 from .context import AdapterSetup, ForwardContext
 from .hub_mixin import PushAdapterToHubMixin
 from .layer import AdapterLayer, AdapterLayerBase
-from .loading import AdapterFusionLoader, AdapterLoader, PredictionHeadLoader, WeightsLoader
-from .lora import LoRALayer
-from .modeling import Adapter, GLOWCouplingBlock, NICECouplingBlock, init_shared_parameters
+from .loading import AdapterFusionLoader, AdapterLoader, PredictionHeadLoader, WeightsLoader, pack_adapters
+from .lora import LoRALayer, MergedWeightsCache
+from .modeling import Adapter, GLOWCouplingBlock, NICECouplingBlock, compute_shared_parameters, init_shared_parameters
 from .prefix_tuning import PrefixTuningPool, PrefixTuningShim
+from .registry import AdapterRegistry
+from .residency import AdapterResidencyManager
 from .utils import EMBEDDING_FILE, TOKENIZER_PATH, get_adapter_config_hash, inherit_doc
 from .wrappers.configuration import SUBMODEL_NAMES, init_adapters_config
 
@@ -360,6 +364,38 @@ class EmbeddingAdaptersWrapperMixin:
         return self.base_model.loaded_embeddings
 
 
+class AdapterLayerIndex:
+    """
+    Index of all adapter layers and prefix tuning pools of a model. It is built once, so management methods don't
+    have to walk the full module tree.
+
+    Args:
+        model: The model to index. Must implement `iter_layers()`.
+    """
+
+    def __init__(self, model: nn.Module):
+        # (layer id, position of the layer, module) of all adapter layers contained in the layers of the model
+        self.layers: List[Tuple[int, int, AdapterLayerBase]] = []
+        for position, (i, layer) in enumerate(model.iter_layers()):
+            for module in layer.modules():
+                if isinstance(module, AdapterLayerBase):
+                    self.layers.append((i, position, module))
+        # all adapter layers and pools of the model, including those outside of its layers
+        self.adapter_layers: List[AdapterLayerBase] = []
+        self.lora_layers: List[LoRALayer] = []
+        self.prefix_tuning_pools: List[PrefixTuningPool] = []
+        for module in model.modules():
+            if isinstance(module, AdapterLayerBase):
+                self.adapter_layers.append(module)
+            if isinstance(module, LoRALayer):
+                self.lora_layers.append(module)
+            elif isinstance(module, PrefixTuningPool):
+                self.prefix_tuning_pools.append(module)
+
+    def layers_of_type(self, layer_type: type) -> Iterable[Tuple[int, int, AdapterLayerBase]]:
+        return ((i, position, module) for i, position, module in self.layers if isinstance(module, layer_type))
+
+
 class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
     """Mixin for transformer models adding support for loading/ saving adapters."""
 
@@ -388,6 +424,16 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         This method initializes adapter modules and fusion modules from the model config.
         """
         self.base_model.shared_parameters = nn.ModuleDict()
+        # Loading functions of lazily loaded adapter weights, called on first activation
+        self.base_model._lazy_adapter_weights = {}
+        # Adapters registered via register_adapter(), loaded on first activation
+        self.base_model._adapter_registry = AdapterRegistry()
+        # Placement of adapter modules set up via enable_adapter_offloading()
+        self.base_model._adapter_residency = None
+        # Names of all module containers, indexed on first access by _get_adapter_state_modules()
+        self._adapter_containers = None
+        # All adapter layers and pools, indexed on first access by _get_adapter_layer_index()
+        self._adapter_layer_index = None
 
         # Initialize adapters config
         init_adapters_config(self, model_config, adapters_config)
@@ -397,6 +443,8 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         # Link all prefix tunings
         if add_prefix_tuning_pool:
             self.base_model.prefix_tuning = PrefixTuningPool(self.config, self.adapters_config)
+            # the base model might have been indexed with the pool replaced here
+            self.base_model._adapter_layer_index = None
             self.apply_to_adapter_layers(lambda i, layer: self._link_prefix_to_pool(layer))
 
         # Initialize adapters from config
@@ -420,14 +468,57 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         """
         pass
 
+    def _get_adapter_layer_index(self) -> AdapterLayerIndex:
+        if getattr(self, "_adapter_layer_index", None) is None:
+            self._adapter_layer_index = AdapterLayerIndex(self)
+        return self._adapter_layer_index
+
     def apply_to_adapter_layers(self, fn):
         """
         Applies a function to all adapter layers of the model.
         """
-        for i, layer in self.iter_layers():
-            for module in layer.modules():
-                if isinstance(module, AdapterLayerBase):
-                    fn(i, module)
+        for i, _, module in self._get_adapter_layer_index().layers:
+            fn(i, module)
+
+    def reset_plans(self):
+        """
+        Clears the execution plans compiled for the adapter setups in all adapter layers. Plans are recompiled on the
+        next forward pass.
+        """
+        for module in self._get_adapter_layer_index().adapter_layers:
+            module.reset_plans()
+
+    def _get_adapter_state_modules(self, name: str) -> List[Tuple[str, nn.Module]]:
+        """
+        Returns the fully qualified names and the modules of all submodules registered under the given adapter, fusion
+        or head name. This allows extracting and loading the weights of a single module without traversing the full
+        model.
+
+        Args:
+            name (str): The name of the adapter, fusion or head.
+
+        Returns:
+            List[Tuple[str, nn.Module]]: The names and modules, excluding modules nested in another returned module.
+        """
+        # All adapter modules are stored in module dicts keyed by their name, which are created with the model.
+        # Shared modules are included under all their names, as in the model's state dict.
+        if getattr(self, "_adapter_containers", None) is None:
+            self._adapter_containers = [
+                n for n, m in self.named_modules(remove_duplicate=False) if isinstance(m, nn.ModuleDict)
+            ]
+        state_modules = []
+        for container_name in self._adapter_containers:
+            try:
+                container = self.get_submodule(container_name)
+            except AttributeError:
+                # container was part of a deleted module
+                continue
+            if isinstance(container, nn.ModuleDict) and name in container:
+                module_name = f"{container_name}.{name}" if container_name else name
+                # skip modules nested in another module of this name, their weights are already included
+                if not any(module_name.startswith(other + ".") for other, _ in state_modules):
+                    state_modules.append((module_name, container[name]))
+        return state_modules
 
     def train_adapter(self, adapter_setup: Union[list, AdapterCompositionBlock], train_embeddings=False):
         """Sets the model into mode for training the given adapters."""
@@ -486,6 +577,104 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
     def set_shared_parameters(self, param):
         self.base_model.shared_parameters = param
 
+    def _load_registered_adapters(self, adapter_names: List[str]):
+        """
+        Loads registered adapters that are not in the model and evicts the least recently used registered adapters if
+        the memory budget is exceeded.
+        """
+        registry = self.base_model._adapter_registry
+        if len(registry) == 0:
+            return
+        for name in adapter_names:
+            if name in registry and not registry.touch(name):
+                registry.load(name)
+        # never evict adapters of the default setup
+        keep = adapter_names + (list(self.active_adapters.flatten()) if self.active_adapters else [])
+        for name in registry.get_evictions(keep=keep):
+            registry.evict(name)
+
+    def _load_lazy_adapter_weights(self, adapter_names: Iterable[str]):
+        """
+        Loads registered adapters and reads the weights of lazily loaded adapters from disk if they have not been read
+        yet.
+        """
+        adapter_names = list(adapter_names)
+        self._load_registered_adapters(adapter_names)
+        lazy_adapter_weights = self.base_model._lazy_adapter_weights
+        if not lazy_adapter_weights:
+            return
+        for name in adapter_names:
+            load_weights = lazy_adapter_weights.pop(name, None)
+            if load_weights is not None:
+                load_weights()
+
+    def _place_adapters(self, adapter_names: List[str]):
+        """Moves the modules of the given adapters and the default setup to the device if offloading is enabled."""
+        residency = self.base_model._adapter_residency
+        if residency is None:
+            return
+        residency.activate(
+            list(adapter_names) + (list(self.active_adapters.flatten()) if self.active_adapters else [])
+        )
+
+    def enable_adapter_offloading(
+        self, device: Optional[Union[torch.device, str]] = None, pin_memory: bool = True, read_only: bool = False
+    ):
+        """
+        Keeps the weights of all adapter, fusion and head modules not used by the active adapter setup in host memory.
+        Modules are moved to the device when their adapters are activated (via `set_active_adapters()` or
+        `AdapterSetup`) and back to host memory when other adapters are activated. Use `prefetch_adapters()` to move
+        adapters to the device in the background ahead of their activation. Call this method after moving the model to
+        its device.
+
+        Args:
+            device (torch.device or str, optional): The device of the active modules. Defaults to the device of the
+                model.
+            pin_memory (bool, optional):
+                Keep inactive modules in page-locked memory for faster, asynchronous transfers. Defaults to True.
+            read_only (bool, optional):
+                Promise that adapter weights are not modified while offloading is enabled, e.g. for inference. This
+                avoids copying the weights back to host memory whenever other adapters are activated. Defaults to
+                False.
+
+        Returns:
+            AdapterResidencyManager: The manager handling the placement of the modules.
+        """
+        if self.base_model._adapter_residency is not None:
+            self.disable_adapter_offloading()
+        residency = AdapterResidencyManager(self, device or self.device, pin_memory=pin_memory, read_only=read_only)
+        self.base_model._adapter_residency = residency
+        names = (
+            list(self.adapters_config.adapters) + list(self.adapters_config.fusions) + list(getattr(self, "heads", {}))
+        )
+        for name in names:
+            residency.offload(name)
+        self._place_adapters([])
+        return residency
+
+    def disable_adapter_offloading(self):
+        """
+        Moves all adapter modules placed in host memory via `enable_adapter_offloading()` back to the device.
+        """
+        residency = self.base_model._adapter_residency
+        if residency is not None:
+            residency.close()
+            self.base_model._adapter_residency = None
+
+    def prefetch_adapters(self, adapter_setup: Union[list, AdapterCompositionBlock]):
+        """
+        Starts moving the modules of the given adapter setup to the device in the background, e.g. while the current
+        batch is processed. Requires offloading to be enabled via `enable_adapter_offloading()`.
+
+        Args:
+            adapter_setup (list): The adapter setup to be prefetched.
+        """
+        residency = self.base_model._adapter_residency
+        if residency is None:
+            raise ValueError("Adapter offloading is not enabled. Call enable_adapter_offloading() first.")
+        adapter_setup = parse_composition(adapter_setup, model_type=self.config.model_type)
+        residency.prefetch(residency.get_module_names(adapter_setup.flatten()))
+
     def set_active_adapters(
         self, adapter_setup: Union[list, AdapterCompositionBlock], skip_layers: Optional[List[int]] = None
     ):
@@ -499,17 +688,21 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         """
         adapter_setup = parse_composition(adapter_setup, model_type=self.config.model_type)
         if adapter_setup:
+            self._load_lazy_adapter_weights(adapter_setup.flatten())
             for adapter_name in adapter_setup.flatten():
                 if adapter_name not in self.adapters_config.adapters:
                     raise ValueError(
                         f"No adapter with name '{adapter_name}' found. Please make sure that all specified adapters"
                         " are correctly loaded."
                     )
+            self._place_adapters(adapter_setup.flatten())
 
         # Make sure LoRA is reset
         self.reset_adapter()
         self.adapters_config.active_setup = adapter_setup
         self.adapters_config.skip_layers = skip_layers
+        # Plans of the new setup are compiled on the next forward pass
+        self.reset_plans()
 
     def add_adapter(self, adapter_name: str, config=None, overwrite_ok: bool = False, set_active: bool = False):
         """
@@ -541,9 +734,54 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         if set_active:
             self.set_active_adapters(adapter_name)
 
-    def _add_adapter_weights(self, adapter_name: str):
-        """Helper method that performs the actual parameter additions when adding a new adapter."""
-        self.apply_to_adapter_layers(lambda i, layer: layer.add_adapter(adapter_name, i))
+    def _add_adapters(self, adapter_configs: Dict[str, Any]):
+        """
+        Adds multiple new adapter modules with the given configurations in a single pass over the model.
+
+        Args:
+            adapter_configs (Dict[str, Any]): A dictionary mapping the names of the adapters to their configurations.
+        """
+        # resolve each config only once if it is shared by multiple adapters
+        loaded_configs = {}
+        for config in adapter_configs.values():
+            if id(config) not in loaded_configs:
+                loaded_configs[id(config)] = AdapterConfigBase.load(config)
+        self.adapters_config.add_multiple(
+            {adapter_name: loaded_configs[id(config)] for adapter_name, config in adapter_configs.items()}
+        )
+        try:
+            self._add_adapter_weights(list(adapter_configs.keys()))
+        except ValueError as ex:
+            for adapter_name in adapter_configs:
+                self.delete_adapter(adapter_name)
+            raise ex
+
+    def _add_adapter_weights(self, adapter_name: Union[str, List[str]]):
+        """
+        Helper method that performs the actual parameter additions when adding a new adapter. If a list of adapter
+        names is given, all adapters are added in a single pass over the adapter layers.
+        """
+        adapter_names = [adapter_name] if isinstance(adapter_name, str) else adapter_name
+        if len(adapter_names) == 0:
+            return
+
+        def add_adapters(i, layer):
+            for name in adapter_names:
+                layer.add_adapter(name, i)
+
+        self.apply_to_adapter_layers(add_adapters)
+        self.reset_plans()
+        for adapter_name in adapter_names:
+            self._add_shared_adapter_weights(adapter_name)
+        # Prefix Tuning
+        for module in self._get_adapter_layer_index().prefix_tuning_pools:
+            for adapter_name in adapter_names:
+                module.confirm_prefix(adapter_name)
+        if isinstance(self, InvertibleAdaptersMixin) or isinstance(self, InvertibleAdaptersWrapperMixin):
+            for adapter_name in adapter_names:
+                self.add_invertible_adapter(adapter_name)
+
+    def _add_shared_adapter_weights(self, adapter_name: str):
         # PHM Layer
         if self.adapters_config.match(adapter_name, BnConfig, location_key="phm_layer"):
             adapter_module = list(self.get_adapter(adapter_name)[0].values())[0]
@@ -569,12 +807,6 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
                     self.base_model.shared_parameters[adapter_name] = init_shared_parameters(
                         adapter_config, self.config.hidden_size, self.device
                     )
-        # Prefix Tuning
-        for module in self.modules():
-            if isinstance(module, PrefixTuningPool):
-                module.confirm_prefix(adapter_name)
-        if isinstance(self, InvertibleAdaptersMixin) or isinstance(self, InvertibleAdaptersWrapperMixin):
-            self.add_invertible_adapter(adapter_name)
 
     def add_fusion(self, adapter_names: Union[Fuse, list], adapter_fusion_config=None, override_kwargs=None):
         warnings.warn(
@@ -623,6 +855,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             self.delete_adapter_fusion(adapter_names)
         self.adapters_config.add_fusion(adapter_names, config=config)
         self.apply_to_adapter_layers(lambda i, layer: layer.add_fusion_layer(adapter_names))
+        self.reset_plans()
         if set_active:
             if not isinstance(adapter_names, list):
                 adapter_names = adapter_names.split(",")
@@ -638,8 +871,14 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         if adapter_name not in self.adapters_config:
             logger.info("No adapter '%s' found for deletion. Skipping.", adapter_name)
             return
-        del self.adapters_config.adapters[adapter_name]
+        self.adapters_config.delete(adapter_name)
+        self.base_model._lazy_adapter_weights.pop(adapter_name, None)
+        # registered adapters are loaded again on their next activation
+        self.base_model._adapter_registry.set_evicted(adapter_name)
+        if self.base_model._adapter_residency is not None:
+            self.base_model._adapter_residency.forget(adapter_name)
         self.apply_to_adapter_layers(lambda i, layer: layer.delete_adapter(adapter_name))
+        self.reset_plans()
         # PHM Layer
         if adapter_name in self.base_model.shared_parameters:
             del self.base_model.shared_parameters[adapter_name]
@@ -669,7 +908,10 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             logger.info("No AdapterFusion '%s' found for deletion. Skipping.", adapter_fusion_name)
             return
         del self.adapters_config.fusions[adapter_fusion_name]
+        if self.base_model._adapter_residency is not None:
+            self.base_model._adapter_residency.forget(adapter_fusion_name)
         self.apply_to_adapter_layers(lambda i, layer: layer.delete_fusion_layer(adapter_fusion_name))
+        self.reset_plans()
         # Reset active adapters if this was the active setup
         if self.active_adapters == adapter_names:
             self.active_adapters = None
@@ -680,6 +922,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         adapter_name: str,
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         """
         Saves an adapter and its configuration file to a directory so that it can be shared or reloaded using
@@ -688,16 +931,18 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         Args:
             save_directory (str): Path to a directory where the adapter should be saved.
             adapter_name (str): Name of the adapter to be saved.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
 
         Raises:
             ValueError: If the given adapter name is invalid.
         """
+        self._load_lazy_adapter_weights([adapter_name])
         loader = AdapterLoader(self)
-        loader.save(save_directory, adapter_name, meta_dict)
+        loader.save(save_directory, adapter_name, meta_dict, use_safetensors=use_safetensors)
         # save additional custom weights
         if custom_weights_loaders:
             for weights_loader in custom_weights_loaders:
-                weights_loader.save(save_directory, adapter_name)
+                weights_loader.save(save_directory, adapter_name, use_safetensors=use_safetensors)
 
     def save_adapter_fusion(
         self,
@@ -705,6 +950,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         adapter_names: Union[Fuse, list, str],
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         """
         Saves an AdapterFusion layer and its configuration file to a directory so that it can be shared or reloaded
@@ -713,6 +959,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         Args:
             save_directory (str): Path to a directory where the AdapterFusion should be saved.
             adapter_names (Union[Fuse, list, str]): AdapterFusion to be saved.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
 
         Raises:
             ValueError: If the given AdapterFusion name is invalid.
@@ -727,11 +974,11 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             raise ValueError("Invalid AdapterFusion definition: {}".format(adapter_names))
 
         loader = AdapterFusionLoader(self)
-        loader.save(save_directory, adapter_fusion_name, meta_dict)
+        loader.save(save_directory, adapter_fusion_name, meta_dict, use_safetensors=use_safetensors)
         # save additional custom weights
         if custom_weights_loaders:
             for weights_loader in custom_weights_loaders:
-                weights_loader.save(save_directory, adapter_fusion_name)
+                weights_loader.save(save_directory, adapter_fusion_name, use_safetensors=use_safetensors)
 
     def load_adapter(
         self,
@@ -745,6 +992,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         leave_out: Optional[List[int]] = None,
         id2label=None,
         set_active: bool = False,
+        lazy_load: bool = False,
         **kwargs
     ) -> str:
         """
@@ -772,6 +1020,10 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             set_active (bool, optional):
                 Set the loaded adapter to be the active one. By default (False), the adapter is loaded but not
                 activated.
+            lazy_load (bool, optional):
+                If True and the adapter weights are saved in safetensors format, only the header of the weights file
+                is validated when loading. The weights are read on the first activation of the adapter. Defaults to
+                False.
 
         Returns:
             str: The name with which the adapter was added to the model.
@@ -786,6 +1038,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             source=source,
             leave_out=leave_out,
             set_active=set_active,
+            lazy_load=lazy_load,
             **kwargs,
         )
         # load additional custom weights
@@ -801,6 +1054,169 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
                 )
         return load_name
 
+    def load_adapters(
+        self,
+        adapter_names_or_paths: List[str],
+        config: Union[dict, str] = None,
+        version: str = None,
+        model_name: str = None,
+        load_as: Optional[List[str]] = None,
+        source: str = None,
+        custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        leave_out: Optional[List[int]] = None,
+        max_workers: Optional[int] = None,
+        output_loading_info: bool = False,
+        **kwargs
+    ) -> Union[List[str], Tuple[List[str], dict]]:
+        """
+        Loads multiple pre-trained pytorch adapter modules from the local file system or a remote location. Compared
+        to calling `load_adapter()` for each adapter, adapter paths are resolved and weights files are read
+        concurrently, and all adapter modules are added to the model in a single pass.
+
+        Args:
+            adapter_names_or_paths (List[str]): The identifiers of the adapters to be loaded. Each identifier can be
+                any format supported by `load_adapter()`.
+            config (dict or str, optional): The requested configuration of the adapters.
+            version (str, optional): The version of the adapters to be loaded.
+            model_name (str, optional): The string identifier of the pre-trained model.
+            load_as (List[str], optional): Load the adapters using these names. By default, the names with which the
+                adapters were saved will be used.
+            source (str, optional): Identifier of the source(s) from where to load the adapters. See `load_adapter()`.
+            leave_out: Dynamically drop adapter modules in the specified Transformer layers when loading the adapters.
+            max_workers (int, optional): The maximum number of threads used for reading the adapters.
+            output_loading_info (bool, optional):
+                If True, additionally returns a dictionary with the merged missing and unexpected keys of all adapters
+                and the loading time of each adapter (in seconds) under "load_times". Defaults to False.
+
+        Returns:
+            List[str]: The names with which the adapters were added to the model.
+        """
+        loading_info = {}
+        loader = AdapterLoader(self)
+        results = loader.load_multiple(
+            adapter_names_or_paths,
+            config=config,
+            version=version,
+            model_name=model_name,
+            load_as=load_as,
+            loading_info=loading_info,
+            leave_out=leave_out,
+            max_workers=max_workers,
+            source=source,
+            **kwargs,
+        )
+        # load additional custom weights
+        if custom_weights_loaders:
+            for i, (load_dir, load_name) in enumerate(results):
+                for weights_loader in custom_weights_loaders:
+                    weights_loader.load(
+                        load_dir,
+                        load_as=load_as[i] if load_as is not None else None,
+                        loading_info=loading_info,
+                        main_load_name=load_name,
+                        set_active=False,
+                    )
+        load_names = [load_name for _, load_name in results]
+        if output_loading_info:
+            return load_names, loading_info
+        return load_names
+
+    def register_adapter(
+        self,
+        adapter_name_or_path: str,
+        config: Union[dict, str] = None,
+        version: str = None,
+        model_name: str = None,
+        load_as: str = None,
+        source: str = None,
+        **kwargs
+    ) -> str:
+        """
+        Registers a pre-trained adapter without loading its weights. The adapter is loaded on its first activation
+        (e.g. via `set_active_adapters()` or `AdapterSetup`). If the total size of all loaded registered adapters
+        exceeds the memory budget set via `set_adapter_memory_budget()`, the least recently used ones are deleted from
+        the model again and reloaded from disk on their next activation. Changes to the weights of a registered adapter
+        are lost on eviction. Prediction heads loaded with a registered adapter are evicted together with the adapter.
+
+        Args:
+            adapter_name_or_path (str): The identifier of the adapter. Can be any format supported by
+                `load_adapter()`.
+            config (dict or str, optional): The requested configuration of the adapter.
+            version (str, optional): The version of the adapter to be loaded.
+            model_name (str, optional): The string identifier of the pre-trained model.
+            load_as (str, optional): Register the adapter using this name. By default, the name with which the adapter
+                was saved will be used.
+            source (str, optional): Identifier of the source(s) from where to load the adapter. See `load_adapter()`.
+            kwargs: Further arguments passed to `load_adapter()` when loading the adapter.
+
+        Returns:
+            str: The name with which the adapter was registered.
+        """
+        # only the adapter config is read when registering
+        loader = AdapterLoader(self)
+        load_dir, adapter_config = loader._resolve_config(
+            adapter_name_or_path, config=config, version=version, model_name=model_name, source=source
+        )
+        adapter_name = load_as or adapter_config["name"]
+        if adapter_name in self.adapters_config:
+            raise ValueError("An adapter with the name '{}' has already been added.".format(adapter_name))
+        self.base_model._adapter_registry.register(
+            adapter_name,
+            partial(self._load_registered_adapter, adapter_name, load_dir, **kwargs),
+            partial(self._evict_registered_adapter, adapter_name),
+        )
+        return adapter_name
+
+    def unregister_adapter(self, adapter_name: str):
+        """
+        Removes the registration of an adapter registered via `register_adapter()`. If the adapter is loaded, it stays
+        in the model.
+
+        Args:
+            adapter_name (str): The name of the adapter.
+        """
+        self.base_model._adapter_registry.unregister(adapter_name)
+
+    def _load_registered_adapter(self, adapter_name: str, load_dir: str, **kwargs) -> int:
+        self.load_adapter(load_dir, load_as=adapter_name, **kwargs)
+        # adapter modules are created on the CPU
+        size = 0
+        seen = set()
+        for _, module in self._get_adapter_state_modules(adapter_name):
+            module.to(self.device)
+            for tensor in module.state_dict().values():
+                if tensor.data_ptr() not in seen:
+                    seen.add(tensor.data_ptr())
+                    size += tensor.numel() * tensor.element_size()
+        return size
+
+    def _evict_registered_adapter(self, adapter_name: str):
+        self.delete_adapter(adapter_name)
+        if adapter_name in getattr(self, "heads", {}):
+            self.delete_head(adapter_name)
+
+    def set_adapter_memory_budget(self, max_memory: Optional[int]):
+        """
+        Sets the maximum total size in bytes of the loaded adapters registered via `register_adapter()`. Least
+        recently used registered adapters are evicted from the model to stay within this budget.
+
+        Args:
+            max_memory (int, optional): The memory budget in bytes. If None, registered adapters are never evicted.
+        """
+        registry = self.base_model._adapter_registry
+        registry.max_memory = max_memory
+        active_adapters = self.active_adapters.flatten() if self.active_adapters else []
+        for name in registry.get_evictions(keep=active_adapters):
+            registry.evict(name)
+
+    def adapter_registry_stats(self) -> dict:
+        """
+        Returns statistics of the adapters registered via `register_adapter()`, including the number of registered
+        and loaded adapters, the total size of the loaded adapters in bytes ("resident_bytes"), the hit rate of
+        activations of registered adapters, the number of evictions and the loading times in seconds.
+        """
+        return self.base_model._adapter_registry.stats()
+
     def load_adapter_fusion(
         self,
         adapter_fusion_name_or_path: str,
@@ -843,12 +1259,14 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         save_directory: str,
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         """
         Saves all adapters of this model together with their configuration to subfolders of the given location.
 
         Args:
             save_directory (str): Path to a directory where the adapters should be saved.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
         os.makedirs(save_directory, exist_ok=True)
         for name in self.adapters_config:
@@ -859,13 +1277,37 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
                 meta_dict.update({"config_id": h})
             else:
                 meta_dict = {"config_id": h}
-            self.save_adapter(save_path, name, meta_dict=meta_dict, custom_weights_loaders=custom_weights_loaders)
+            self.save_adapter(
+                save_path,
+                name,
+                meta_dict=meta_dict,
+                custom_weights_loaders=custom_weights_loaders,
+                use_safetensors=use_safetensors,
+            )
+
+    def save_adapter_pack(self, pack_file: str, adapter_names: Optional[List[str]] = None, **kwargs):
+        """
+        Saves multiple adapters together with their configuration to a single adapter pack file. Each adapter of the
+        pack can be loaded using `load_adapter("<pack_file>/<adapter_name>")` without reading the other adapters.
+
+        Args:
+            pack_file (str): Path of the pack file to create. Must end with ".adapterpack".
+            adapter_names (List[str], optional): The names of the adapters to be saved. Defaults to all adapters.
+            kwargs: Passed to `save_adapter()` for each adapter.
+        """
+        if adapter_names is None:
+            adapter_names = list(self.adapters_config.adapters.keys())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in adapter_names:
+                self.save_adapter(join(temp_dir, name), name, **kwargs)
+            pack_adapters(temp_dir, pack_file)
 
     def save_all_adapter_fusions(
         self,
         save_directory: str,
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         """
         Saves all AdapterFusion layers of this model together with their configuration to subfolders of the given
@@ -873,6 +1315,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
 
         Args:
             save_directory (str): Path to a directory where the AdapterFusion layers should be saved.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
         """
         os.makedirs(save_directory, exist_ok=True)
         for name in self.adapters_config.fusions:
@@ -884,7 +1327,11 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             else:
                 meta_dict = {"config_id": h}
             self.save_adapter_fusion(
-                save_path, name, meta_dict=meta_dict, custom_weights_loaders=custom_weights_loaders
+                save_path,
+                name,
+                meta_dict=meta_dict,
+                custom_weights_loaders=custom_weights_loaders,
+                use_safetensors=use_safetensors,
             )
 
     def freeze_model(self, freeze=True):
@@ -905,45 +1352,126 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
                 logger.warning("There are adapters available but none are activated for the forward pass.")
             return
 
+        # layers use the setup of the current context before the default setup
+        context_adapters = AdapterSetup.get_context_adapter_setup()
+        adapter_names = (context_adapters or active_adapters).flatten()
+        self._load_lazy_adapter_weights(adapter_names)
+        self._place_adapters(adapter_names)
         context.adapters_parallelized = False
+        # Number of channels expected in the output. Used to replicate the output if no layer parallelized the input.
+        context.parallel_channels = (context_adapters or active_adapters).parallel_channels
         # Check if already parallelized in encoder
         adapter_input_parallelized = kwargs.pop("adapter_input_parallelized", None)
         if adapter_input_parallelized:
-            if active_adapters.parallel_channels > 1:
+            if context.parallel_channels > 1:
                 context.adapters_parallelized = True
+        elif self._requires_parallel_inputs(context_adapters or active_adapters):
+            # LoRA modules can't replicate the input at the first Parallel block as bottleneck adapters do.
+            # Therefore, the input is replicated once before the forward pass, as done in generate().
+            args, kwargs = self._replicate_model_inputs(args, kwargs, context.parallel_channels)
+            context.model_inputs = (args, kwargs)
+            context.adapters_parallelized = True
         # Add the shared parameters for the active adapters to the context
         context.shared_parameters = {
-            name: param
+            name: compute_shared_parameters(param)
             for name, param in self.base_model.shared_parameters.items()
-            if name in active_adapters.flatten()
+            if name in adapter_names
         }
 
         if hasattr(self.base_model, "prefix_tuning"):
             context.prefix_states = self.base_model.prefix_tuning(*args, **kwargs)
+            # Attention masks of prefixes, shared by all layers
+            context.prefix_masks = {}
 
         # Adapter gating and attention outputs
         context.output_adapter_gating_scores = kwargs.get("output_adapter_gating_scores", False)
         context.output_adapter_fusion_attentions = kwargs.get("output_adapter_fusion_attentions", False)
         context.adapter_gating_scores = defaultdict(dict)
         context.adapter_fusion_attentions = defaultdict(dict)
+        # Per-example routing indices of Route blocks, shared by all layers
+        context.route_indices = {}
+
+    def _requires_parallel_inputs(self, adapter_setup) -> bool:
+        """Checks whether the inputs must be replicated before the forward pass for the given setup."""
+        if not isinstance(adapter_setup, Parallel) or adapter_setup.parallel_channels < 2:
+            return False
+        return any(self.adapters_config.match(name, LoRAConfig) is not None for name in adapter_setup.flatten())
+
+    def _replicate_model_inputs(self, args, kwargs, repeats: int):
+        """Replicates all batched model inputs ``repeats`` times along the batch dimension."""
+        input_names = [
+            "input_ids",
+            "inputs_embeds",
+            "pixel_values",
+            "input_values",
+            "attention_mask",
+            "token_type_ids",
+            "position_ids",
+            "decoder_input_ids",
+            "decoder_inputs_embeds",
+            "decoder_attention_mask",
+        ]
+        batch_inputs = [kwargs[name] for name in input_names[:4] if kwargs.get(name) is not None]
+        if len(batch_inputs) == 0 and len(args) > 0 and isinstance(args[0], torch.Tensor):
+            batch_inputs = [args[0]]
+        if len(batch_inputs) == 0:
+            return args, kwargs
+        batch_size = batch_inputs[0].shape[0]
+
+        def replicate(value):
+            if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == batch_size:
+                return replicate_batch(value, repeats)
+            return value
+
+        args = tuple(replicate(arg) for arg in args)
+        kwargs = {k: replicate(v) if k in input_names else v for k, v in kwargs.items()}
+        return args, kwargs
 
     def get_fusion_regularization_loss(self):
         reg_loss = None
 
         target = torch.zeros((self.config.hidden_size, self.config.hidden_size)).fill_diagonal_(1.0).to(self.device)
-        for i, layer in self.iter_layers():
-            for module in layer.modules():
-                if isinstance(module, AdapterLayer):
-                    for _, layer_fusion in module.adapter_fusion_layer.items():
-                        if hasattr(layer_fusion, "value") and layer_fusion.value.weight.requires_grad:
-                            layer_reg_loss = 0.01 * (target - layer_fusion.value.weight).pow(2).sum()
-                            if reg_loss is None:
-                                reg_loss = layer_reg_loss
-                            else:
-                                reg_loss += layer_reg_loss
+        for _, _, module in self._get_adapter_layer_index().layers_of_type(AdapterLayer):
+            for _, layer_fusion in module.adapter_fusion_layer.items():
+                if hasattr(layer_fusion, "value") and layer_fusion.value.weight.requires_grad:
+                    layer_reg_loss = 0.01 * (target - layer_fusion.value.weight).pow(2).sum()
+                    if reg_loss is None:
+                        reg_loss = layer_reg_loss
+                    else:
+                        reg_loss += layer_reg_loss
 
         return reg_loss
 
+    def adapter_fusion_routing_stats(self, adapter_names: Union[Fuse, list, str]) -> dict:
+        """
+        Returns statistics of the top-k routing of an AdapterFusion layer (see `top_k` in `AdapterFusionConfig`),
+        summed over all layers and forward passes: the number of (token, adapter) pairs a dense fusion would compute
+        ("dense_adapter_tokens"), the number actually computed ("computed_adapter_tokens") and the saved fraction
+        ("savings").
+
+        Args:
+            adapter_names (Union[Fuse, list, str]): The AdapterFusion layer.
+        """
+        if isinstance(adapter_names, Fuse):
+            adapter_fusion_name = ",".join(adapter_names.children)
+        elif isinstance(adapter_names, list):
+            adapter_fusion_name = ",".join(adapter_names)
+        elif isinstance(adapter_names, str):
+            adapter_fusion_name = adapter_names
+        else:
+            raise ValueError("Invalid AdapterFusion definition: {}".format(adapter_names))
+
+        dense, computed = 0, 0
+        for _, _, module in self._get_adapter_layer_index().layers_of_type(AdapterLayer):
+            if adapter_fusion_name in module.adapter_fusion_layer:
+                dense += module.adapter_fusion_layer[adapter_fusion_name].dense_adapter_tokens
+                computed += module.adapter_fusion_layer[adapter_fusion_name].computed_adapter_tokens
+        return {
+            "dense_adapter_tokens": dense,
+            "computed_adapter_tokens": computed,
+            "savings": 1.0 - computed / dense if dense > 0 else 0.0,
+        }
+
     def get_adapter(self, name) -> dict:
         """
         Returns a dictionary with all weights of the adapter with the specified name.
@@ -966,20 +1494,18 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             destination[-1]["invertible"] = self.invertible_adapters[name]
 
         # use a custom index to ensure numbering is from 0 to N layers
-        for i, (_, layer) in enumerate(self.iter_layers()):
-            for module in layer.modules():
-                if isinstance(module, AdapterLayerBase):
-                    adapter_module = module.get_adapter(name)
-                    if adapter_module is not None:
-                        # location_key might already be added before -> concat to ModuleList
-                        if module.location_key in destination[i]:
-                            old_module = destination[i][module.location_key]
-                            if isinstance(old_module, nn.ModuleList):
-                                old_module.append(adapter_module)
-                            else:
-                                destination[i][module.location_key] = nn.ModuleList([old_module, adapter_module])
-                        else:
-                            destination[i][module.location_key] = adapter_module
+        for _, i, module in self._get_adapter_layer_index().layers:
+            adapter_module = module.get_adapter(name)
+            if adapter_module is not None:
+                # location_key might already be added before -> concat to ModuleList
+                if module.location_key in destination[i]:
+                    old_module = destination[i][module.location_key]
+                    if isinstance(old_module, nn.ModuleList):
+                        old_module.append(adapter_module)
+                    else:
+                        destination[i][module.location_key] = nn.ModuleList([old_module, adapter_module])
+                else:
+                    destination[i][module.location_key] = adapter_module
 
         return dict(destination)
 
@@ -1088,6 +1614,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             set_active (bool, optional):
                 Set the adapter to be the active one. By default (False), the adapter is added but not activated.
         """
+        self._load_lazy_adapter_weights(adapter_list)
         # To be able to average the weights, all adapter configs must be the same
         config = None
         for name in adapter_list:
@@ -1114,13 +1641,13 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             input_adapters = {name: weight / sum_weights for name, weight in zip(adapter_list, weights)}
         try:
             self.apply_to_adapter_layers(lambda i, layer: layer.average_adapter(adapter_name, input_adapters))
+            self.reset_plans()
             # PHM Layer
             if self.adapters_config.match(adapter_name, BnConfig, location_key="phm_layer"):
                 self._average_shared_parameters(adapter_name, input_adapters)
             # Prefix Tuning
-            for module in self.modules():
-                if isinstance(module, PrefixTuningPool):
-                    module.average_prefix(adapter_name, input_adapters)
+            for module in self._get_adapter_layer_index().prefix_tuning_pools:
+                module.average_prefix(adapter_name, input_adapters)
             if isinstance(self, InvertibleAdaptersMixin) or isinstance(self, InvertibleAdaptersWrapperMixin):
                 self._average_invertible_adapter(adapter_name, input_adapters)
         except ValueError as ex:
@@ -1136,10 +1663,9 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         Args:
             name (str): The name of the prefix tuning.
         """
-        for module in self.modules():
-            if isinstance(module, PrefixTuningPool):
-                if name in module.prefix_tunings:
-                    module.prefix_tunings[name].eject()
+        for module in self._get_adapter_layer_index().prefix_tuning_pools:
+            if name in module.prefix_tunings:
+                module.prefix_tunings[name].eject()
 
     def merge_adapter(self, name: str):
         """
@@ -1148,18 +1674,51 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         Args:
             name (str): LoRA module to merge.
         """
-        for module in self.modules():
-            if isinstance(module, LoRALayer):
-                if name in module.loras:
-                    module.merge_adapter(name)
+        self._load_lazy_adapter_weights([name])
+        for module in self._get_adapter_layer_index().lora_layers:
+            if name in module.loras:
+                module.merge_adapter(name)
 
     def reset_adapter(self):
         """
         Resets weights of a LoRA module merged using `model.merge_adapter(name)`.
         """
-        for module in self.modules():
-            if isinstance(module, LoRALayer):
-                module.reset_adapter()
+        for module in self._get_adapter_layer_index().lora_layers:
+            module.reset_adapter()
+
+    def set_merge_on_eval(self, enabled: bool = True):
+        """
+        Enables or disables automatic merging of LoRA and (IA)^3 weights in eval mode. If enabled, the weights of the
+        active LoRA module are merged with the Transformer weights on the first forward pass in eval mode without
+        gradient computation, given that a single, non-gated module is active. Merged weights are reset automatically
+        when the model is switched to training mode, the active setup changes or any of the weights is modified.
+
+        Args:
+            enabled (bool, optional): Whether to merge weights in eval mode. Defaults to True.
+        """
+        self.adapters_config.merge_on_eval = enabled
+        for module in self._get_adapter_layer_index().lora_layers:
+            module.update_auto_merge()
+
+    def set_merged_weights_cache(self, max_bytes: Optional[int]) -> Optional[MergedWeightsCache]:
+        """
+        Enables caching of merged LoRA weights for fast switching between merged LoRA modules via
+        `model.merge_adapter(name)`. Merged weights of the most recently used modules are kept up to the given size
+        limit.
+
+        Args:
+            max_bytes (int, optional):
+                The maximum total size in bytes of the cached weights. Set to None to disable the cache.
+
+        Returns:
+            MergedWeightsCache: The cache shared by all LoRA layers of the model, exposing hit, miss and eviction
+            counters via `cache_info()`.
+        """
+        self.reset_adapter()
+        cache = MergedWeightsCache(max_bytes) if max_bytes is not None else None
+        for module in self._get_adapter_layer_index().lora_layers:
+            module.merged_weights_cache = cache
+        return cache
 
     # HACK Copied from transformers/generation/utils.py
     def _prepare_encoder_decoder_kwargs_for_generation(
@@ -1205,7 +1764,9 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             and self.adapters_config.active_setup
             and self.adapters_config.active_setup.parallel_channels > 1
         ):
-            input_ids = input_ids.repeat(self.adapters_config.active_setup.parallel_channels, 1)
+            parallel_channels = self.adapters_config.active_setup.parallel_channels
+            _, model_kwargs = self._replicate_model_inputs((input_ids,), model_kwargs, parallel_channels)
+            input_ids = input_ids.repeat(parallel_channels, 1)
             model_kwargs["adapter_input_parallelized"] = True
 
         return input_ids, input_name, model_kwargs
@@ -1327,9 +1888,9 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
         else:
             self.base_model.train_adapter_fusion(adapter_setup, unfreeze_adapters=unfreeze_adapters)
 
-    def save_head(self, save_directory: str, head_name: str = None):
+    def save_head(self, save_directory: str, head_name: str = None, use_safetensors: bool = False):
         loader = PredictionHeadLoader(self)
-        loader.save(save_directory, name=head_name)
+        loader.save(save_directory, name=head_name, use_safetensors=use_safetensors)
 
     def load_head(self, save_directory, load_as=None, id2label=None, **kwargs):
         loader = PredictionHeadLoader(self, convert_to_flex_head=self._convert_to_flex_head)
@@ -1342,6 +1903,7 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
         with_head: bool = True,
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         if with_head:
             if custom_weights_loaders is None:
@@ -1352,6 +1914,7 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
             adapter_name,
             meta_dict=meta_dict,
             custom_weights_loaders=custom_weights_loaders,
+            use_safetensors=use_safetensors,
         )
 
     def load_adapter(
@@ -1397,12 +1960,52 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
             **kwargs,
         )
 
+    def load_adapters(
+        self,
+        adapter_names_or_paths: List[str],
+        config: Union[dict, str] = None,
+        version: str = None,
+        model_name: str = None,
+        load_as: Optional[List[str]] = None,
+        source: str = None,
+        with_head: bool = True,
+        custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        leave_out: Optional[List[int]] = None,
+        max_workers: Optional[int] = None,
+        output_loading_info: bool = False,
+        **kwargs
+    ) -> Union[List[str], Tuple[List[str], dict]]:
+        if with_head:
+            if custom_weights_loaders is None:
+                custom_weights_loaders = []
+            custom_weights_loaders.append(
+                PredictionHeadLoader(
+                    self,
+                    error_on_missing=False,
+                    convert_to_flex_head=self._convert_to_flex_head,
+                )
+            )
+        return super().load_adapters(
+            adapter_names_or_paths,
+            config=config,
+            version=version,
+            model_name=model_name,
+            load_as=load_as,
+            source=source,
+            custom_weights_loaders=custom_weights_loaders,
+            leave_out=leave_out,
+            max_workers=max_workers,
+            output_loading_info=output_loading_info,
+            **kwargs,
+        )
+
     def save_all_adapters(
         self,
         save_directory: str,
         with_head: bool = True,
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
+        use_safetensors: bool = False,
     ):
         os.makedirs(save_directory, exist_ok=True)
         for name in self.adapters_config:
@@ -1419,6 +2022,7 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
                 meta_dict=meta_dict,
                 with_head=with_head,
                 custom_weights_loaders=custom_weights_loaders,
+                use_safetensors=use_safetensors,
             )
 
     def save_adapter_fusion(
@@ -1428,6 +2032,7 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
         meta_dict: dict = None,
         custom_weights_loaders: Optional[List[WeightsLoader]] = None,
         with_head: Union[bool, str] = False,
+        use_safetensors: bool = False,
     ):
         """
         Saves an AdapterFusion layer and its configuration file to a directory so that it can be shared or reloaded
@@ -1439,11 +2044,14 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
             with_head (Union[bool, str]):
                 If True, will save a head with the same name as the AdapterFusionLayer. If a string, this will be used
                 as the name of the head to be saved.
+            use_safetensors (bool, optional): If True, weights are saved in safetensors format. Defaults to False.
 
         Raises:
             ValueError: If the given AdapterFusion name is invalid.
         """
-        super().save_adapter_fusion(save_directory, adapter_names, meta_dict, custom_weights_loaders)
+        super().save_adapter_fusion(
+            save_directory, adapter_names, meta_dict, custom_weights_loaders, use_safetensors=use_safetensors
+        )
 
         if with_head:
             # Make sure to cover the different options for adapter_names
@@ -1458,7 +2066,7 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
             if head_name not in self.heads:
                 raise ValueError("No head with name {} found".format(head_name))
             loader = PredictionHeadLoader(self)
-            loader.save(save_directory, head_name)
+            loader.save(save_directory, head_name, use_safetensors=use_safetensors)
 
     def load_adapter_fusion(
         self,
@@ -1475,11 +2083,11 @@ class ModelWithHeadsAdaptersMixin(ModelAdaptersMixin):
             custom_weights_loaders.append(PredictionHeadLoader(self, error_on_missing=False))
         super().load_adapter_fusion(adapter_fusion_name_or_path, load_as, custom_weights_loaders, set_active)
 
-    def save_all_heads(self, save_directory):
+    def save_all_heads(self, save_directory, use_safetensors: bool = False):
         os.makedirs(save_directory, exist_ok=True)
         for head_name in self.heads:
             save_path = join(save_directory, head_name)
-            self.save_head(save_path, head_name)
+            self.save_head(save_path, head_name, use_safetensors=use_safetensors)
 
     def get_labels(self):
         return list(self.config.id2label.values())
@@ -359,10 +359,29 @@ class BertFusion(nn.Module):
             self.T = 1.0
         self.reduction = self.T / 1000.0
 
+        # number of (token, adapter) pairs passed through the fused adapters with and without top-k routing
+        self.dense_adapter_tokens = 0
+        self.computed_adapter_tokens = 0
+
+    def route(self, query, key, top_k: int) -> torch.Tensor:
+        """
+        Returns the indices of the top_k adapters with the highest attention scores.
+
+        Args:
+            query (torch.Tensor): The query of dims => batch, toks, feats.
+            key (torch.Tensor): The key of dims => batch, toks, number-of-adapters, feats. Broadcast with the query.
+            top_k (int): The number of adapters to select.
+        """
+        query_layer = self.query(query) if self.config["query"] else query
+        key_layer = self.key(key) if self.config["key"] else key
+        attention_scores = torch.einsum("...h,...nh->...n", query_layer, key_layer)
+        return attention_scores.topk(top_k, dim=-1).indices
+
     def forward(self, query, key, value, residual, output_attentions: bool = False):
 
         if self.config["residual_before"]:
-            value += residual[:, :, None, :].repeat(1, 1, value.size(2), 1)
+            # broadcast over the adapters dimension, in-place as key and value are usually the same tensor
+            value += residual.unsqueeze(-2)
 
         if self.config["query"]:
             query_layer = self.query(query)
@@ -381,7 +400,8 @@ class BertFusion(nn.Module):
             value_layer = value
 
         # Take the dot product between "query" and "key" to get the raw attention scores.
-        attention_scores = torch.squeeze(torch.matmul(query_layer.unsqueeze(2), key_layer.transpose(-2, -1)), dim=2)
+        # query has dims => batch, toks, feats; key/value have dims => batch, toks, number-of-adapters, feats
+        attention_scores = torch.einsum("...h,...nh->...n", query_layer, key_layer)
 
         attention_scores = self.dropout(attention_scores)
 
@@ -389,7 +409,7 @@ class BertFusion(nn.Module):
         attention_probs = nn.Softmax(dim=-1)(attention_scores / self.T)
         self.T = max(self.T - self.reduction, 1.0)
 
-        context_layer = torch.squeeze(torch.matmul(attention_probs.unsqueeze(2), value_layer), dim=2)
+        context_layer = torch.einsum("...n,...nh->...h", attention_probs, value_layer)
 
         if self.config["value"] and not self.config["value_before_softmax"]:
             # key/value have dims => batch, toks, number-of-adapters, feats
@@ -401,8 +421,8 @@ class BertFusion(nn.Module):
             context_layer += residual
 
         if output_attentions:
-            attention_probs = attention_probs.detach().cpu().numpy()
-            return context_layer, attention_probs
+            # kept on the device, see ForwardContext.wrap()
+            return context_layer, attention_probs.detach()
         else:
             return context_layer
 
@@ -549,6 +569,31 @@ def kronecker_product(a, b):
     return out
 
 
+def phm_matmul(x, phm_rule, W=None, W_left=None, W_right=None):
+    """
+    Computes `x @ kronecker_product(phm_rule, W).sum(0)` without materializing the Kronecker products. The input is
+    split into `phm_dim` blocks, which are multiplied with the blocks of W and mixed by the PHM rule. If W is
+    factorized, `W_left` and `W_right` are applied one after the other instead of computing their product.
+
+    Args:
+        x (torch.Tensor): The input of shape (..., phm_dim * in_feats_per_axis).
+        phm_rule (torch.Tensor): The PHM rule of shape (phm_dim, phm_dim, phm_dim).
+        W (torch.Tensor, optional): The weights of shape (phm_dim, in_feats_per_axis, out_feats_per_axis).
+        W_left (torch.Tensor, optional): The left factor of W of shape (phm_dim, in_feats_per_axis, phm_rank).
+        W_right (torch.Tensor, optional): The right factor of W of shape (phm_dim, phm_rank, out_feats_per_axis).
+    """
+    phm_dim = phm_rule.shape[0]
+    x = x.reshape(*x.shape[:-1], phm_dim, x.shape[-1] // phm_dim)
+    if W is None:
+        h = torch.einsum("...ai,kir->...kar", x, W_left)
+        h = torch.einsum("...kar,kab->...kbr", h, phm_rule)
+        y = torch.einsum("...kbr,krj->...bj", h, W_right)
+    else:
+        h = torch.einsum("...ai,kij->...kaj", x, W)
+        y = torch.einsum("...kaj,kab->...bj", h, phm_rule)
+    return y.reshape(*y.shape[:-2], -1)
+
+
 class PHMLayer(nn.Module):
     """
     This class is adapted from the compacter implementation at https://github.com/rabeehk/compacter
@@ -618,6 +663,8 @@ class PHMLayer(nn.Module):
             self.b = nn.Parameter(torch.Tensor(out_features))
         else:
             self.register_parameter("b", None)
+        # expanded weight matrix used in eval mode, together with the state of the parameters it was computed from
+        self._cached_H = None
         self.reset_parameters()
 
     def _init_W(self, W_left=None, W_right=None, W=None):
@@ -672,33 +719,59 @@ class PHMLayer(nn.Module):
         else:
             self.W = W
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def _get_weights(self):
+        """
+        Returns the PHM rule, W (or its factors) and the parameters all of them are computed from.
+        """
+        W, W_left, W_right = None, None, None
         if self.shared_W_phm:
             parameters = ForwardContext.get_context().shared_parameters[self.name]
             if self.factorized_phm_W:
-                W = torch.bmm(parameters[f"W_{self.position}_left"], parameters[f"W_{self.position}_right"])
+                W_left, W_right = parameters[f"W_{self.position}_left"], parameters[f"W_{self.position}_right"]
             else:
                 W = parameters[f"W_{self.position}"]
         else:
             if self.factorized_phm_W:
-                W = torch.bmm(self.W_left, self.W_right)
+                W_left, W_right = self.W_left, self.W_right
             else:
                 W = self.W
         if self.shared_phm_rule:
             parameters = ForwardContext.get_context().shared_parameters[self.name]
+            # computed once per forward pass by compute_shared_parameters()
+            phm_rule = parameters["phm_rule"]
             if self.factorized_phm_rule:
-                phm_rule = torch.bmm(parameters["phm_rule_left"], parameters["phm_rule_right"])
+                phm_rule_sources = [parameters["phm_rule_left"], parameters["phm_rule_right"]]
             else:
-                phm_rule = parameters["phm_rule"]
+                phm_rule_sources = [phm_rule]
         else:
             if self.factorized_phm_rule:
                 phm_rule = torch.bmm(self.phm_rule_left, self.phm_rule_right)
+                phm_rule_sources = [self.phm_rule_left, self.phm_rule_right]
             else:
                 phm_rule = self.phm_rule
+                phm_rule_sources = [phm_rule]
+        sources = [t for t in (W, W_left, W_right) if t is not None] + phm_rule_sources
+        return phm_rule, W, W_left, W_right, sources
+
+    def _get_cached_H(self, phm_rule, W, W_left, W_right, sources) -> torch.Tensor:
+        # in-place updates increase the version of a tensor, replacing its data changes the data pointer
+        state = tuple((id(t), t._version, t.data_ptr()) for t in sources)
+        if self._cached_H is None or self._cached_H[0] != state:
+            with torch.no_grad():
+                if W is None:
+                    W = torch.bmm(W_left, W_right)
+                H = kronecker_product(phm_rule, W).sum(0)
+            self._cached_H = (state, H)
+        return self._cached_H[1]
 
-        H = kronecker_product(phm_rule, W).sum(0)
-
-        y = torch.matmul(input=x, other=H)
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        phm_rule, W, W_left, W_right, sources = self._get_weights()
+        # in eval mode, the weight matrix is expanded once and then applied like a linear layer
+        if not self.training and not (torch.is_grad_enabled() and any(t.requires_grad for t in sources)):
+            y = torch.matmul(x, self._get_cached_H(phm_rule, W, W_left, W_right, sources))
+        else:
+            self._cached_H = None
+            y = phm_matmul(x, phm_rule, W=W, W_left=W_left, W_right=W_right)
         if self.b is not None:
             y += self.b
         return y
@@ -766,6 +839,17 @@ def init_shared_parameters(config, in_features, device):
     return parameters
 
 
+def compute_shared_parameters(parameters):
+    """
+    Computes the PHM rule from the factorized rule shared by all compacter modules. Called once per forward pass, so
+    the compacter modules of all layers can reuse it.
+    """
+    parameters = dict(parameters)
+    if "phm_rule_left" in parameters:
+        parameters["phm_rule"] = torch.bmm(parameters["phm_rule_left"], parameters["phm_rule_right"])
+    return parameters
+
+
 def init_W(config, W_left=None, W_right=None, W=None):
     """
     Initialize the weights for the compacter module or the shared parameters
@@ -61,8 +61,12 @@ class GPT2AttentionWithAdapters(GPT2AttentionAdaptersMixin, GPT2Attention):
         key = self._split_heads(key, self.num_heads, self.head_dim)
         value = self._split_heads(value, self.num_heads, self.head_dim)
 
+        past_prefix_mask = None
         if layer_past is not None:
-            past_key, past_value = layer_past
+            past_key, past_value = layer_past[:2]
+            # the cache might start with the prefixes of the first decoding step, followed by their attention mask
+            if len(layer_past) > 2:
+                past_prefix_mask = layer_past[2]
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
 
@@ -71,7 +75,24 @@ class GPT2AttentionWithAdapters(GPT2AttentionAdaptersMixin, GPT2Attention):
         else:
             present = None
 
-        key, value, attention_mask = self.prefix_tuning(key, value, hidden_states, attention_mask)
+        if past_prefix_mask is not None:
+            attention_mask = self.prefix_tuning.extend_attention_mask_for_cache(key, attention_mask, past_prefix_mask)
+            if use_cache is True:
+                present = (key, value, past_prefix_mask)
+        else:
+            batch_size, key_length = key.shape[0], key.shape[-2]
+            key, value, attention_mask = self.prefix_tuning(key, value, hidden_states, attention_mask)
+            prefix_length = key.shape[-2] - key_length
+            # store the prefixes in the cache once instead of adding them again in every decoding step
+            if (
+                use_cache is True
+                and layer_past is None
+                and prefix_length > 0
+                and key.shape[0] == batch_size
+                and self.prefix_tuning.can_cache_prefixes()
+            ):
+                prefix_mask = self.prefix_tuning.get_cached_prefix_mask(key, attention_mask, prefix_length)
+                present = (key, value, prefix_mask)
         (query,) = adjust_tensors_for_parallel(key, query)
 
         if self.reorder_and_upcast_attn:
@@ -207,6 +228,9 @@ class GPT2ModelWithAdapters(GPT2ModelAdapterMixin, GPT2Model):
             past_key_values = tuple([None] * len(self.h))
         else:
             past_length = past_key_values[0][0].size(-2)
+            # prefixes stored at the start of the cache are not part of the sequence
+            if len(past_key_values[0]) > 2:
+                past_length -= past_key_values[0][2].size(-1)
         if position_ids is None:
             position_ids = torch.arange(past_length, input_shape[-1] + past_length, dtype=torch.long, device=device)
             position_ids = position_ids.unsqueeze(0).view(-1, input_shape[-1])
@@ -7,7 +7,15 @@ from torch import nn
 from transformers import PretrainedConfig
 from transformers.modeling_utils import ModuleUtilsMixin
 
-from .composition import AdapterCompositionBlock, BatchSplit, Parallel, Stack, adjust_tensors_for_parallel
+from .composition import (
+    AdapterCompositionBlock,
+    BatchSplit,
+    Parallel,
+    Route,
+    Stack,
+    adjust_tensors_for_parallel,
+    replicate_batch,
+)
 from .configuration import ModelAdaptersConfig, PrefixTuningConfig
 from .context import AdapterSetup, ForwardContext
 from .layer import AdapterLayerBase
@@ -147,6 +155,7 @@ class PrefixTuningPool(nn.Module):
         self.adapters_config = adapters_config
         self.prefix_counts = {}
         self.prefix_tunings = nn.ModuleDict()
+        self._cached_prefix_states = {}
 
     def indicate_prefix(self, prefix_name: str, location_key: str, **kwargs):
         if prefix_name not in self.prefix_counts:
@@ -202,6 +211,7 @@ class PrefixTuningPool(nn.Module):
     def delete_prefix(self, prefix_name: str):
         if prefix_name in self.prefix_tunings:
             del self.prefix_tunings[prefix_name]
+            self._cached_prefix_states.pop(prefix_name, None)
 
     def enable_prefix(self, prefix_name: str):
         if prefix_name in self.prefix_tunings:
@@ -214,6 +224,37 @@ class PrefixTuningPool(nn.Module):
         else:
             return None
 
+    def train(self, mode: bool = True):
+        if mode:
+            self._cached_prefix_states = {}
+        return super().train(mode)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        self._cached_prefix_states = {}
+        super()._load_from_state_dict(*args, **kwargs)
+
+    def get_prefix_states(self, prefix_name: str, batch_size: int) -> dict:
+        """
+        Computes the prefix states of the given prefix for the given batch size. In eval mode without gradient
+        computation, the states are computed once for a single example, cached as long as the prefix weights are
+        unchanged and expanded to the batch size.
+        """
+        prefix_tuning = self.prefix_tunings[prefix_name]
+        params = list(prefix_tuning.parameters())
+        if self.training or (torch.is_grad_enabled() and any(p.requires_grad for p in params)):
+            return prefix_tuning(batch_size)
+
+        # parameter versions are bumped by in-place updates (e.g. optimizer steps or loading weights)
+        version = tuple((p.data_ptr(), p._version) for p in params)
+        cached = self._cached_prefix_states.get(prefix_name, None)
+        if cached is None or cached[0] != version:
+            cached = (version, prefix_tuning(1))
+            self._cached_prefix_states[prefix_name] = cached
+        return {
+            location_key: tuple(key_values.expand(-1, batch_size, -1, -1, -1) for key_values in states)
+            for location_key, states in cached[1].items()
+        }
+
     def forward(self, *args, **kwargs):
         context = AdapterSetup.get_context()
         if context is not None:
@@ -239,7 +280,7 @@ class PrefixTuningPool(nn.Module):
             # Pass to sub-layers
             for name in adapter_setup.flatten():
                 if name in self.prefix_tunings:
-                    prefix_states[name] = self.prefix_tunings[name](batch_size)
+                    prefix_states[name] = self.get_prefix_states(name, batch_size)
 
         return prefix_states
 
@@ -395,6 +436,10 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
         if idx_range is not None:
             prefix_keys = prefix_keys[idx_range]
             prefix_values = prefix_values[idx_range]
+        # if the input was replicated for a Parallel block beforehand, states were computed for the full batch
+        if prefix_keys.size(0) > batch_size:
+            prefix_keys = prefix_keys[:batch_size]
+            prefix_values = prefix_values[:batch_size]
 
         if adapter_name in self.prefix_gates:
             gate = self.prefix_gates[adapter_name]
@@ -411,24 +456,42 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
         key_states = torch.cat([prefix_keys, key_states], dim=2)
         value_states = torch.cat([prefix_values, value_states], dim=2)
         if attention_mask is not None:
-            if attention_mask.dim() == 2:  # e.g. for DistilBERT, attention_mask has shape (batch_size, seq_len)
-                prefix_mask = torch.ones(batch_size, prefix_keys.size(2)).to(attention_mask.device)
-            else:
-                prefix_mask = torch.ones(batch_size, 1, attention_mask.size(2), prefix_keys.size(2)).to(
-                    attention_mask.device
-                )
-            if invert_mask:
-                prefix_mask = 1.0 - prefix_mask
+            prefix_mask = self._get_prefix_mask(attention_mask, batch_size, prefix_keys.size(2), invert_mask)
             (prefix_mask,) = adjust_tensors_for_parallel(attention_mask, prefix_mask)
             attention_mask = torch.cat([prefix_mask, attention_mask], dim=-1)
 
         return key_states, value_states, residual_input, attention_mask
 
+    def _get_prefix_mask(self, attention_mask, batch_size, prefix_length, invert_mask=True):
+        """
+        Returns the attention mask for the prefix positions. Masks are created once per forward pass and shared by all
+        layers, e.g. instead of being rebuilt by every layer in every decoding step.
+        """
+        if attention_mask.dim() == 2:  # e.g. for DistilBERT, attention_mask has shape (batch_size, seq_len)
+            shape = (batch_size, prefix_length)
+        else:
+            shape = (batch_size, 1, attention_mask.size(2), prefix_length)
+        context = ForwardContext.get_context()
+        prefix_masks = getattr(context, "prefix_masks", None)
+        key = (shape, attention_mask.dtype, attention_mask.device, invert_mask)
+        if prefix_masks is not None and key in prefix_masks:
+            return prefix_masks[key]
+
+        # inverted masks are added to the attention scores, i.e. prefix positions are attended with value 0
+        if invert_mask:
+            prefix_mask = attention_mask.new_zeros(shape)
+        else:
+            prefix_mask = attention_mask.new_ones(shape)
+        if prefix_masks is not None:
+            prefix_masks[key] = prefix_mask
+        return prefix_mask
+
     def _pad_and_concat(self, max_prefix_length, outputs, invert_mask=True):
         """Pads all key & value states to the lFongest prefix length in the current batch.
         This is required e.g. for stacked prefix tunings.
         """
         all_key_states, all_value_states, all_residual_input, all_attention_mask = [], [], [], []
+        requires_mask = any(output[0].shape[-2] < max_prefix_length for output in outputs)
         for key_states, value_states, residual_input, attention_mask in outputs:
             # pad sizes
             pad_length = max_prefix_length - key_states.shape[-2]
@@ -436,16 +499,22 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
             key_states = F.pad(key_states, pad_size, "constant", self.model_config.pad_token_id)
             value_states = F.pad(value_states, pad_size, "constant", self.model_config.pad_token_id)
 
+            # Masking the padded tokens requires an attention mask, which might not be set, e.g. in decoding steps
+            if attention_mask is None and requires_mask:
+                # inverted masks are added to the attention scores, i.e. all positions are attended with value 0
+                key_length = key_states.size(-2) - pad_length
+                if invert_mask:
+                    attention_mask = key_states.new_zeros(key_states.size(0), 1, residual_input.size(1), key_length)
+                else:
+                    attention_mask = key_states.new_ones(key_states.size(0), key_length)
+
             # pad attention mask
             if pad_length > 0:
-                # Masking the padded tokens only works correctly if attention_mask is set
-                # We assume this to be the case at this point
-                assert attention_mask is not None, "Attention mask must be set for prefix tuning"
                 attention_mask = F.pad(
                     attention_mask,
-                    (max_prefix_length - attention_mask.shape[-1], 0),
+                    (pad_length, 0),
                     "constant",
-                    1.0 if invert_mask else 0.0,
+                    torch.finfo(attention_mask.dtype).min if invert_mask else 0.0,
                 )
 
             all_key_states.append(key_states)
@@ -503,6 +572,18 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
                     idx_range=idx_range,
                     lvl=lvl + 1,
                 )
+            # We have a nested route block -> call route method
+            elif isinstance(adapter_stack_layer, Route):
+                key_states, value_states, residual_input, attention_mask = self.adapter_route(
+                    adapter_stack_layer,
+                    key_states,
+                    value_states,
+                    residual_input,
+                    attention_mask,
+                    invert_mask=invert_mask,
+                    idx_range=idx_range,
+                    lvl=lvl + 1,
+                )
             # We have a single prefix tuning module part of this model -> forward pass
             elif adapter_stack_layer in self.prefixes:
                 key_states, value_states, _, attention_mask = self.single_forward(
@@ -546,16 +627,13 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
         context = ForwardContext.get_context()
         if not context.adapters_parallelized:
             orig_batch_size = residual_input.shape[0]
-            residual_input = residual_input.repeat(self.adapters_config.active_setup.parallel_channels, 1, 1, 1)
-            key_states = key_states.repeat(self.adapters_config.active_setup.parallel_channels, 1, 1, 1)
-            value_states = value_states.repeat(self.adapters_config.active_setup.parallel_channels, 1, 1, 1)
+            parallel_channels = context.parallel_channels
+            residual_input = replicate_batch(residual_input, parallel_channels)
+            key_states = replicate_batch(key_states, parallel_channels)
+            value_states = replicate_batch(value_states, parallel_channels)
             if attention_mask is not None:
-                if attention_mask.dim() == 2:  # e.g. for DistilBERT, attention_mask has shape (batch_size, seq_len)
-                    attention_mask = attention_mask.repeat(self.adapters_config.active_setup.parallel_channels, 1)
-                else:
-                    attention_mask = attention_mask.repeat(
-                        self.adapters_config.active_setup.parallel_channels, 1, 1, 1
-                    )
+                # e.g. for DistilBERT, attention_mask has shape (batch_size, seq_len)
+                attention_mask = replicate_batch(attention_mask, parallel_channels)
             context.adapters_parallelized = True
         else:
             # The base model should handle replication of input.
@@ -715,6 +793,67 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
         )
         return key_states, value_states, residual_input, attention_mask
 
+    def adapter_route(
+        self,
+        adapter_setup: Route,
+        key_states,
+        value_states,
+        residual_input,
+        attention_mask=None,
+        invert_mask=True,
+        idx_range=None,
+        lvl=0,
+    ):
+        """
+        Prepends to each example of the batch the prefix it is routed to by the route ids of the given block.
+        """
+        _, route_indices = self._get_route_indices(adapter_setup, key_states.shape[0], key_states.device)
+
+        children_outputs = []
+        children_indices = []
+        # track which prefix is longest for padding in the end
+        max_prefix_length = 0
+        for child, idx in zip(adapter_setup, route_indices):
+            if len(idx) == 0:
+                continue
+            # Nesting other composition blocks is invalid
+            elif isinstance(child, AdapterCompositionBlock):
+                raise ValueError(
+                    "Invalid adapter setup. Cannot nest {} in {}".format(
+                        child.__class__.__name__, adapter_setup.__class__.__name__
+                    )
+                )
+            # As all prefix tuning modules are centrally stored, fail if not found.
+            elif child not in self.prefixes:
+                raise ValueError(f"Unknown prefix tuning name '{child}'.")
+
+            child_outputs = self.single_forward(
+                child,
+                key_states[idx],
+                value_states[idx],
+                residual_input[idx],
+                attention_mask[idx] if attention_mask is not None else None,
+                invert_mask,
+                idx_range=idx if idx_range is None else torch.as_tensor(idx_range, device=idx.device)[idx],
+            )
+            children_outputs.append(child_outputs)
+            children_indices.append(idx)
+
+            # update max prefix length
+            current_prefix_length = child_outputs[0].shape[-2]
+            if current_prefix_length > max_prefix_length:
+                max_prefix_length = current_prefix_length
+
+        # concatenate all outputs and restore the original order of the batch
+        key_states, value_states, residual_input, attention_mask = self._pad_and_concat(
+            max_prefix_length, children_outputs, invert_mask=invert_mask
+        )
+        order = torch.argsort(torch.cat(children_indices))
+        key_states, value_states, residual_input = key_states[order], value_states[order], residual_input[order]
+        if attention_mask is not None:
+            attention_mask = attention_mask[order]
+        return key_states, value_states, residual_input, attention_mask
+
     def forward(self, key_states, value_states, residual_input, attention_mask=None, invert_mask=True):
         adapter_setup = self.get_active_setup(self.prefixes)
         if adapter_setup is not None:
@@ -745,7 +884,43 @@ class PrefixTuningShim(AdapterLayerBase, nn.Module):
                     attention_mask=attention_mask,
                     invert_mask=invert_mask,
                 )
+            elif isinstance(adapter_setup, Route):
+                key_states, value_states, _, attention_mask = self.adapter_route(
+                    adapter_setup,
+                    key_states,
+                    value_states,
+                    residual_input,
+                    attention_mask=attention_mask,
+                    invert_mask=invert_mask,
+                )
             else:
                 raise ValueError(f"Invalid adapter setup. Cannot use {adapter_setup} with prefix tuning.")
 
         return key_states, value_states, attention_mask
+
+    def can_cache_prefixes(self) -> bool:
+        """
+        Returns whether the prefixes added in the first decoding step can be stored in the key/value cache and reused
+        in later steps. Gated prefixes depend on the input of each step, so they are added again in every step.
+        """
+        adapter_setup = self.get_active_setup(self.prefixes)
+        return adapter_setup is None or not any(name in self.prefix_gates for name in adapter_setup.flatten())
+
+    def get_cached_prefix_mask(self, key_states, attention_mask, prefix_length):
+        """
+        Returns the inverted attention mask of the prefixes at the start of the given key states, to be stored in the
+        key/value cache together with the prefixes. The mask has shape (batch_size, 1, 1, prefix_length).
+        """
+        if attention_mask is None:
+            return key_states.new_zeros(key_states.size(0), 1, 1, prefix_length)
+        # masks of prefix positions are the same for all query positions
+        return attention_mask[:, :, -1:, :prefix_length]
+
+    def extend_attention_mask_for_cache(self, key_states, attention_mask, prefix_mask):
+        """
+        Extends the inverted attention mask of the cached and current tokens by the mask of the prefixes stored at the
+        start of the key/value cache.
+        """
+        if attention_mask is None:
+            return F.pad(prefix_mask, (0, key_states.size(-2) - prefix_mask.size(-1)), "constant", 0.0)
+        return torch.cat([prefix_mask.expand(-1, -1, attention_mask.size(2), -1), attention_mask], dim=-1)
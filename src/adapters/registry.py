@@ -0,0 +1,117 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdapterRegistry:
+    """
+    Keeps track of the adapters registered via `register_adapter()`. Registered adapters are loaded into the model on
+    first activation. If the total size of all loaded registered adapters exceeds the memory budget, the least recently
+    used ones are deleted from the model again and reloaded on their next activation.
+
+    Args:
+        max_memory (int, optional): The memory budget in bytes. If None (default), adapters are never evicted.
+    """
+
+    def __init__(self, max_memory: Optional[int] = None):
+        self.max_memory = max_memory
+        # functions loading the registered adapters into the model (returning their size) and deleting them again
+        self._loaders: Dict[str, Callable[[], int]] = {}
+        self._evicters: Dict[str, Callable[[], None]] = {}
+        # sizes of the loaded registered adapters in bytes, ordered from least to most recently used
+        self._resident: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.total_load_time = 0.0
+        self.last_load_time = 0.0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._loaders
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+    def register(self, name: str, loader: Callable[[], int], evicter: Callable[[], None]):
+        self._loaders[name] = loader
+        self._evicters[name] = evicter
+        self._resident.pop(name, None)
+
+    def unregister(self, name: str):
+        self._loaders.pop(name, None)
+        self._evicters.pop(name, None)
+        self._resident.pop(name, None)
+
+    def is_resident(self, name: str) -> bool:
+        return name in self._resident
+
+    def touch(self, name: str) -> bool:
+        """Marks the given registered adapter as used. Returns True if the adapter is loaded."""
+        if name in self._resident:
+            self._resident.move_to_end(name)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def load(self, name: str):
+        """Loads the given registered adapter into the model."""
+        start = time.perf_counter()
+        size = self._loaders[name]()
+        self.last_load_time = time.perf_counter() - start
+        self.total_load_time += self.last_load_time
+        self.loads += 1
+        self._resident[name] = size
+
+    def evict(self, name: str):
+        """Deletes the given registered adapter from the model."""
+        self._evicters[name]()
+        self._resident.pop(name, None)
+        self.evictions += 1
+
+    def set_evicted(self, name: str):
+        self._resident.pop(name, None)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self._resident.values())
+
+    def get_evictions(self, keep: Iterable[str] = ()) -> List[str]:
+        """
+        Returns the least recently used adapters that have to be evicted to stay within the memory budget, never
+        including the adapters in keep.
+        """
+        if self.max_memory is None:
+            return []
+        keep = set(keep)
+        total = self.resident_bytes
+        evictions = []
+        for name, size in self._resident.items():
+            if total <= self.max_memory:
+                break
+            if name not in keep:
+                evictions.append(name)
+                total -= size
+        if total > self.max_memory:
+            logger.warning("The active adapters exceed the memory budget of {} bytes.".format(self.max_memory))
+        return evictions
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "registered": len(self._loaders),
+            "resident": len(self._resident),
+            "resident_bytes": self.resident_bytes,
+            "max_memory": self.max_memory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests > 0 else 0.0,
+            "evictions": self.evictions,
+            "avg_load_time": self.total_load_time / self.loads if self.loads > 0 else 0.0,
+            "last_load_time": self.last_load_time,
+        }
@@ -0,0 +1,195 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, Iterable, List, Set, Union
+
+import torch
+
+from .composition import AdapterCompositionBlock
+from .context import AdapterSetup
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdapterResidencyManager:
+    """
+    Places the weights of adapter modules in two memory tiers: the modules of the active adapter setup are kept on the
+    device, all other modules in (pinned) host memory. Modules are identified by the name under which they are added
+    to the model, i.e. the names of adapters, fusions and prediction heads. Use `model.enable_adapter_offloading()` to
+    create a manager for a model.
+
+    Adapters needed for a following forward pass can be moved to the device in the background via `prefetch()`. On
+    CUDA devices, the transfer is issued on a separate stream, otherwise in a background thread. If device and host
+    are the same (e.g. both CPU), modules are still copied between both tiers, which allows testing the placement
+    without an accelerator.
+
+    Args:
+        model: The model containing the adapter modules.
+        device (torch.device or str): The device of active adapter modules.
+        host_device (torch.device or str, optional): The device of inactive adapter modules. Defaults to "cpu".
+        pin_memory (bool, optional):
+            Keep inactive modules in page-locked memory for asynchronous transfers. Only applies if CUDA is available.
+            Defaults to True.
+        read_only (bool, optional):
+            Promise that the weights of modules are not modified while they are on the device, e.g. for inference. On
+            offload, weights are then only copied back to host memory if they were modified in-place via the tensor
+            itself since they were moved to the device. Changes made via `tensor.data` are lost. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        model,
+        device: Union[torch.device, str],
+        host_device: Union[torch.device, str] = "cpu",
+        pin_memory: bool = True,
+        read_only: bool = False,
+    ):
+        self.model = model
+        self.device = torch.device(device)
+        self.host_device = torch.device(host_device)
+        self.pin_memory = pin_memory and self.host_device.type == "cpu" and torch.cuda.is_available()
+        self.read_only = read_only
+        # host copies of all tensors of a module name, keyed by the id of the parameter/ buffer
+        self._host_tensors: Dict[str, Dict[int, torch.Tensor]] = {}
+        # versions of all tensors of a module name when moved to the device, keyed by the id of the parameter/ buffer
+        self._fetched_versions: Dict[str, Dict[int, int]] = {}
+        self._on_device: Set[str] = set()
+        # transfers issued by prefetch(), either CUDA events or futures of the background thread
+        self._pending: Dict[str, Union[torch.cuda.Event, Future]] = {}
+        if self.device.type == "cuda":
+            self._stream = torch.cuda.Stream(device=self.device)
+            self._executor = None
+        else:
+            self._stream = None
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _get_tensors(self, name: str) -> List[torch.Tensor]:
+        tensors = {}
+        for _, module in self.model._get_adapter_state_modules(name):
+            for tensor in chain(module.parameters(), module.buffers()):
+                tensors[id(tensor)] = tensor
+        return list(tensors.values())
+
+    def _get_host_tensor(self, name: str, tensor: torch.Tensor) -> torch.Tensor:
+        host_tensors = self._host_tensors.setdefault(name, {})
+        host_tensor = host_tensors.get(id(tensor), None)
+        if host_tensor is None:
+            host_tensor = tensor.data.to(self.host_device, copy=True)
+            if self.pin_memory:
+                host_tensor = host_tensor.pin_memory()
+            host_tensors[id(tensor)] = host_tensor
+        elif tensor.data_ptr() != host_tensor.data_ptr() and (
+            not self.read_only or self._fetched_versions.get(name, {}).get(id(tensor), None) != tensor._version
+        ):
+            # keep changes made while on the device
+            # writes via tensor.data don't change the version, so only rely on it for read-only use
+            host_tensor.copy_(tensor.data)
+        return host_tensor
+
+    def is_on_device(self, name: str) -> bool:
+        """Returns whether the modules of the given name are placed on the device."""
+        return name in self._on_device
+
+    def offload(self, name: str):
+        """Moves the modules of the given name to host memory."""
+        self._wait(name)
+        for tensor in self._get_tensors(name):
+            tensor.data = self._get_host_tensor(name, tensor)
+        self._on_device.discard(name)
+
+    def fetch(self, name: str, non_blocking: bool = False):
+        """Moves the modules of the given name to the device."""
+        if name in self._on_device:
+            return
+        host_tensors = self._host_tensors.setdefault(name, {})
+        fetched_versions = self._fetched_versions.setdefault(name, {})
+        for tensor in self._get_tensors(name):
+            # modules added after the last offload are not in host memory yet
+            host_tensor = host_tensors.get(id(tensor), None)
+            if host_tensor is None:
+                host_tensor = self._get_host_tensor(name, tensor)
+            tensor.data = host_tensor.to(self.device, non_blocking=non_blocking, copy=True)
+            fetched_versions[id(tensor)] = tensor._version
+        self._on_device.add(name)
+
+    def prefetch(self, names: Iterable[str]):
+        """Starts moving the modules of the given names to the device without waiting for the transfer."""
+        names = [name for name in names if name not in self._on_device and name not in self._pending]
+        if not names:
+            return
+        if self._stream is not None:
+            with torch.cuda.stream(self._stream):
+                for name in names:
+                    self.fetch(name, non_blocking=True)
+                event = self._stream.record_event()
+            for name in names:
+                self._pending[name] = event
+        else:
+            future = self._executor.submit(lambda: [self.fetch(name) for name in names])
+            for name in names:
+                self._pending[name] = future
+
+    def _wait(self, name: str):
+        pending = self._pending.pop(name, None)
+        if pending is None:
+            return
+        if isinstance(pending, Future):
+            pending.result()
+        else:
+            stream = torch.cuda.current_stream(self.device)
+            stream.wait_event(pending)
+            # tensors allocated on the side stream are now used on the current stream
+            for tensor in self._get_tensors(name):
+                tensor.data.record_stream(stream)
+
+    def get_module_names(self, adapter_names: Iterable[str], head_setup=None) -> Set[str]:
+        """
+        Returns the names of all modules used with the given adapters, including fusions of these adapters and the
+        given prediction heads.
+        """
+        names = set(adapter_names)
+        names.update(
+            fusion_name
+            for fusion_name in self.model.adapters_config.fusions
+            if all(name in names for name in fusion_name.split(","))
+        )
+        if isinstance(head_setup, AdapterCompositionBlock):
+            names.update(head_setup.flatten())
+        elif isinstance(head_setup, str):
+            names.add(head_setup)
+        elif head_setup:
+            names.update(head_setup)
+        return names
+
+    def activate(self, adapter_names: Iterable[str]):
+        """
+        Moves the modules used with the given adapters to the device and all other modules to host memory. Modules of
+        pending prefetches are kept on the device.
+        """
+        head_setup = AdapterSetup.get_context_head_setup() or getattr(self.model, "active_head", None)
+        names = self.get_module_names(adapter_names, head_setup)
+        for name in names:
+            self._wait(name)
+            self.fetch(name)
+        for name in list(self._on_device):
+            if name not in names and name not in self._pending:
+                self.offload(name)
+
+    def forget(self, name: str):
+        """Stops managing the modules of the given name, e.g. after they are deleted."""
+        self._wait(name)
+        self._host_tensors.pop(name, None)
+        self._fetched_versions.pop(name, None)
+        self._on_device.discard(name)
+
+    def close(self):
+        """Moves all managed modules to the device and releases the host copies."""
+        for name in list(self._host_tensors.keys()):
+            self._wait(name)
+            self.fetch(name)
+        self._host_tensors.clear()
+        self._fetched_versions.clear()
+        self._on_device.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
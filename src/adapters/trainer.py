@@ -194,15 +194,16 @@ class AdapterTrainer(Trainer):
                 raise Exception("Can't find a valid checkpoint at {}".format(resume_from_checkpoint))
 
     def _load_adapters(self, resume_from_checkpoint):
-        adapter_loaded = False
+        adapter_dirs = []
         for file_name in os.listdir(resume_from_checkpoint):
             if os.path.isdir(os.path.join(resume_from_checkpoint, file_name)):
                 if "," not in file_name and "adapter_config.json" in os.listdir(
                     os.path.join(resume_from_checkpoint, file_name)
                 ):
-                    self.model.load_adapter(os.path.join(os.path.join(resume_from_checkpoint, file_name)))
-                    adapter_loaded = True
-        return adapter_loaded
+                    adapter_dirs.append(os.path.join(resume_from_checkpoint, file_name))
+        if len(adapter_dirs) > 0:
+            self.model.load_adapters(adapter_dirs)
+        return len(adapter_dirs) > 0
 
     def _load_adapter_fusions(self, resume_from_checkpoint):
         for file_name in os.listdir(resume_from_checkpoint):
@@ -224,10 +225,13 @@ class AdapterTrainer(Trainer):
             f"Loading best adapter(s) from {self.state.best_model_checkpoint} (score: {self.state.best_metric})."
         )
         # attempt to re-load all adapters from checkpoint
+        adapter_dirs = []
         for adapter in model.adapters_config.adapters:
             adapter_dir = os.path.join(self.state.best_model_checkpoint, adapter)
             if os.path.exists(adapter_dir):
-                model.load_adapter(adapter_dir)
+                adapter_dirs.append(adapter_dir)
+        if len(adapter_dirs) > 0:
+            model.load_adapters(adapter_dirs)
         if self.train_adapter_fusion:
             logger.info(
                 f"Loading best adapter fusion(s) from {self.state.best_model_checkpoint} (score:"
@@ -10,6 +10,7 @@ import re
 import shutil
 import tarfile
 import tempfile
+from collections import defaultdict
 from collections.abc import Mapping
 from contextlib import contextmanager
 from dataclasses import dataclass
@@ -32,7 +33,7 @@ from huggingface_hub.utils import (
     hf_raise_for_status,
 )
 from requests.exceptions import HTTPError
-from transformers.utils import http_user_agent, is_remote_url
+from transformers.utils import http_user_agent, is_offline_mode, is_remote_url
 from transformers.utils.hub import torch_cache_home
 
 from . import __version__
@@ -42,11 +43,15 @@ logger = logging.getLogger(__name__)
 
 CONFIG_NAME = "adapter_config.json"
 WEIGHTS_NAME = "pytorch_adapter.bin"
+SAFE_WEIGHTS_NAME = "adapter.safetensors"
 HEAD_CONFIG_NAME = "head_config.json"
 HEAD_WEIGHTS_NAME = "pytorch_model_head.bin"
+SAFE_HEAD_WEIGHTS_NAME = "model_head.safetensors"
 ADAPTERFUSION_CONFIG_NAME = "adapter_fusion_config.json"
 ADAPTERFUSION_WEIGHTS_NAME = "pytorch_model_adapter_fusion.bin"
+SAFE_ADAPTERFUSION_WEIGHTS_NAME = "model_adapter_fusion.safetensors"
 EMBEDDING_FILE = "embedding.pt"
+ADAPTER_PACK_EXTENSION = ".adapterpack"
 TOKENIZER_PATH = "tokenizer"
 
 ADAPTER_HUB_URL = "https://raw.githubusercontent.com/Adapter-Hub/Hub/master/dist/v2/"
@@ -54,6 +59,8 @@ ADAPTER_HUB_INDEX_FILE = ADAPTER_HUB_URL + "index/{}.json"
 ADAPTER_HUB_CONFIG_FILE = ADAPTER_HUB_URL + "architectures.json"
 ADAPTER_HUB_ALL_FILE = ADAPTER_HUB_URL + "all.json"
 ADAPTER_HUB_ADAPTER_ENTRY_JSON = ADAPTER_HUB_URL + "adapters/{}/{}.json"
+# environment variable for setting a local directory or URL mirroring AdapterHub
+ADAPTER_HUB_MIRROR_ENV = "ADAPTER_HUB_MIRROR"
 
 # the download cache
 ADAPTER_CACHE = join(torch_cache_home, "adapters")
@@ -166,8 +173,79 @@ def urljoin(*args):
     return "/".join([s.strip("/") for s in args])
 
 
+_hub_session = None
+# memoized results of hub requests during the lifetime of the process
+_hub_index_files = {}
+_hub_index_lookups = {}
+
+
+def get_hub_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by all requests to AdapterHub. Reusing the session keeps connections to the hub
+    alive across requests.
+    """
+    global _hub_session
+    if _hub_session is None:
+        _hub_session = requests.Session()
+    return _hub_session
+
+
+def get_hub_mirror() -> Optional[str]:
+    """
+    Returns the local directory or URL of the AdapterHub mirror set via the `ADAPTER_HUB_MIRROR` environment variable
+    (if any).
+    """
+    return os.environ.get(ADAPTER_HUB_MIRROR_ENV) or None
+
+
+def resolve_hub_url(url: str) -> str:
+    """
+    Maps the given AdapterHub URL to the configured mirror. Files of the Hub repository are expected at the same
+    relative path in the mirror, adapter files hosted elsewhere at their host and path in the "files" subfolder of the
+    mirror (e.g. "files/example.org/adapters/adapter.zip"). Returns the URL unchanged if no mirror is configured.
+    """
+    mirror = get_hub_mirror()
+    if not mirror or not is_remote_url(url):
+        return url
+    if url.startswith(ADAPTER_HUB_URL):
+        path = url[len(ADAPTER_HUB_URL) :]
+    else:
+        parsed_url = urlparse(url)
+        path = "/".join(["files", parsed_url.netloc, parsed_url.path.lstrip("/")])
+    if is_remote_url(mirror):
+        return urljoin(mirror.rstrip("/") + "/", path)
+    else:
+        return join(mirror, *path.split("/"))
+
+
+class _HashingWriter:
+    """Wraps a writable file to compute the checksum of all bytes written to it."""
+
+    def __init__(self, file, checksum_algo):
+        self.file = file
+        self.hash = hashlib.new(checksum_algo)
+        self.bytes_hashed = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.bytes_hashed += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def get_file_checksum(path: str, checksum_algo: str, chunk_size: int = 1024 * 1024) -> str:
+    """Computes the checksum of the given file, reading it in chunks."""
+    h = hashlib.new(checksum_algo)
+    with open(path, "rb") as f:
+        for chunk in iter(partial(f.read, chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 def remote_file_exists(url):
-    r = requests.head(url)
+    r = get_hub_session().head(url)
     return r.status_code == 200
 
 
@@ -183,10 +261,12 @@ def get_from_cache(
     user_agent: Union[Dict, str, None] = None,
     use_auth_token: Union[bool, str, None] = None,
     local_files_only=False,
+    checksum_algo: Optional[str] = None,
 ) -> Optional[str]:
     """
     Given a URL, look for the corresponding file in the local cache. If it's not there, download it. Then return the
-    path to the cached file.
+    path to the cached file. If checksum_algo is given, the checksum of a downloaded file is computed while
+    downloading and stored in the metadata file of the cache entry.
 
     Return:
         Local path (string) of file or if networking is off, last version of file cached on disk.
@@ -214,7 +294,9 @@ def get_from_cache(
     etag = None
     if not local_files_only:
         try:
-            r = requests.head(url, headers=headers, allow_redirects=False, proxies=proxies, timeout=etag_timeout)
+            r = get_hub_session().head(
+                url, headers=headers, allow_redirects=False, proxies=proxies, timeout=etag_timeout
+            )
             hf_raise_for_status(r)
             etag = r.headers.get("X-Linked-Etag") or r.headers.get("ETag")
             # We favor a custom header indicating the etag of the linked resource, and
@@ -312,12 +394,16 @@ def get_from_cache(
 
         # Download to temporary file, then copy to cache dir once finished.
         # Otherwise you get corrupt cache entries if the download gets interrupted.
+        hashing_file = None
         with temp_file_manager() as temp_file:
             logger.info(f"{url} not found in cache or force_download set to True, downloading to {temp_file.name}")
 
+            # hash the file while downloading (not possible when resuming a partial download)
+            if checksum_algo and resume_size == 0:
+                hashing_file = _HashingWriter(temp_file, checksum_algo)
             http_get(
                 url_to_download,
-                temp_file,
+                hashing_file or temp_file,
                 proxies=proxies,
                 resume_size=resume_size,
                 headers=headers,
@@ -333,6 +419,9 @@ def get_from_cache(
 
         logger.info(f"creating metadata file for {cache_path}")
         meta = {"url": url, "etag": etag}
+        # the file might have been written without passing the wrapper (e.g. when using hf_transfer)
+        if hashing_file is not None and hashing_file.bytes_hashed == os.path.getsize(cache_path):
+            meta[checksum_algo] = hashing_file.hash.hexdigest()
         meta_path = cache_path + ".json"
         with open(meta_path, "w") as meta_file:
             json.dump(meta, meta_file)
@@ -340,12 +429,48 @@ def get_from_cache(
     return cache_path
 
 
-def download_cached(url, checksum=None, checksum_algo="sha1", cache_dir=None, force_extract=False, **kwargs):
+def _get_cached_checksum(path: str, checksum_algo: str) -> str:
+    # use the checksum computed while downloading if available
+    meta_path = path + ".json"
+    if isfile(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if checksum_algo in meta:
+            return meta[checksum_algo]
+    return get_file_checksum(path, checksum_algo)
+
+
+def download_cached(
+    url, checksum=None, checksum_algo="sha1", cache_dir=None, force_extract=False, extract=True, **kwargs
+):
+    """
+    Downloads the file at the given URL to the cache and extracts it if it is an archive.
+
+    Args:
+        url (str): The URL of the file.
+        checksum (str, optional): The expected checksum of the file.
+        checksum_algo (str, optional): The hash algorithm of the checksum. Defaults to "sha1".
+        cache_dir (str, optional): The cache directory. Defaults to the adapters cache.
+        force_extract (bool, optional): Extract archives even if they have been extracted before.
+        extract (bool, optional):
+            If set to False, zip archives are not extracted and the path of the archive is returned. Defaults to True.
+
+    Returns:
+        str: The local path of the (extracted) file.
+    """
     if isinstance(url, Path):
         url = str(url)
 
+    url = resolve_hub_url(url)
     if is_remote_url(url):
+        if is_offline_mode():
+            kwargs["local_files_only"] = True
+        if checksum and checksum_algo:
+            kwargs["checksum_algo"] = checksum_algo
         output_path = get_from_cache(url, cache_dir=cache_dir, **kwargs)
+    # files of a local hub mirror
+    elif get_hub_mirror() and isfile(url):
+        output_path = url
     else:
         raise ValueError("Unable to parse '{}' as a URL".format(url))
 
@@ -354,19 +479,24 @@ def download_cached(url, checksum=None, checksum_algo="sha1", cache_dir=None, fo
 
     # if checksum is given, verify it
     if checksum and checksum_algo:
-        h = hashlib.new(checksum_algo)
-        with open(output_path, "rb") as f:
-            h.update(f.read())
-        calculated_checksum = h.hexdigest()
+        calculated_checksum = _get_cached_checksum(output_path, checksum_algo)
         if calculated_checksum != checksum.lower():
             raise EnvironmentError("Failed to verify checksum of '{}'".format(output_path))
 
     if not is_zipfile(output_path) and not tarfile.is_tarfile(output_path):
         return output_path
+    # zip archives can be read directly without extracting
+    if not extract and is_zipfile(output_path):
+        return output_path
 
     # Path where we extract compressed archives
     # We avoid '.' in dir name and add "-extracted" at the end: "./model.zip" => "./model-zip-extracted/"
     output_dir, output_file = os.path.split(output_path)
+    # don't write into the local mirror but extract into the cache
+    if not is_remote_url(url):
+        output_dir = cache_dir or ADAPTER_CACHE
+        output_file = hashlib.sha256(os.path.abspath(output_path).encode()).hexdigest() + "." + output_file
+        os.makedirs(output_dir, exist_ok=True)
     output_extract_dir_name = output_file.replace(".", "-") + "-extracted"
     output_path_extracted = os.path.join(output_dir, output_extract_dir_name)
 
@@ -374,7 +504,7 @@ def download_cached(url, checksum=None, checksum_algo="sha1", cache_dir=None, fo
         return output_path_extracted
 
     # Prevent parallel extractions
-    lock_path = output_path + ".lock"
+    lock_path = output_path_extracted + ".lock"
     with FileLock(lock_path):
         shutil.rmtree(output_path_extracted, ignore_errors=True)
         os.makedirs(output_path_extracted)
@@ -384,9 +514,8 @@ def download_cached(url, checksum=None, checksum_algo="sha1", cache_dir=None, fo
                 for file in zip_file.namelist():
                     # check if we have a valid file
                     if basename(file):
-                        file_data = zip_file.read(file)
-                        with open(join(output_path_extracted, basename(file)), "wb") as f:
-                            f.write(file_data)
+                        with zip_file.open(file) as src, open(join(output_path_extracted, basename(file)), "wb") as f:
+                            shutil.copyfileobj(src, f, 1024 * 1024)
         elif tarfile.is_tarfile(output_path):
             tar_file = tarfile.open(output_path)
             tar_file.extractall(output_path_extracted)
@@ -502,19 +631,28 @@ def _split_identifier(identifier):
     return task, subtask, org_name
 
 
-def _dict_extract(d, primary_key, secondary_key=None):
-    for k, v in d.items():
-        if k == primary_key:
-            if secondary_key:
-                if secondary_key in v.keys():
-                    yield v[secondary_key]
-            else:
-                for k, v in v.items():
-                    yield v
-        elif secondary_key is None:
-            for k, v in v.items():
-                if k == primary_key:
-                    yield v
+def _get_index_lookup(index_file: str) -> Dict[Tuple[str, Optional[str]], list]:
+    """
+    Parses the given index file and builds a lookup table from (task, subtask) pairs to matching index entries. A
+    subtask of None matches all subtasks of a task as well as all subtasks with the given name. The lookup is cached
+    until the index file is modified.
+    """
+    mtime = os.stat(index_file).st_mtime_ns
+    cached = _hub_index_lookups.get(index_file, None)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(index_file, "r") as f:
+        adapter_index = json.load(f)
+    index_lookup = defaultdict(list)
+    for task, subtasks in adapter_index.items():
+        for subtask, index_entry in subtasks.items():
+            index_lookup[(task, subtask)].append(index_entry)
+            index_lookup[(task, None)].append(index_entry)
+            if subtask != task:
+                index_lookup[(subtask, None)].append(index_entry)
+    index_lookup = dict(index_lookup)
+    _hub_index_lookups[index_file] = (mtime, index_lookup)
+    return index_lookup
 
 
 def find_in_index(
@@ -531,15 +669,18 @@ def find_in_index(
         return ADAPTER_HUB_ADAPTER_ENTRY_JSON.format(match.group(1), match.group(2))
 
     if not index_file:
-        index_file = download_cached(ADAPTER_HUB_INDEX_FILE.format(model_name))
+        index_url = ADAPTER_HUB_INDEX_FILE.format(model_name)
+        # the index is only requested once per process
+        index_file = _hub_index_files.get(index_url, None) or download_cached(index_url)
+        if index_file:
+            _hub_index_files[index_url] = index_file
     if not index_file:
         raise EnvironmentError("Unable to load adapter hub index file. The file might be temporarily unavailable.")
-    with open(index_file, "r") as f:
-        adapter_index = json.load(f)
+    index_lookup = _get_index_lookup(index_file)
     # split into <task>/<subtask>@<org>
     task, subtask, org = _split_identifier(identifier)
     # find all entries for this task and subtask
-    entries = list(_dict_extract(adapter_index, task, subtask))
+    entries = index_lookup.get((task, subtask), [])
     if not entries:
         # we found no matching entry
         return None
@@ -585,11 +726,21 @@ def http_get_json(url):
     # check if it's a relative url
     if not urlparse(url).netloc:
         url = urljoin(ADAPTER_HUB_URL, url)
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
+    url = resolve_hub_url(url)
+    if not is_remote_url(url):
+        if not isfile(url):
+            raise EnvironmentError("Failed to get file {}".format(url))
+        with open(url, "r") as f:
+            data = json.load(f)
+    elif is_offline_mode():
+        raise EnvironmentError("Cannot get file {} in offline mode.".format(url))
     else:
-        raise EnvironmentError("Failed to get file {}".format(url))
+        response = get_hub_session().get(url)
+        if response.status_code == 200:
+            data = response.json()
+        else:
+            raise EnvironmentError("Failed to get file {}".format(url))
+    return data
 
 
 def get_checksum(file_entry: dict):
@@ -659,6 +810,17 @@ def pull_from_hf_model_hub(specifier: str, version: str = None, **kwargs) -> str
     return download_path
 
 
+def split_pack_path(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits a path pointing to an entry of an adapter pack file into the path of the pack file and the name of the
+    entry. Returns None if the path does not point to an entry of a pack file.
+    """
+    pack_file, entry_name = os.path.split(os.path.normpath(path))
+    if pack_file.endswith(ADAPTER_PACK_EXTENSION) and isfile(pack_file):
+        return pack_file, entry_name
+    return None
+
+
 def resolve_adapter_path(
     adapter_name_or_path,
     model_name: str = None,
@@ -675,6 +837,8 @@ def resolve_adapter_path(
         adapter_name_or_path (str): Can be either:
 
             - the path to a folder in the file system containing the adapter configuration and weights
+            - the path to an entry of an adapter pack file, i.e. "<pack file>/<adapter name>"
+            - the path to a zip archive containing the adapter configuration and weights
             - an url pointing to a zip folder containing the adapter configuration and weights
             - a specifier matching a pre-trained adapter uploaded to Adapter-Hub
         model_name (str, optional): The identifier of the pre-trained model for which to load an adapter.
@@ -699,7 +863,10 @@ def resolve_adapter_path(
         return resolved_folder
     # path to a local folder saved using save()
     elif isdir(adapter_name_or_path):
-        if isfile(join(adapter_name_or_path, WEIGHTS_NAME)) and isfile(join(adapter_name_or_path, CONFIG_NAME)):
+        has_weights = isfile(join(adapter_name_or_path, SAFE_WEIGHTS_NAME)) or isfile(
+            join(adapter_name_or_path, WEIGHTS_NAME)
+        )
+        if has_weights and isfile(join(adapter_name_or_path, CONFIG_NAME)):
             return adapter_name_or_path
         else:
             raise EnvironmentError(
@@ -707,6 +874,12 @@ def resolve_adapter_path(
                     WEIGHTS_NAME, CONFIG_NAME, adapter_name_or_path
                 )
             )
+    # entry of a local adapter pack file saved using save_adapter_pack()
+    elif split_pack_path(adapter_name_or_path) is not None:
+        return adapter_name_or_path
+    # zip archive of a saved adapter, read without extracting
+    elif isfile(adapter_name_or_path) and is_zipfile(adapter_name_or_path):
+        return adapter_name_or_path
     elif source == "ah":
         return pull_from_hub(
             adapter_name_or_path, model_name, adapter_config=adapter_config, version=version, **kwargs
@@ -3,8 +3,18 @@ import unittest
 import torch
 
 import adapters
-from adapters import PrefixTuningConfig, SeqBnConfig
-from adapters.composition import Average, BatchSplit, Fuse, Parallel, Split, Stack, parse_composition
+from adapters import AdapterSetup, IA3Config, LoRAConfig, PrefixTuningConfig, SeqBnConfig
+from adapters.composition import (
+    Average,
+    BatchSplit,
+    Fuse,
+    Parallel,
+    Route,
+    Split,
+    Stack,
+    parse_composition,
+    replicate_batch,
+)
 from tests.test_modeling_common import ids_tensor
 from transformers import BertConfig, BertForSequenceClassification
 from transformers.testing_utils import require_torch, torch_device
@@ -144,6 +154,92 @@ class AdapterCompositionTest(unittest.TestCase):
         logits = model(**inputs).logits
         self.assertEqual(logits.shape, (4, 2))
 
+    def test_parallel_weight_update(self):
+        if Parallel in self.unsupported_blocks:
+            self.skipTest("Parallel not supported by adapter config.")
+
+        model = self.build_model()
+        model.eval()
+        model.set_active_adapters(Parallel("a", "b"))
+
+        input_ids = ids_tensor((1, 128), 1000).to(torch_device)
+        logits = model(input_ids).logits
+        self.assertEqual(logits.shape, (2, 2))
+
+        # modifying the weights of one adapter must only affect the output of its own channel
+        with torch.no_grad():
+            for name, param in model.named_parameters():
+                if ".b." in name:
+                    param.add_(0.1)
+        updated_logits = model(input_ids).logits
+        self.assertTrue(torch.allclose(logits[0], updated_logits[0], atol=1e-6))
+        self.assertFalse(torch.allclose(logits[1], updated_logits[1], atol=1e-6))
+
+    def test_parallel_replicate_batch(self):
+        # single-sample batches are replicated without copying
+        tensor = torch.rand(1, 4, 8)
+        replicated = replicate_batch(tensor, 3)
+        self.assertEqual(replicated.shape, (3, 4, 8))
+        self.assertEqual(replicated.data_ptr(), tensor.data_ptr())
+        self.assertTrue(torch.equal(replicated, tensor.repeat(3, 1, 1)))
+
+        tensor = torch.rand(2, 4, 8)
+        self.assertTrue(torch.equal(replicate_batch(tensor, 3), tensor.repeat(3, 1, 1)))
+        self.assertIs(replicate_batch(tensor, 1), tensor)
+
+    def test_parallel_deferred_replication(self):
+        if Parallel in self.unsupported_blocks or Stack in self.unsupported_blocks:
+            self.skipTest("Parallel or Stack not supported by adapter config.")
+
+        model = self.build_model()
+        model.eval()
+        all_layers = list(range(model.config.num_hidden_layers))
+        input_ids = ids_tensor((1, 128), 1000).to(torch_device)
+
+        # all layers skipped, output is replicated after the forward pass
+        model.set_active_adapters(Parallel("a", "b"), skip_layers=all_layers)
+        logits = model(input_ids).logits
+        self.assertEqual(logits.shape, (2, 2))
+        self.assertTrue(torch.allclose(logits[0], logits[1]))
+
+        # prefixes must be added to at least one layer
+        if isinstance(self.get_adapter_config(), PrefixTuningConfig):
+            return
+
+        # no layer holds any of the nested parallel adapters
+        model.add_adapter("e", config=self.get_adapter_config().replace(leave_out=all_layers))
+        model.add_adapter("f", config=self.get_adapter_config().replace(leave_out=all_layers))
+        model.to(torch_device)
+        model.set_active_adapters(Stack("a", Parallel("e", "f")))
+        logits = model(input_ids).logits
+        self.assertEqual(logits.shape, (2, 2))
+        model.set_active_adapters("a")
+        self.assertTrue(torch.allclose(logits, model(input_ids).logits.repeat(2, 1), atol=1e-5))
+
+    def test_parallel_context_setup(self):
+        if Parallel in self.unsupported_blocks:
+            self.skipTest("Parallel not supported by adapter config.")
+
+        model = self.build_model()
+        model.eval()
+        input_ids = ids_tensor((1, 128), 1000).to(torch_device)
+        model.set_active_adapters("a")
+        logits_a = model(input_ids).logits
+
+        # the setup of the context replaces a Parallel default setup
+        model.set_active_adapters(Parallel("a", "b"))
+        with AdapterSetup("a"):
+            logits = model(input_ids).logits
+        self.assertEqual(logits.shape, (1, 2))
+        self.assertTrue(torch.allclose(logits, logits_a, atol=1e-5))
+
+        # a Parallel context setup is replicated even if the default setup is not parallel
+        model.set_active_adapters("a")
+        with AdapterSetup(Parallel("a", "b")):
+            logits = model(input_ids).logits
+        self.assertEqual(logits.shape, (2, 2))
+        self.assertTrue(torch.allclose(logits[0], logits_a[0], atol=1e-5))
+
     def test_nested_parallel(self):
         if Parallel in self.unsupported_blocks or Stack in self.unsupported_blocks:
             self.skipTest("Parallel or Stack not supported by adapter config.")
@@ -228,9 +324,89 @@ class AdapterCompositionTest(unittest.TestCase):
         logits = model(**inputs).logits
         self.assertEqual(logits.shape, (1, 2))
 
+    def test_route(self):
+        if Route in self.unsupported_blocks:
+            self.skipTest("Route not supported by adapter config.")
+
+        model = self.build_model()
+        model.eval()
+        input_ids = ids_tensor((4, 128), 1000).to(torch_device)
+
+        # each example must be equivalent to a forward pass with only its routed adapter
+        expected = []
+        for adapter_name, example in zip(["c", "a", "b", "a"], input_ids):
+            model.set_active_adapters(adapter_name)
+            expected.append(model(example.unsqueeze(0)).logits)
+        with adapters.AdapterSetup(Route("a", "b", "c", route_ids=[2, 0, 1, 0])):
+            logits = model(input_ids).logits
+        self.assertTrue(torch.allclose(torch.cat(expected), logits, atol=1e-5))
+
+        with adapters.AdapterSetup(Route("a", "b", "c", route_ids=[2, 0, 1])):
+            with self.assertRaises(ValueError):
+                model(input_ids)
+
+    def test_compiled_plans_invalidation(self):
+        model = self.build_model()
+        model.eval()
+        input_ids = ids_tensor((1, 128), 1000).to(torch_device)
+
+        model.set_active_adapters("a")
+        output_a = model(input_ids)[0]
+        # the cached plan of the active setup is reused
+        self.assertTrue(torch.equal(output_a, model(input_ids)[0]))
+
+        model.set_active_adapters("b")
+        output_b = model(input_ids)[0]
+        self.assertFalse(torch.equal(output_a, output_b))
+
+        # plans of context setups are compiled separately
+        with adapters.AdapterSetup("a"):
+            self.assertTrue(torch.equal(output_a, model(input_ids)[0]))
+        self.assertTrue(torch.equal(output_b, model(input_ids)[0]))
+
+        # deleting & re-adding an active adapter must not reuse the stale module
+        model.delete_adapter("b")
+        model.add_adapter("b", config=self.get_adapter_config())
+        model.to(torch_device)
+        model.set_active_adapters("b")
+        self.assertFalse(torch.equal(output_b, model(input_ids)[0]))
+
 
 class PrefixTuningCompositionTest(AdapterCompositionTest):
     unsupported_blocks = [Split, Fuse, Average]
 
     def get_adapter_config(self):
         return PrefixTuningConfig()
+
+
+class LoRACompositionTest(AdapterCompositionTest):
+    unsupported_blocks = [Stack, Split, Fuse, Average]
+
+    def get_adapter_config(self):
+        return LoRAConfig(init_weights="bert")
+
+    def test_parallel_replicated_input(self):
+        model = self.build_model()
+        model.eval()
+        input_ids = ids_tensor((2, 128), 1000).to(torch_device)
+
+        model.set_active_adapters("a")
+        output_a = model.bert(input_ids)[0]
+        model.set_active_adapters("b")
+        output_b = model.bert(input_ids)[0]
+
+        # the input is replicated for all parallel channels before the forward pass
+        model.set_active_adapters(Parallel("a", "b"))
+        output = model.bert(input_ids)[0]
+        self.assertTrue(torch.allclose(output[:2], output_a, atol=1e-5))
+        self.assertTrue(torch.allclose(output[2:], output_b, atol=1e-5))
+
+        # already replicated inputs are passed through unchanged
+        output = model.bert(input_ids.repeat(2, 1), adapter_input_parallelized=True)[0]
+        self.assertTrue(torch.allclose(output[:2], output_a, atol=1e-5))
+        self.assertTrue(torch.allclose(output[2:], output_b, atol=1e-5))
+
+
+class IA3CompositionTest(LoRACompositionTest):
+    def get_adapter_config(self):
+        return IA3Config(init_weights="bert")
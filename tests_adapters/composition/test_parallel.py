@@ -3,7 +3,14 @@ import random
 
 import torch
 
-from adapters import ADAPTER_MODEL_MAPPING, AutoAdapterModel, PrefixTuningConfig, SeqBnConfig, T5AdapterModel
+from adapters import (
+    ADAPTER_MODEL_MAPPING,
+    AutoAdapterModel,
+    LoRAConfig,
+    PrefixTuningConfig,
+    SeqBnConfig,
+    T5AdapterModel,
+)
 from adapters.composition import BatchSplit, Parallel
 from adapters.models.bert_generation.adapter_model import BertGenerationAdapterModel
 from transformers import MODEL_FOR_SEQUENCE_CLASSIFICATION_MAPPING, Trainer, TrainingArguments
@@ -109,7 +116,37 @@ class ParallelAdapterInferenceTestMixin:
             )
         )
 
+    def test_batch_split_lora(self):
+        model = AutoAdapterModel.from_config(self.config())
+        model.add_adapter("a", config=LoRAConfig(init_weights="bert"))
+        # different rank & attention matrices to check padding of batched weights
+        model.add_adapter("b", config=LoRAConfig(r=4, attn_matrices=["q", "k", "v"], init_weights="bert"))
+        model.eval()
+        model.to(torch_device)
+
+        inputs = self.get_input_samples(config=model.config)
+        if isinstance(model, T5AdapterModel):
+            inputs["decoder_input_ids"] = inputs["input_ids"]
+
+        # for reference, pass through single adapters
+        model.active_adapters = "a"
+        outputs_a = model(**{k: v[:1] for k, v in inputs.items()})
+        model.active_adapters = "b"
+        outputs_b = model(**{k: v[1:] for k, v in inputs.items()})
+
+        model.set_active_adapters(BatchSplit("a", "b", batch_sizes=[1, 2]))
+        output = model(**inputs)
+
+        self.assertTrue(torch.allclose(output[0][:1], outputs_a[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output[0][1:], outputs_b[0], atol=1e-5))
+
     def test_parallel_generate(self):
+        self.run_parallel_generate_test()
+
+    def test_parallel_generate_lora(self):
+        self.run_parallel_generate_test(LoRAConfig(init_weights="bert"))
+
+    def run_parallel_generate_test(self, adapter_config=None):
         if self.config_class not in ADAPTER_MODEL_MAPPING or (
             not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_seq2seq_lm_head")
             and not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_causal_lm_head")
@@ -117,8 +154,8 @@ class ParallelAdapterInferenceTestMixin:
             self.skipTest("No seq2seq or causal language model head")
 
         model1 = AutoAdapterModel.from_config(self.config())
-        model1.add_adapter("adapter1")
-        model1.add_adapter("adapter2")
+        model1.add_adapter("adapter1", config=adapter_config)
+        model1.add_adapter("adapter2", config=adapter_config)
         if hasattr(model1, "add_seq2seq_lm_head"):
             model1.add_seq2seq_lm_head("adapter1")
             model1.add_seq2seq_lm_head("adapter2")
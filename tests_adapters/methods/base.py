@@ -1,13 +1,18 @@
 import copy
+import json
 import os
+import shutil
 import tempfile
+from unittest import mock
 
 import torch
 
 import adapters
 from adapters import ADAPTER_MODEL_MAPPING, AdapterSetup, AdapterTrainer, AutoAdapterModel
 from adapters.heads import CausalLMHead
-from adapters.utils import WEIGHTS_NAME
+from adapters.loading import AdapterArchive, AdapterLoader, AdapterPack
+from adapters.lora import LoRALayer
+from adapters.utils import CONFIG_NAME, SAFE_WEIGHTS_NAME, WEIGHTS_NAME
 from adapters.wrappers import load_model
 from transformers import TrainingArguments
 from transformers.testing_utils import require_torch, torch_device
@@ -172,6 +177,9 @@ class AdapterMethodBaseTestMixin:
             # Check that there are actually weights saved
             weights = torch.load(os.path.join(temp_dir, WEIGHTS_NAME), map_location="cpu")
             self.assertTrue(len(weights) > 0)
+            # Check that exactly the weights of the adapter are saved
+            filter_func = AdapterLoader(model1).filter_func(name)
+            self.assertEqual({k for k in model1.state_dict() if filter_func(k)}, set(weights.keys()))
 
             # also tests that set_active works
             loading_info = {}
@@ -193,6 +201,280 @@ class AdapterMethodBaseTestMixin:
         self.assertEqual(len(output1), len(output2))
         self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
 
+    def run_safetensors_load_test(self, adapter_config, lazy_load=False):
+        model1, model2 = create_twin_models(self.model_class, self.config)
+
+        name = "dummy_adapter"
+        model1.add_adapter(name, config=adapter_config)
+        model1.set_active_adapters([name])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model1.save_adapter(temp_dir, name, use_safetensors=True)
+
+            # Check that weights are saved in safetensors format only
+            self.assertTrue(os.path.isfile(os.path.join(temp_dir, SAFE_WEIGHTS_NAME)))
+            self.assertFalse(os.path.isfile(os.path.join(temp_dir, WEIGHTS_NAME)))
+
+            loading_info = {}
+            model2.load_adapter(temp_dir, loading_info=loading_info, lazy_load=lazy_load)
+
+            # check if all weights were found
+            self.assertEqual(0, len(loading_info["missing_keys"]))
+            self.assertEqual(0, len(loading_info["unexpected_keys"]))
+            self.assertTrue(name in model2.adapters_config)
+
+            if lazy_load:
+                # weights are not read before the adapter is activated
+                self.assertIn(name, model2.base_model._lazy_adapter_weights)
+                weights_before = {k: v.clone() for k, v in model2.state_dict().items() if name in k}
+            model2.set_active_adapters([name])
+            if lazy_load:
+                self.assertNotIn(name, model2.base_model._lazy_adapter_weights)
+                self.assertTrue(any(not torch.equal(v, model2.state_dict()[k]) for k, v in weights_before.items()))
+
+        # check equal output
+        input_data = self.get_input_samples(config=model1.config)
+        model1.to(torch_device)
+        model2.to(torch_device)
+        output1 = model1(**input_data)
+        output2 = model2(**input_data)
+        self.assertEqual(len(output1), len(output2))
+        self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
+
+    def run_bulk_load_test(self, adapter_configs):
+        model1, model2 = create_twin_models(self.model_class, self.config)
+
+        names = [f"dummy_adapter_{i}" for i in range(len(adapter_configs))]
+        for name, adapter_config in zip(names, adapter_configs):
+            model1.add_adapter(name, config=adapter_config)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model1.save_all_adapters(temp_dir)
+            # adapters of different types can be loaded together
+            for i, name in enumerate(names):
+                config_file = os.path.join(temp_dir, name, CONFIG_NAME)
+                with open(config_file, "r") as f:
+                    config = json.load(f)
+                config["type"] = "text_lang" if i % 2 else "text_task"
+                with open(config_file, "w") as f:
+                    json.dump(config, f)
+
+            load_names, loading_info = model2.load_adapters(
+                [os.path.join(temp_dir, name) for name in names], output_loading_info=True
+            )
+
+        # check if all weights were loaded
+        self.assertEqual(names, load_names)
+        self.assertEqual(0, len(loading_info["missing_keys"]))
+        self.assertEqual(0, len(loading_info["unexpected_keys"]))
+        self.assertEqual(set(names), set(loading_info["load_times"].keys()))
+
+        # check equal output
+        input_data = self.get_input_samples(config=model1.config)
+        model1.to(torch_device)
+        model2.to(torch_device)
+        for name in names:
+            with AdapterSetup(name):
+                output1 = model1(**input_data)
+                output2 = model2(**input_data)
+            self.assertEqual(len(output1), len(output2))
+            self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
+
+    def run_pack_load_test(self, adapter_config):
+        model1, model2 = create_twin_models(self.model_class, self.config)
+
+        names = ["dummy_adapter_0", "dummy_adapter_1"]
+        for name in names:
+            model1.add_adapter(name, config=adapter_config)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pack_file = os.path.join(temp_dir, "adapters.adapterpack")
+            model1.save_adapter_pack(pack_file)
+
+            # Check that all adapters are saved in a single file
+            self.assertEqual(["adapters.adapterpack"], os.listdir(temp_dir))
+
+            # load a single adapter from the pack
+            loading_info = {}
+            model2.load_adapter(os.path.join(pack_file, names[1]), loading_info=loading_info)
+
+            # opened packs are reused until the file is modified
+            pack = AdapterPack.open(pack_file)
+            self.assertIs(pack, AdapterPack.open(pack_file))
+            os.utime(pack_file, ns=(0, 0))
+            self.assertIsNot(pack, AdapterPack.open(pack_file))
+            self.assertIsNone(pack._handle)
+            # the least recently used packs are closed, closed packs are reopened on access
+            with mock.patch.object(AdapterPack, "max_open_packs", 0):
+                pack = AdapterPack.open(pack_file)
+            self.assertIsNone(pack._handle)
+            weights_name = next(f for f in pack.index[names[1]] if not f.endswith(".json"))
+            self.assertGreater(len(pack.load_weights(names[1], weights_name)), 0)
+            AdapterPack.close_all()
+            self.assertEqual(0, len(AdapterPack._open_packs))
+
+        # check if all weights were loaded
+        self.assertEqual(0, len(loading_info["missing_keys"]))
+        self.assertEqual(0, len(loading_info["unexpected_keys"]))
+        self.assertTrue(names[1] in model2.adapters_config)
+        self.assertFalse(names[0] in model2.adapters_config)
+
+        # check equal output
+        input_data = self.get_input_samples(config=model1.config)
+        model1.to(torch_device)
+        model2.to(torch_device)
+        with AdapterSetup(names[1]):
+            output1 = model1(**input_data)
+            output2 = model2(**input_data)
+        self.assertEqual(len(output1), len(output2))
+        self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
+
+    def run_archive_load_test(self, adapter_config, use_safetensors=False):
+        model1, model2 = create_twin_models(self.model_class, self.config)
+
+        name = "dummy_adapter"
+        model1.add_adapter(name, config=adapter_config)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "adapter"))
+            model1.save_adapter(os.path.join(temp_dir, "adapter", name), name, use_safetensors=use_safetensors)
+            archive_file = shutil.make_archive(
+                os.path.join(temp_dir, "adapter"), "zip", os.path.join(temp_dir, "adapter")
+            )
+
+            # load directly from the zip archive without extracting it
+            loading_info = {}
+            model2.load_adapter(archive_file, loading_info=loading_info, lazy_load=use_safetensors)
+            model2.set_active_adapters(name)
+
+            # close the archive before the directory is removed
+            archive = AdapterArchive.open(archive_file)
+            AdapterArchive.close_all()
+            self.assertIsNone(archive._zip_file)
+            self.assertEqual(0, len(AdapterArchive._open_archives))
+
+        # check if all weights were loaded
+        self.assertEqual(0, len(loading_info["missing_keys"]))
+        self.assertEqual(0, len(loading_info["unexpected_keys"]))
+        self.assertTrue(name in model2.adapters_config)
+
+        # check equal output
+        input_data = self.get_input_samples(config=model1.config)
+        model1.to(torch_device)
+        model2.to(torch_device)
+        with AdapterSetup(name):
+            output1 = model1(**input_data)
+            output2 = model2(**input_data)
+        self.assertEqual(len(output1), len(output2))
+        self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
+
+    def run_registry_test(self, adapter_config):
+        model1, model2 = create_twin_models(self.model_class, self.config)
+
+        names = ["dummy_adapter_0", "dummy_adapter_1"]
+        input_data = self.get_input_samples(config=model1.config)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in names:
+                model1.add_adapter(name, config=adapter_config)
+                model1.save_adapter(os.path.join(temp_dir, name), name)
+                # registering does not add the adapter to the model
+                self.assertEqual(name, model2.register_adapter(os.path.join(temp_dir, name)))
+                self.assertFalse(name in model2.adapters_config)
+
+            # adapters are loaded on first activation
+            model2.set_active_adapters(names[0])
+            self.assertTrue(names[0] in model2.adapters_config)
+            stats = model2.adapter_registry_stats()
+            self.assertEqual(2, stats["registered"])
+            self.assertEqual(1, stats["resident"])
+            self.assertGreater(stats["resident_bytes"], 0)
+
+            # only one adapter fits into the budget, the least recently used one is evicted
+            model2.set_active_adapters(None)
+            model2.set_adapter_memory_budget(stats["resident_bytes"])
+            model1.to(torch_device)
+            model2.to(torch_device)
+            with AdapterSetup(names[1]):
+                output1 = model1(**input_data)
+                output2 = model2(**input_data)
+            self.assertTrue(torch.allclose(output1[0], output2[0], atol=1e-4))
+            self.assertTrue(names[1] in model2.adapters_config)
+            self.assertFalse(names[0] in model2.adapters_config)
+
+            # evicted adapters are reloaded from disk
+            model2.set_active_adapters(names[0])
+            self.assertTrue(names[0] in model2.adapters_config)
+            stats = model2.adapter_registry_stats()
+            self.assertEqual(1, stats["resident"])
+            self.assertEqual(3, stats["misses"])
+            self.assertEqual(2, stats["evictions"])
+
+    def run_offloading_test(self, adapter_config):
+        model = self.get_model()
+        model.eval()
+        names = ["dummy_adapter_0", "dummy_adapter_1", "dummy_adapter_2"]
+        for name in names:
+            model.add_adapter(name, config=adapter_config)
+        # randomly initialize all weights to get different outputs for each adapter
+        for param_name, param in model.named_parameters():
+            if any(name in param_name for name in names):
+                param.data.normal_(0, 0.1)
+        model.to(torch_device)
+        input_data = self.get_input_samples(config=model.config)
+        expected_outputs = {}
+        for name in names:
+            with AdapterSetup(name):
+                expected_outputs[name] = model(**input_data)[0]
+
+        residency = model.enable_adapter_offloading()
+        model.set_active_adapters(names[0])
+        self.assertTrue(residency.is_on_device(names[0]))
+        self.assertFalse(residency.is_on_device(names[1]))
+        self.assertTrue(torch.allclose(expected_outputs[names[0]], model(**input_data)[0], atol=1e-4))
+
+        # prefetched adapters are moved to the device before activation
+        model.prefetch_adapters(names[1])
+        with AdapterSetup(names[1]):
+            output = model(**input_data)[0]
+        self.assertTrue(torch.allclose(expected_outputs[names[1]], output, atol=1e-4))
+        self.assertTrue(residency.is_on_device(names[1]))
+        self.assertFalse(residency.is_on_device(names[2]))
+
+        # adapters of other setups are moved back to host memory
+        model.set_active_adapters(names[2])
+        self.assertTrue(torch.allclose(expected_outputs[names[2]], model(**input_data)[0], atol=1e-4))
+        self.assertFalse(residency.is_on_device(names[0]))
+        self.assertFalse(residency.is_on_device(names[1]))
+
+        # changes made on the device are kept after offloading, also if made via param.data
+        with torch.no_grad():
+            for param_name, param in model.named_parameters():
+                if names[2] in param_name:
+                    param.mul_(2.0)
+        modified_output = model(**input_data)[0]
+        model.set_active_adapters(names[0])
+        self.assertFalse(residency.is_on_device(names[2]))
+        model.set_active_adapters(names[2])
+        self.assertTrue(torch.allclose(modified_output, model(**input_data)[0], atol=1e-4))
+        for param_name, param in model.named_parameters():
+            if names[2] in param_name:
+                param.data.copy_(param.data * 0.5)
+        model.set_active_adapters(names[0])
+        model.set_active_adapters(names[2])
+        self.assertTrue(torch.allclose(expected_outputs[names[2]], model(**input_data)[0], atol=1e-4))
+
+        # in read-only mode, weights modified in-place are still copied back
+        residency = model.enable_adapter_offloading(read_only=True)
+        self.assertTrue(residency.read_only)
+        with torch.no_grad():
+            for param_name, param in model.named_parameters():
+                if names[2] in param_name:
+                    param.mul_(2.0)
+        model.set_active_adapters(names[0])
+        model.set_active_adapters(names[2])
+        self.assertTrue(torch.allclose(modified_output, model(**input_data)[0], atol=1e-4))
+
+        model.disable_adapter_offloading()
+        with AdapterSetup(names[0]):
+            output = model(**input_data)[0]
+        self.assertTrue(torch.allclose(expected_outputs[names[0]], output, atol=1e-4))
+
     def run_full_model_load_test(self, adapter_config):
         model1 = self.get_model()
         model1.eval()
@@ -342,3 +624,90 @@ class AdapterMethodBaseTestMixin:
         # check forward pass
         self.assertEqual(len(output_1), len(output_2))
         self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-3))
+
+    def run_merge_on_eval_test(self, adapter_config):
+        model = self.get_model()
+        model.eval()
+        model.add_adapter("test_lora", config=adapter_config, set_active=True)
+        model.to(torch_device)
+        base_weights = {k: v.clone() for k, v in model.state_dict().items() if "loras" not in k}
+        lora_layers = [m for m in model.modules() if isinstance(m, LoRALayer) and "test_lora" in m.loras]
+
+        input_data = self.get_input_samples(config=model.config)
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            model.set_merge_on_eval(True)
+            output_2 = model(**input_data)
+        self.assertTrue(all(m.merged == "test_lora" for m in lora_layers))
+        # without merged weights cache, weights are merged in place
+        self.assertTrue(all(m._unmerged_weight is None for m in lora_layers))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-3))
+
+        # modifying adapter weights resets the merged weights
+        with torch.no_grad():
+            for name, param in model.named_parameters():
+                if "loras.test_lora." in name:
+                    param.mul_(2.0)
+            output_3 = model(**input_data)
+            model.set_merge_on_eval(False)
+            self.assertFalse(any(m.merged for m in lora_layers))
+            output_4 = model(**input_data)
+        self.assertTrue(torch.allclose(output_3[0], output_4[0], atol=1e-3))
+
+        # switching to training mode resets the merged weights
+        model.set_merge_on_eval(True)
+        with torch.no_grad():
+            model(**input_data)
+        self.assertTrue(all(m.merged == "test_lora" for m in lora_layers))
+        model.train()
+        self.assertFalse(any(m.merged for m in lora_layers))
+        for k, v in model.state_dict().items():
+            if k in base_weights:
+                self.assertTrue(torch.allclose(v, base_weights[k], atol=1e-6), k)
+
+    def run_merged_weights_cache_test(self, adapter_config):
+        model = self.get_model()
+        model.eval()
+        model.add_adapter("a", config=adapter_config)
+        model.add_adapter("b", config=adapter_config)
+        model.to(torch_device)
+        cache = model.set_merged_weights_cache(2**30)
+        n_layers = len([m for m in model.modules() if isinstance(m, LoRALayer) and "a" in m.loras])
+
+        input_data = self.get_input_samples(config=model.config)
+
+        output_base = model(**input_data)
+        model.set_active_adapters("a")
+        output_a = model(**input_data)
+        model.set_active_adapters("b")
+        output_b = model(**input_data)
+        model.set_active_adapters(None)
+
+        # first merges compute the weights, switching back to a merged adapter hits the cache
+        for name, expected, misses, hits in [("a", output_a, 1, 0), ("b", output_b, 2, 0), ("a", output_a, 2, 1)]:
+            model.merge_adapter(name)
+            output = model(**input_data)
+            self.assertTrue(torch.allclose(output[0], expected[0], atol=1e-3))
+            model.reset_adapter()
+            self.assertEqual(cache.misses, misses * n_layers)
+            self.assertEqual(cache.hits, hits * n_layers)
+        # base weights are swapped back exactly
+        self.assertTrue(torch.equal(model(**input_data)[0], output_base[0]))
+
+        # modifying the weights invalidates cached weights
+        with torch.no_grad():
+            for name, param in model.named_parameters():
+                if "loras.a." in name:
+                    param.mul_(2.0)
+        model.merge_adapter("a")
+        model.reset_adapter()
+        self.assertEqual(cache.misses, 3 * n_layers)
+
+        # weights are evicted to stay below the size limit
+        cache = model.set_merged_weights_cache(cache.current_bytes // 2)
+        model.merge_adapter("a")
+        model.reset_adapter()
+        model.merge_adapter("b")
+        model.reset_adapter()
+        self.assertEqual(cache.evictions, n_layers)
+        self.assertLessEqual(cache.current_bytes, cache.max_bytes)
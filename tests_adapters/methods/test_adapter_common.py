@@ -7,6 +7,7 @@ import adapters
 from adapters import (
     ADAPTER_CONFIG_MAP,
     ADAPTER_MODEL_MAPPING,
+    AdapterLayerBase,
     AutoAdapterModel,
     BatchSplit,
     DoubleSeqBnConfig,
@@ -19,6 +20,7 @@ from adapters import (
     SeqBnInvConfig,
 )
 from adapters.heads.language_modeling import CausalLMHead
+from adapters.prefix_tuning import PrefixTuningPool
 from transformers import MODEL_FOR_SEQ_TO_SEQ_CAUSAL_LM_MAPPING
 from transformers.testing_utils import require_torch, torch_device
 
@@ -217,6 +219,43 @@ class BottleneckAdapterTestMixin(AdapterMethodBaseTestMixin):
     def test_load_mam_adapter(self):
         self.run_load_test(MAMConfig())
 
+    def test_load_adapter_safetensors(self):
+        self.run_safetensors_load_test(SeqBnConfig())
+
+    def test_lazy_load_adapter(self):
+        self.run_safetensors_load_test(SeqBnConfig(), lazy_load=True)
+
+    def test_load_adapters(self):
+        self.run_bulk_load_test([SeqBnConfig(), MAMConfig(), SeqBnConfig(reduction_factor=8)])
+
+    def test_load_adapter_from_pack(self):
+        self.run_pack_load_test(SeqBnConfig())
+
+    def test_register_adapter(self):
+        self.run_registry_test(SeqBnConfig())
+
+    def test_adapter_offloading(self):
+        self.run_offloading_test(SeqBnConfig())
+
+    def test_adapter_layer_index(self):
+        model = self.get_model()
+        index = model._get_adapter_layer_index()
+        adapter_layers = [module for module in model.modules() if isinstance(module, AdapterLayerBase)]
+        self.assertEqual(len(adapter_layers), len(index.adapter_layers))
+        self.assertTrue(all(a is b for a, b in zip(adapter_layers, index.adapter_layers)))
+        self.assertEqual(
+            sum(1 for module in model.modules() if isinstance(module, PrefixTuningPool)),
+            len(index.prefix_tuning_pools),
+        )
+        # all layers are indexed under their layer id
+        layer_ids = {i for i, _ in model.iter_layers()}
+        self.assertEqual(layer_ids, {i for i, _, _ in index.layers})
+
+    def test_load_adapter_from_archive(self):
+        for use_safetensors in [False, True]:
+            with self.subTest(use_safetensors=use_safetensors):
+                self.run_archive_load_test(SeqBnConfig(), use_safetensors=use_safetensors)
+
     def test_load_full_model_adapter(self):
         self.run_full_model_load_test(SeqBnConfig())
 
@@ -1,4 +1,7 @@
+import torch
+
 from adapters import ADAPTER_MODEL_MAPPING, AutoAdapterModel, CompacterPlusPlusConfig
+from adapters.modeling import PHMLayer, kronecker_product
 from transformers.testing_utils import require_torch, torch_device
 
 from .base import AdapterMethodBaseTestMixin
@@ -33,6 +36,59 @@ class CompacterTestMixin(AdapterMethodBaseTestMixin):
         adapter_config = CompacterPlusPlusConfig(phm_dim=2, shared_W_phm=True, reduction_factor=8)
         self.run_forward_test(model, adapter_config)
 
+    def test_phm_layer_matches_kronecker_product(self):
+        model = self.get_model()
+        for factorized_phm_W in [True, False]:
+            with self.subTest(factorized_phm_W=factorized_phm_W):
+                name = f"phm_{factorized_phm_W}"
+                adapter_config = CompacterPlusPlusConfig(
+                    phm_dim=2,
+                    shared_W_phm=False,
+                    shared_phm_rule=False,
+                    factorized_phm_W=factorized_phm_W,
+                    reduction_factor=8,
+                )
+                model.add_adapter(name, config=adapter_config)
+                phm_layers = [
+                    module for module in model.modules() if isinstance(module, PHMLayer) and module.name == name
+                ]
+                self.assertGreater(len(phm_layers), 0)
+                for layer in phm_layers:
+                    x = torch.randn(3, 4, layer.in_features, requires_grad=True)
+                    W = torch.bmm(layer.W_left, layer.W_right) if factorized_phm_W else layer.W
+                    expected = torch.matmul(x, kronecker_product(layer.phm_rule, W).sum(0)) + layer.b
+                    output = layer(x)
+                    self.assertTrue(torch.allclose(expected, output, atol=1e-6))
+                    # gradients flow to all parameters
+                    output.sum().backward()
+                    for param in layer.parameters():
+                        self.assertIsNotNone(param.grad)
+
+    def test_compacter_eval_cache(self):
+        model = self.get_model()
+        adapter_config = CompacterPlusPlusConfig(
+            phm_dim=2, shared_W_phm=True, factorized_phm_rule=True, reduction_factor=8
+        )
+        model.add_adapter("dummy", config=adapter_config)
+        model.set_active_adapters("dummy")
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+
+        output = model(**input_data)[0]
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(output, model(**input_data)[0], atol=1e-5))
+        phm_layers = [module for module in model.modules() if isinstance(module, PHMLayer)]
+        self.assertTrue(all(layer._cached_H is not None for layer in phm_layers))
+
+        # the cache is invalidated when the parameters change
+        with torch.no_grad():
+            for param in model.base_model.shared_parameters["dummy"].values():
+                param.add_(0.1)
+            cached_output = model(**input_data)[0]
+        self.assertTrue(torch.allclose(cached_output, model(**input_data)[0], atol=1e-4))
+        self.assertFalse(torch.allclose(output, cached_output, atol=1e-5))
+
     def test_load_compacter(self):
         self.run_load_test(CompacterPlusPlusConfig(phm_dim=2, reduction_factor=8))
 
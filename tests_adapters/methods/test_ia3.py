@@ -41,3 +41,9 @@ class IA3TestMixin(AdapterMethodBaseTestMixin):
 
     def test_reset_ia3(self):
         self.run_reset_test(IA3Config(init_weights="bert"))
+
+    def test_merged_weights_cache_ia3(self):
+        self.run_merged_weights_cache_test(IA3Config(init_weights="bert"))
+
+    def test_merge_on_eval_ia3(self):
+        self.run_merge_on_eval_test(IA3Config(init_weights="bert"))
@@ -41,3 +41,9 @@ class LoRATestMixin(AdapterMethodBaseTestMixin):
 
     def test_reset_lora(self):
         self.run_reset_test(LoRAConfig(init_weights="bert"))
+
+    def test_merged_weights_cache_lora(self):
+        self.run_merged_weights_cache_test(LoRAConfig(init_weights="bert"))
+
+    def test_merge_on_eval_lora(self):
+        self.run_merge_on_eval_test(LoRAConfig(init_weights="bert"))
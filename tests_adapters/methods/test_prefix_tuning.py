@@ -1,6 +1,7 @@
 import torch
 
 from adapters import ADAPTER_MODEL_MAPPING, AutoAdapterModel, PrefixTuningConfig
+from adapters.composition import BatchSplit, Parallel, Stack
 from transformers.testing_utils import require_torch, torch_device
 
 from .base import AdapterMethodBaseTestMixin
@@ -66,6 +67,36 @@ class PrefixTuningTestMixin(AdapterMethodBaseTestMixin):
         self.assertEqual(len(output_1), len(output_2))
         self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-4))
 
+    def test_prefix_states_cache(self):
+        model = self.get_model()
+        model.eval()
+        model.add_adapter("test_prefix", config="prefix_tuning", set_active=True)
+        model.to(torch_device)
+        pool = model.base_model.prefix_tuning
+
+        input_data = self.get_input_samples(config=model.config)
+        output_1 = model(**input_data)
+
+        # prefix states are computed once and reused in eval mode without gradients
+        with torch.no_grad():
+            output_2 = model(**input_data)
+            cached_states = pool._cached_prefix_states["test_prefix"][1]
+            model(**input_data)
+            self.assertIs(pool._cached_prefix_states["test_prefix"][1], cached_states)
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-4))
+
+        # modifying the weights invalidates the cached states
+        with torch.no_grad():
+            for param in pool.prefix_tunings["test_prefix"].parameters():
+                param.mul_(2.0)
+            output_3 = model(**input_data)
+        self.assertIsNot(pool._cached_prefix_states["test_prefix"][1], cached_states)
+        self.assertTrue(torch.allclose(output_3[0], model(**input_data)[0], atol=1e-4))
+
+        # switching to training mode clears the cache
+        model.train()
+        self.assertEqual(len(pool._cached_prefix_states), 0)
+
     def test_prefix_tuning_generate(self):
         if self.config_class not in ADAPTER_MODEL_MAPPING or (
             not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_seq2seq_lm_head")
@@ -89,3 +120,93 @@ class PrefixTuningTestMixin(AdapterMethodBaseTestMixin):
         input_ids = input_ids.to(torch_device)
         generated = model1.generate(input_ids, max_length=seq_output_length)
         self.assertLessEqual(generated.shape, (1, seq_output_length))
+
+    def test_prefix_tuning_generate_composition(self):
+        if self.config_class not in ADAPTER_MODEL_MAPPING or (
+            not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_seq2seq_lm_head")
+            and not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_causal_lm_head")
+        ):
+            self.skipTest("No seq2seq or causal language model head")
+
+        model = AutoAdapterModel.from_config(self.config())
+        # different prefix lengths to check padding of prefixes & attention masks
+        # relative position biases (e.g. of T5) depend on the padded prefix length, so use equal lengths there
+        prefix_length_b = 8 if hasattr(model.config, "relative_attention_num_buckets") else 4
+        model.add_adapter("a", config=PrefixTuningConfig(prefix_length=8))
+        model.add_adapter("b", config=PrefixTuningConfig(prefix_length=prefix_length_b))
+        for name in ["a", "b"]:
+            if hasattr(model, "add_seq2seq_lm_head"):
+                model.add_seq2seq_lm_head(name)
+            else:
+                model.add_causal_lm_head(name)
+        model.eval()
+        model.to(torch_device)
+
+        input_ids = self.get_input_samples((2, 4), config=model.config)["input_ids"].to(torch_device)
+        attention_mask = torch.ones_like(input_ids)
+        generate_kwargs = dict(attention_mask=attention_mask, max_length=12, min_length=12, do_sample=False)
+
+        # for reference, generate with single prefixes
+        model.set_active_adapters("a")
+        generated_a = model.generate(input_ids, **generate_kwargs)
+        model.set_active_adapters("b")
+        generated_b = model.generate(input_ids, **generate_kwargs)
+
+        model.set_active_adapters(Parallel("a", "b"))
+        generated = model.generate(input_ids, **generate_kwargs)
+        self.assertTrue(torch.equal(generated, torch.cat([generated_a, generated_b])))
+
+        model.set_active_adapters(BatchSplit("a", "b", batch_sizes=[1, 1]))
+        generated = model.generate(input_ids, **generate_kwargs)
+        self.assertTrue(torch.equal(generated, torch.cat([generated_a[:1], generated_b[1:]])))
+
+        # generation with prefixes in the key/value cache matches generation without cache
+        model.set_active_adapters(Stack("a", "b"))
+        generated = model.generate(input_ids, use_cache=True, **generate_kwargs)
+        generated_no_cache = model.generate(input_ids, use_cache=False, **generate_kwargs)
+        self.assertTrue(torch.equal(generated, generated_no_cache))
+
+    def test_prefix_tuning_generate_cached_prefixes(self):
+        if self.config_class not in ADAPTER_MODEL_MAPPING or not hasattr(
+            ADAPTER_MODEL_MAPPING[self.config_class], "add_causal_lm_head"
+        ):
+            self.skipTest("No causal language model head")
+
+        model = AutoAdapterModel.from_config(self.config())
+        model.add_adapter("a", config=PrefixTuningConfig(prefix_length=8))
+        model.add_causal_lm_head("a")
+        model.set_active_adapters("a")
+        model.eval()
+        model.to(torch_device)
+
+        input_ids = self.get_input_samples((2, 4), config=model.config)["input_ids"].to(torch_device)
+        attention_mask = torch.ones_like(input_ids)
+        outputs = model(input_ids, attention_mask=attention_mask, use_cache=True)
+        # the cache starts with the prefixes, followed by the tokens
+        if outputs.past_key_values is None or outputs.past_key_values[0][0].shape[-2] != 8 + 4:
+            self.skipTest("Prefixes are not stored in the key/value cache")
+
+        # later decoding steps only append the new token
+        next_ids = outputs.logits[:, -1:].argmax(-1)
+        input_ids = torch.cat([input_ids, next_ids], dim=-1)
+        attention_mask = torch.ones_like(input_ids)
+        next_outputs = model(
+            next_ids, past_key_values=outputs.past_key_values, attention_mask=attention_mask, use_cache=True
+        )
+        self.assertEqual(8 + 5, next_outputs.past_key_values[0][0].shape[-2])
+        full_outputs = model(input_ids, attention_mask=attention_mask, use_cache=False)
+        self.assertTrue(torch.allclose(full_outputs.logits[:, -1], next_outputs.logits[:, -1], atol=1e-4))
+
+        # without attention mask, position ids are computed from the cache length without the prefixes
+        next_outputs = model(next_ids, past_key_values=outputs.past_key_values, use_cache=True)
+        full_outputs = model(input_ids, use_cache=False)
+        self.assertTrue(torch.allclose(full_outputs.logits[:, -1], next_outputs.logits[:, -1], atol=1e-4))
+
+        generate_kwargs = dict(attention_mask=attention_mask, max_length=12, min_length=12, do_sample=False)
+        for num_beams in [1, 2]:
+            with self.subTest(num_beams=num_beams):
+                generated = model.generate(input_ids, use_cache=True, num_beams=num_beams, **generate_kwargs)
+                generated_no_cache = model.generate(
+                    input_ids, use_cache=False, num_beams=num_beams, **generate_kwargs
+                )
+                self.assertTrue(torch.equal(generated, generated_no_cache))
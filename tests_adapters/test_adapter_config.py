@@ -9,6 +9,7 @@ from adapters import (
     DoubleSeqBnConfig,
     LoRAConfig,
     MAMConfig,
+    ModelAdaptersConfig,
     ParBnConfig,
     PrefixTuningConfig,
     SeqBnConfig,
@@ -126,3 +127,22 @@ class AdapterConfigTest(unittest.TestCase):
         for config_str, error_type in to_test:
             with self.subTest(config_str=config_str):
                 self.assertRaises(error_type, AdapterConfigBase.load, config_str)
+
+    def test_model_adapters_config_match(self):
+        adapters_config = ModelAdaptersConfig()
+        config = SeqBnConfig(leave_out=[1])
+        adapters_config.add_multiple({"a": config, "b": config, "c": "lora"})
+        # adapters with the same config share the config object
+        self.assertIs(adapters_config.get("a"), adapters_config.get("b"))
+
+        self.assertEqual(config, adapters_config.match("a", SeqBnConfig, layer_idx=0, location_key="output_adapter"))
+        self.assertIsNone(adapters_config.match("a", SeqBnConfig, layer_idx=1, location_key="output_adapter"))
+        self.assertIsNone(adapters_config.match("c", SeqBnConfig, layer_idx=0))
+        self.assertEqual(LoRAConfig(), adapters_config.match("c", LoRAConfig, layer_idx=0))
+
+        # cached results are invalidated when an adapter is re-added
+        adapters_config.delete("a")
+        self.assertIsNone(adapters_config.match("a", SeqBnConfig, layer_idx=0))
+        adapters_config.add("a", config="lora")
+        self.assertIsNone(adapters_config.match("a", SeqBnConfig, layer_idx=0))
+        self.assertEqual(LoRAConfig(), adapters_config.match("a", LoRAConfig, layer_idx=0))
@@ -3,10 +3,19 @@ import os
 import tempfile
 from dataclasses import asdict
 
+import numpy as np
 import torch
 
-from adapters import ADAPTER_MODEL_MAPPING, ADAPTERFUSION_CONFIG_MAP, AdapterConfigBase, AutoAdapterModel, SeqBnConfig
+from adapters import (
+    ADAPTER_MODEL_MAPPING,
+    ADAPTERFUSION_CONFIG_MAP,
+    AdapterConfigBase,
+    AutoAdapterModel,
+    DynamicAdapterFusionConfig,
+    SeqBnConfig,
+)
 from adapters.composition import Fuse
+from adapters.modeling import BertFusion
 from adapters.utils import ADAPTERFUSION_WEIGHTS_NAME
 from adapters.wrappers import load_model
 from transformers.testing_utils import require_torch, torch_device
@@ -214,3 +223,60 @@ class AdapterFusionModelTestMixin:
             self.assertEqual(len(per_layer_scores), 1)
             for k, v in per_layer_scores.items():
                 self.assertEqual(self.default_input_samples_shape[0], v.shape[0], k)
+                # attentions are transferred to the host after the forward pass
+                self.assertIsInstance(v, np.ndarray)
+                self.assertTrue(np.allclose(v.sum(axis=-1), 1.0, atol=1e-5))
+
+    def test_adapter_fusion_layer_forward(self):
+        model = self.get_model()
+        model.eval()
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_adapter_fusion(["a", "b"], config=DynamicAdapterFusionConfig(residual_before=True))
+        fusion_layer = next(module for module in model.modules() if isinstance(module, BertFusion))
+        hidden_size = fusion_layer.dense_size
+        device = fusion_layer.query.weight.device
+
+        query = torch.randn(3, 5, hidden_size, device=device)
+        value = torch.randn(3, 5, 2, hidden_size, device=device)
+        residual = torch.randn(3, 5, hidden_size, device=device)
+        # reference: residual is repeated for each adapter and scores are computed with matmul
+        expected_value = value + residual[:, :, None, :].repeat(1, 1, 2, 1)
+        query_layer = fusion_layer.query(query)
+        key_layer = fusion_layer.key(expected_value)
+        value_layer = fusion_layer.value(expected_value)
+        scores = torch.squeeze(torch.matmul(query_layer.unsqueeze(2), key_layer.transpose(-2, -1)), dim=2)
+        probs = torch.softmax(scores / fusion_layer.T, dim=-1)
+        expected = torch.squeeze(torch.matmul(probs.unsqueeze(2), value_layer), dim=2)
+
+        input_value = value.clone()
+        output, attentions = fusion_layer(query, input_value, input_value, residual, output_attentions=True)
+        self.assertTrue(torch.allclose(expected, output, atol=1e-5))
+        self.assertTrue(torch.allclose(probs, attentions, atol=1e-5))
+
+    def test_adapter_fusion_top_k_routing(self):
+        for top_k_per_token in [False, True]:
+            with self.subTest(top_k_per_token=top_k_per_token):
+                model = self.get_model()
+                model.eval()
+                model.add_adapter("a")
+                model.add_adapter("b")
+                model.add_adapter("c")
+                fusion_config = DynamicAdapterFusionConfig(top_k=2, top_k_per_token=top_k_per_token)
+                model.add_adapter_fusion(["a", "b", "c"], config=fusion_config)
+                model.set_active_adapters(Fuse("a", "b", "c"))
+                model.to(torch_device)
+
+                input_data = self.get_input_samples(config=model.config)
+                output = model(**input_data, output_adapter_fusion_attentions=True)
+
+                self.assertEqual(len(output[0]), self.default_input_samples_shape[0])
+                for per_layer_scores in output.adapter_fusion_attentions["a,b,c"].values():
+                    for v in per_layer_scores.values():
+                        # only the selected adapters get attention
+                        self.assertEqual(v.shape[-1], 3)
+                        self.assertTrue(((v > 0).sum(axis=-1) <= 2).all())
+                        self.assertTrue(np.allclose(v.sum(axis=-1), 1.0, atol=1e-5))
+                stats = model.adapter_fusion_routing_stats(Fuse("a", "b", "c"))
+                self.assertGreater(stats["dense_adapter_tokens"], stats["computed_adapter_tokens"])
+                self.assertGreater(stats["savings"], 0.0)
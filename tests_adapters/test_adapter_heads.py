@@ -5,7 +5,7 @@ import torch
 
 import adapters
 from adapters import ADAPTER_MODEL_MAPPING, AdapterSetup, AutoAdapterModel
-from adapters.composition import BatchSplit, Stack
+from adapters.composition import BatchSplit, Route, Stack
 from transformers import AutoModelForSequenceClassification
 from transformers.testing_utils import require_torch, torch_device
 
@@ -317,6 +317,54 @@ class PredictionHeadModelTestMixin:
         self.assertEqual(2, len(out))
         self.assertTrue(isinstance(model.active_head, BatchSplit))
 
+    def test_route_adapter_head(self):
+        model = AutoAdapterModel.from_config(self.config())
+        output_size_a = self.add_head(model, "a", num_labels=2)
+        output_size_b = self.add_head(model, "b", num_labels=2)
+        model.add_adapter("a")
+        model.add_adapter("b")
+
+        model.eval()
+
+        in_data = self.get_input_samples(config=model.config)
+        model.to(torch_device)
+        route_ids = [1, 0, 1]
+        with AdapterSetup(Route("a", "b", route_ids=route_ids)):
+            out = model(**in_data)
+
+        self.assertEqual(2, len(out))
+        self.assertEqual((1, output_size_a), out[0][0].shape[:2])
+        self.assertEqual((2, output_size_b), out[1][0].shape[:2])
+        # logits are in the order of the input batch
+        for i, route_id in enumerate(route_ids):
+            example = {k: v[i : i + 1] for k, v in in_data.items()}
+            with AdapterSetup(["a", "b"][route_id]):
+                expected = model(**example)[0]
+            self.assertTrue(torch.allclose(expected[0], out.logits[i], atol=1e-5))
+
+    def test_route_adapter_head_unused(self):
+        model = AutoAdapterModel.from_config(self.config())
+        self.add_head(model, "a", num_labels=2)
+        output_size_b = self.add_head(model, "b", num_labels=2)
+        self.add_head(model, "c", num_labels=2)
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_adapter("c")
+
+        model.eval()
+
+        in_data = self.get_input_samples(config=model.config)
+        model.to(torch_device)
+        with AdapterSetup(Route("a", "b", "c", route_ids=[1, 1, 1])):
+            out = model(**in_data)
+
+        # heads without routed examples keep their position with a None output
+        self.assertEqual(3, len(out))
+        self.assertIsNone(out[0])
+        self.assertIsNone(out[2])
+        self.assertEqual((3, output_size_b), out[1][0].shape[:2])
+        self.assertTrue(torch.allclose(out.logits, out[1][0], atol=1e-5))
+
     def test_reload_static_to_flex_head(self):
         if not hasattr(ADAPTER_MODEL_MAPPING[self.config_class], "add_classification_head"):
             self.skipTest("No classification head available")
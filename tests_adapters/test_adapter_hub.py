@@ -1,12 +1,23 @@
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 import numpy as np
 
 import adapters
 from adapters import ADAPTER_CONFIG_MAP, AdapterConfigBase, BertAdapterModel, get_adapter_config_hash
 from adapters.trainer import AdapterTrainer as Trainer
-from adapters.utils import find_in_index
+from adapters.utils import (
+    ADAPTER_HUB_MIRROR_ENV,
+    ADAPTER_HUB_URL,
+    download_cached,
+    find_in_index,
+    get_file_checksum,
+    http_get_json,
+    resolve_hub_url,
+)
 from tests.test_modeling_common import ids_tensor
 from transformers import (  # get_adapter_config_hash,
     AutoModel,
@@ -42,6 +53,56 @@ class AdapterHubTest(unittest.TestCase):
                 found_entry = find_in_index(sample[0], None, config, index_file=SAMPLE_INDEX)
                 self.assertEqual(sample[2], found_entry)
 
+    def test_find_in_index_from_local_mirror(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "index"))
+            shutil.copyfile(SAMPLE_INDEX, os.path.join(tmp_dir, "index", "mirror-model.json"))
+            os.makedirs(os.path.join(tmp_dir, "adapters", "ukp"))
+            with open(os.path.join(tmp_dir, "adapters", "ukp", "entry.json"), "w") as f:
+                f.write('{"default_version": "1"}')
+
+            with mock.patch.dict(os.environ, {ADAPTER_HUB_MIRROR_ENV: tmp_dir}):
+                for sample in self.search_samples:
+                    with self.subTest(sample=sample):
+                        config = ADAPTER_CONFIG_MAP[sample[1]] if sample[1] else None
+                        found_entry = find_in_index(sample[0], "mirror-model", config)
+                        self.assertEqual(sample[2], found_entry)
+                hub_entry = http_get_json(find_in_index("@ukp/entry", "mirror-model"))
+                self.assertEqual("1", hub_entry["default_version"])
+
+    def test_resolve_hub_url_remote_mirror(self):
+        for mirror in ["http://host/hub", "http://host/hub/"]:
+            with self.subTest(mirror=mirror):
+                with mock.patch.dict(os.environ, {ADAPTER_HUB_MIRROR_ENV: mirror}):
+                    url = resolve_hub_url(ADAPTER_HUB_URL + "index/x.json")
+                self.assertEqual("http://host/hub/index/x.json", url)
+
+    def test_download_cached_from_local_mirror(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mirror_files_dir = os.path.join(tmp_dir, "mirror", "files", "example.org", "files")
+            os.makedirs(mirror_files_dir)
+            os.makedirs(os.path.join(tmp_dir, "adapter"))
+            shutil.copyfile(SAMPLE_INDEX, os.path.join(tmp_dir, "adapter", "adapter_config.json"))
+            archive_file = shutil.make_archive(
+                os.path.join(mirror_files_dir, "adapter"), "zip", os.path.join(tmp_dir, "adapter")
+            )
+            checksum = get_file_checksum(archive_file, "sha256")
+            url = "https://example.org/files/adapter.zip"
+            cache_dir = os.path.join(tmp_dir, "cache")
+
+            with mock.patch.dict(os.environ, {ADAPTER_HUB_MIRROR_ENV: os.path.join(tmp_dir, "mirror")}):
+                # zip archives are returned without extracting
+                path = download_cached(
+                    url, checksum=checksum, checksum_algo="sha256", cache_dir=cache_dir, extract=False
+                )
+                self.assertEqual(archive_file, path)
+                # archives of the mirror are extracted into the cache
+                path = download_cached(url, checksum=checksum, checksum_algo="sha256", cache_dir=cache_dir)
+                self.assertTrue(path.startswith(cache_dir))
+                self.assertEqual(["adapter_config.json"], os.listdir(path))
+                with self.assertRaises(EnvironmentError):
+                    download_cached(url, checksum="0" * 64, checksum_algo="sha256", cache_dir=cache_dir)
+
     def test_load_task_adapter_from_hub(self):
         """This test checks if an adapter is loaded from the Hub correctly by evaluating it on some MRPC samples
         and comparing with the expected result.